@@ -9,7 +9,20 @@ from pymongo import MongoClient
 from flask_jwt_extended import JWTManager
 
 from app.config import config, Config
-from app.services.authentication import check_if_token_revoked, send_from_directory
+from app.services.authentication import check_if_token_revoked
+from app.services.media_serving import send_media
+from app.services.mail import start_email_outbox_worker
+from app.services.template_catalogue import start_template_indexer
+from app.services.admin_snapshot import start_admin_snapshot_refresher
+from app.services.messaging import append_chat_message, ensure_message_indexes
+from app.services.geocoding import ensure_geocode_cache_indexes
+from app.services.form_answers import ensure_form_answer_indexes, materialize_media_path
+from app.services.uploads import ensure_upload_indexes
+from app.services.user_documents import ensure_user_document_indexes
+from app.services.media_library import ensure_media_library_indexes
+from app.services.zip_lookup import load_zip_table
+from app.services.pdf_pool import init_image_pool, init_pdf_pool
+from app.commands import register_commands
 import paho.mqtt.client as mqtt
 
 jwt = JWTManager()
@@ -46,12 +59,51 @@ def create_app(config_name):
 
     jwt.token_in_blocklist_loader(check_if_token_revoked)
 
+    # Separate blocks, so one service's failing indexes do not skip the others'
+    app.extensions['unique_conversation_collections'] = set()
+    try:
+        app.extensions['unique_conversation_collections'] = ensure_message_indexes(app.db)
+    except Exception as e:
+        app.logger.error(f"Failed to create message indexes: {e}")
+    try:
+        ensure_geocode_cache_indexes(app.db, app.config['GEOCODE_CACHE_TTL'])
+    except Exception as e:
+        app.logger.error(f"Failed to create geocode cache indexes: {e}")
+    try:
+        ensure_form_answer_indexes(app.db)
+    except Exception as e:
+        app.logger.error(f"Failed to create form answer indexes: {e}")
+    try:
+        ensure_upload_indexes(app.db)
+    except Exception as e:
+        app.logger.error(f"Failed to create upload indexes: {e}")
+    try:
+        ensure_user_document_indexes(app.db)
+    except Exception as e:
+        app.logger.error(f"Failed to create user document indexes: {e}")
+    try:
+        ensure_media_library_indexes(app.db)
+    except Exception as e:
+        app.logger.error(f"Failed to create media library indexes: {e}")
+
+    load_zip_table(app)
+    init_pdf_pool(app)
+    init_image_pool(app)
+    register_commands(app)
+
+    # Drain queued transactional emails outside of the request cycle
+    start_email_outbox_worker(app)
+    start_template_indexer(app)
+    start_admin_snapshot_refresher(app)
+
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
         os.makedirs(app.config['UPLOAD_FOLDER'])
 
     @app.route('/media/<path:filename>')
     def serve_media(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        # Filled documents are rendered from their stored answers when first fetched
+        materialize_media_path(filename)
+        return send_media(app.config['UPLOAD_FOLDER'], filename)
 
     def on_connect(client, userdata, flags, reason_code, properties):
         print(f"Connected to MQTT Broker with result code {reason_code}")
@@ -71,28 +123,16 @@ def create_app(config_name):
 
                 if payload.get('key') == 'buyer_seller_messaging':
                     print("Processing buyer_seller_messaging payload...")
+                    if payload.get('stored_by_api'):
+                        # Published by BuyerSellersChatView after it stored the message itself
+                        return
                     try:
                         payload.pop('key')
-                        payload['message_content'][0]['timestamp'] = datetime.datetime.now()
-                        buyer_id = payload.get('buyer_id')
-                        seller_id = payload.get('seller_id')
-                        property_id = payload.get('property_id')
-
-                        existing_message = app.db.buyer_seller_messaging.find_one({
-                            'buyer_id': buyer_id,
-                            'seller_id': seller_id,
-                            'property_id': property_id
-                        })
-
-                        if existing_message:
-                            app.db.buyer_seller_messaging.update_one(
-                                {'_id': existing_message['_id']},
-                                {'$push': {'message_content': payload['message_content'][0]}}
-                            )
-                            print("Updated existing buyer_seller_messaging document.")
-                        else:
-                            app.db.buyer_seller_messaging.insert_one(payload)
-                            print("Inserted new buyer_seller_messaging document.")
+                        message = payload['message_content'][0]
+                        message['timestamp'] = datetime.datetime.now()
+                        with app.app_context():
+                            status = append_chat_message('buyer_seller_messaging', payload, message, payload)
+                        print(f"buyer_seller_messaging message {message['message_uid']}: {status}")
                     except Exception as e:
                         print("Error in saving buyer_seller_message:", str(e))
 
@@ -100,38 +140,22 @@ def create_app(config_name):
                     print("Processing user-customer_service-property-chat payload...")
                     try:
                         payload.pop('key')
-                        payload['message_content'][0]['timestamp'] = datetime.datetime.now()
-                        existing_document = app.db.users_customer_service_property_chat.find_one({
-                            'user_id': payload['user_id'], 
-                            'property_id': payload['property_id']
-                        })
-                        if existing_document:
-                            app.db.users_customer_service_property_chat.update_one(
-                                {'_id': existing_document['_id']},
-                                {'$push': {'message_content': payload['message_content'][0]}}
-                            )
-                            print("Updated existing user-customer_service-property-chat document.")
-                        else:
-                            app.db.users_customer_service_property_chat.insert_one(payload)
-                            print("Inserted new user-customer_service-property-chat document.")
+                        message = payload['message_content'][0]
+                        message['timestamp'] = datetime.datetime.now()
+                        with app.app_context():
+                            status = append_chat_message('users_customer_service_property_chat', payload, message, payload)
+                        print(f"user-customer_service-property-chat message {message['message_uid']}: {status}")
                     except Exception as e:
                         print("Error in saving user message:", str(e))
 
                 else:
                     print("Processing general message payload...")
                     try:
-                        payload['message_content'][0]['timestamp'] = datetime.datetime.now()
-                        existing_document = app.db.messages.find_one({'user_id': payload['user_id']})
-
-                        if existing_document:
-                            app.db.messages.update_one({'user_id': payload['user_id']}, {'$push': {'messages': payload['message_content'][0]}})
-                            print("Updated existing message document.")
-                        else:
-                            messages = payload['message_content']
-                            payload.pop('message_content')
-                            payload['messages'] = messages
-                            app.db.messages.insert_one(payload)
-                            print("Inserted new message document.")
+                        message = payload.pop('message_content')[0]
+                        message['timestamp'] = datetime.datetime.now()
+                        with app.app_context():
+                            status = append_chat_message('messages', payload, message, payload)
+                        print(f"Message {message['message_uid']}: {status}")
                     except Exception as e:
                         print("Error in saving user message:", str(e))
             except json.JSONDecodeError:
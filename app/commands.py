@@ -0,0 +1,47 @@
+import click
+
+from app.services.image_derivatives import build_missing_derivatives
+from app.services.media_library import migrate_user_media
+from app.services.panoramas import build_missing_panorama_tiles
+from app.services.uploads import purge_expired_uploads
+from app.services.user_documents import migrate_embedded_documents
+from app.services.zip_lookup import build_zip_table
+
+
+def register_commands(app):
+
+    @app.cli.command('build-zip-table')
+    @click.argument('gazetteer_path')
+    @click.option('--output', default=None, help='Defaults to ZIP_TABLE_PATH.')
+    def build_zip_table_command(gazetteer_path, output):
+        """Build the ZIP centroid table from a Census ZCTA gazetteer file."""
+        output = output or app.config['ZIP_TABLE_PATH']
+        count = build_zip_table(gazetteer_path, output)
+        click.echo(f"Wrote {count} ZIP codes to {output}")
+
+    @app.cli.command('purge-uploads')
+    def purge_uploads_command():
+        """Remove expired resumable upload sessions and their part files."""
+        click.echo(f"Removed {purge_expired_uploads()} expired uploads")
+
+    @app.cli.command('build-image-derivatives')
+    @click.option('--rebuild', is_flag=True, help='Also rebuild images that already have derivatives.')
+    def build_image_derivatives_command(rebuild):
+        """Build resized WebP/JPEG copies of property images that lack them."""
+        click.echo(f"Built derivatives for {build_missing_derivatives(rebuild)} images")
+
+    @app.cli.command('build-panorama-tiles')
+    def build_panorama_tiles_command():
+        """Build tile pyramids and previews for panoramas that lack them."""
+        click.echo(f"Tiled {build_missing_panorama_tiles()} panoramas")
+
+    @app.cli.command('migrate-user-documents')
+    def migrate_user_documents_command():
+        """Copy users_uploaded_docs/users_downloaded_docs arrays into the per-file collections."""
+        counts = migrate_embedded_documents()
+        click.echo(f"Migrated {counts['uploaded']} uploaded and {counts['downloaded']} downloaded documents")
+
+    @app.cli.command('migrate-user-media')
+    def migrate_user_media_command():
+        """Copy the media collection's user_media arrays into user_media_items."""
+        click.echo(f"Migrated {migrate_user_media()} media items")
@@ -32,6 +32,106 @@ class Config:
     STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY')
     STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
     GOOGLE_LOCATION_API_KEY = os.getenv('GOOGLE_LOCATION_API_KEY')
+
+    # Transactional email outbox
+    MAIL_TRANSPORT = os.getenv('MAIL_TRANSPORT', 'sendgrid')  # 'sendgrid' or 'file'
+    MAIL_FILE_SINK_DIR = os.getenv('MAIL_FILE_SINK_DIR', os.path.abspath('app/mail_sink'))
+    MAIL_HTTP_TIMEOUT = int(os.getenv('MAIL_HTTP_TIMEOUT', 10))
+    MAIL_OUTBOX_WORKER_ENABLED = os.getenv('MAIL_OUTBOX_WORKER_ENABLED', 'true').lower() == 'true'
+    MAIL_OUTBOX_POLL_INTERVAL = int(os.getenv('MAIL_OUTBOX_POLL_INTERVAL', 2))
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 5))
+    MAIL_OUTBOX_RETRY_BACKOFF = int(os.getenv('MAIL_OUTBOX_RETRY_BACKOFF', 30))
+    # Sent and failed emails are removed after this many seconds
+    MAIL_OUTBOX_RETENTION = int(os.getenv('MAIL_OUTBOX_RETENTION', 30 * 24 * 3600))
+    # Attachments are copied here when queued, defaults to UPLOAD_FOLDER/outbox
+    MAIL_OUTBOX_ATTACHMENTS_DIR = os.getenv('MAIL_OUTBOX_ATTACHMENTS_DIR')
+
+    # Server-Sent Events chat stream
+    STREAM_KEEPALIVE_INTERVAL = int(os.getenv('STREAM_KEEPALIVE_INTERVAL', 15))
+    STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', 100))
+
+    # Geocoding cache, results are kept in process and in the geocode_cache collection
+    GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+    GEOCODE_MEMORY_CACHE_SIZE = int(os.getenv('GEOCODE_MEMORY_CACHE_SIZE', 2048))
+
+    # ZIP code table built with `flask build-zip-table <gazetteer file>`, without it ZIP codes
+    # are checked by prefix only. Set ZIP_TABLE_REQUIRED to refuse to start without it
+    ZIP_TABLE_PATH = os.getenv('ZIP_TABLE_PATH', os.path.abspath('app/data/zip_centroids.bin'))
+    ZIP_TABLE_REQUIRED = os.getenv('ZIP_TABLE_REQUIRED', 'false').lower() == 'true'
+
+    # Address autocomplete proxy
+    AUTOCOMPLETE_URL = os.getenv('AUTOCOMPLETE_URL', 'http://192.168.36.100/search.php')
+    AUTOCOMPLETE_TIMEOUT = float(os.getenv('AUTOCOMPLETE_TIMEOUT', 5))
+    AUTOCOMPLETE_CACHE_SIZE = int(os.getenv('AUTOCOMPLETE_CACHE_SIZE', 5000))
+    AUTOCOMPLETE_CACHE_TTL = int(os.getenv('AUTOCOMPLETE_CACHE_TTL', 3600))
+
+    # Property prefill search used by the fill-and-sign forms
+    PREFILL_URL = os.getenv('PREFILL_URL', 'http://24.152.187.23:50002/api/v1/search')
+    PREFILL_CONNECT_TIMEOUT = float(os.getenv('PREFILL_CONNECT_TIMEOUT', 3))
+    PREFILL_TIMEOUT = float(os.getenv('PREFILL_TIMEOUT', 10))
+    PREFILL_CACHE_SIZE = int(os.getenv('PREFILL_CACHE_SIZE', 2000))
+    PREFILL_CACHE_TTL = int(os.getenv('PREFILL_CACHE_TTL', 900))
+    PREFILL_BREAKER_THRESHOLD = int(os.getenv('PREFILL_BREAKER_THRESHOLD', 5))
+    PREFILL_BREAKER_RESET = int(os.getenv('PREFILL_BREAKER_RESET', 30))
+
+    # Background template catalogue indexer
+    TEMPLATE_INDEXER_ENABLED = os.getenv('TEMPLATE_INDEXER_ENABLED', 'true').lower() == 'true'
+    TEMPLATE_INDEX_INTERVAL = int(os.getenv('TEMPLATE_INDEX_INTERVAL', 60))
+
+    # Admin dashboard snapshot, rebuilt in the background every interval seconds
+    ADMIN_SNAPSHOT_ENABLED = os.getenv('ADMIN_SNAPSHOT_ENABLED', 'true').lower() == 'true'
+    ADMIN_SNAPSHOT_INTERVAL = int(os.getenv('ADMIN_SNAPSHOT_INTERVAL', 60))
+    ADMIN_SNAPSHOT_RECENT = int(os.getenv('ADMIN_SNAPSHOT_RECENT', 10))
+    ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', 50))
+    ADMIN_PAGE_SIZE_MAX = int(os.getenv('ADMIN_PAGE_SIZE_MAX', 200))
+
+    # First page previews of PDF templates
+    PREVIEW_DPI = int(os.getenv('PREVIEW_DPI', 110))
+    PREVIEW_MAX_DIMENSION = int(os.getenv('PREVIEW_MAX_DIMENSION', 1400))
+    THUMBNAIL_MAX_DIMENSION = int(os.getenv('THUMBNAIL_MAX_DIMENSION', 320))
+
+    # Process pool for CPU-bound PDF rendering, filling and stamping
+    PDF_POOL_WORKERS = int(os.getenv('PDF_POOL_WORKERS', 2))
+    PDF_POOL_MAX_QUEUE = int(os.getenv('PDF_POOL_MAX_QUEUE', 100))
+    PDF_JOB_TIMEOUT = int(os.getenv('PDF_JOB_TIMEOUT', 60))
+    PDF_POOL_START_METHOD = os.getenv('PDF_POOL_START_METHOD', 'spawn')
+    PDF_TEMPLATE_CACHE_SIZE = int(os.getenv('PDF_TEMPLATE_CACHE_SIZE', 64))
+    PDF_TEMPLATE_CACHE_TTL = int(os.getenv('PDF_TEMPLATE_CACHE_TTL', 600))
+
+    # Image derivatives and panorama tiles run in their own process pool
+    IMAGE_POOL_WORKERS = int(os.getenv('IMAGE_POOL_WORKERS', 1))
+    IMAGE_POOL_MAX_QUEUE = int(os.getenv('IMAGE_POOL_MAX_QUEUE', 200))
+    IMAGE_JOB_TIMEOUT = int(os.getenv('IMAGE_JOB_TIMEOUT', 600))
+
+    # Compiled form question schemas, the TTL bounds how stale other workers can be
+    QUESTION_SCHEMA_CACHE_SIZE = int(os.getenv('QUESTION_SCHEMA_CACHE_SIZE', 256))
+    QUESTION_SCHEMA_CACHE_TTL = int(os.getenv('QUESTION_SCHEMA_CACHE_TTL', 60))
+
+    # Media serving, set the prefix to let nginx send files through X-Accel-Redirect
+    MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', 3600))
+    MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX')
+
+    # User media library pagination
+    MEDIA_PAGE_SIZE = int(os.getenv('MEDIA_PAGE_SIZE', 50))
+    MEDIA_PAGE_SIZE_MAX = int(os.getenv('MEDIA_PAGE_SIZE_MAX', 200))
+
+    # Content-addressed upload store, defaults to UPLOAD_FOLDER/blobs. Media paths are
+    # hard links into it, so it has to be on the same filesystem to deduplicate
+    BLOB_STORE_FOLDER = os.getenv('BLOB_STORE_FOLDER')
+
+    # Optional request body limit, unset by default since the property image and panorama
+    # uploads have no resumable path. Larger files can go through the resumable /uploads API
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH')) if os.getenv('MAX_CONTENT_LENGTH') else None
+    UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024))
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    UPLOAD_CHUNK_TIMEOUT = int(os.getenv('UPLOAD_CHUNK_TIMEOUT', 300))
+    UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 3600))
+    UPLOAD_SESSIONS_FOLDER = os.getenv('UPLOAD_SESSIONS_FOLDER', os.path.abspath('app/upload_sessions'))
+
+    # Panorama tile pyramids for the 360 tour viewer
+    PANORAMA_TILE_SIZE = int(os.getenv('PANORAMA_TILE_SIZE', 512))
+    PANORAMA_PREVIEW_WIDTH = int(os.getenv('PANORAMA_PREVIEW_WIDTH', 1024))
+    PANORAMA_TILE_TIMEOUT = int(os.getenv('PANORAMA_TILE_TIMEOUT', 600))
     
     @staticmethod
     def init_app(app):
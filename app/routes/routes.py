@@ -11,6 +11,7 @@ from app.views.admin.context_processors import *
 from app.views.pre_qualified import *
 from app.views.id_verification import *
 from app.views.saved_searches import *
+from app.views.uploads import *
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -43,6 +44,7 @@ api_bp.add_url_rule(rule='/user-document/<string:doc_id>', view_func=UploadDocVi
 api_bp.add_url_rule(rule='/template-docs', view_func=AllDocsView.as_view('docs')) #templates
 api_bp.add_url_rule(rule='/template-docs/<string:document_id>', view_func=DocumentFillRequestView.as_view('docs_fill_request')) #Templates
 api_bp.add_url_rule(rule='/template-docs/answer/<string:document_id>', view_func=DocAnswerInsertionView.as_view('docs_answer-get-post')) #Templates
+api_bp.add_url_rule(rule='/template-docs/answer/<string:document_id>/batch', view_func=DocAnswerBatchInsertionView.as_view('docs_answer_batch')) #Templates
 api_bp.add_url_rule(rule='/template-docs', view_func=DocumentPrefillAnswerView.as_view('docs_prefill_answers')) #Templates
 
 #media
@@ -100,6 +102,7 @@ api_bp.add_url_rule(rule='/admin/document/mnforms/move', view_func=MoveMnFormsFi
 api_bp.add_url_rule(rule='/admin/user/actions', view_func=ActionLogsView.as_view('admin_user_action'))
 api_bp.add_url_rule(rule='/admin/user/property/chat/list', view_func=UserCustomerPropertyChatUsersListView.as_view('admin_user_property_chat_list'))
 api_bp.add_url_rule(rule='/admin/forms/question', view_func=SingleFormQuestionView.as_view('admin_forms_question'))
+api_bp.add_url_rule(rule='/admin/pdf-pool/stats', view_func=PdfPoolStatsView.as_view('admin_pdf_pool_stats'))
 
 # Buyers APIs
 api_bp.add_url_rule(rule='/users/buyer/sellers/chat', view_func=BuyerSellersChatView.as_view('buyer_sellers_chat'), methods=['POST'])
@@ -127,4 +130,8 @@ api_bp.add_url_rule(rule='/id-verification',view_func=IDVerificationView.as_view
 
 #saved search 
 api_bp.add_url_rule('/saved_searches', view_func=SavedSearchView.as_view('saved_searches'), methods=['GET', 'POST'])
-api_bp.add_url_rule('/saved_searches/<string:search_id>', view_func=SavedSearchView.as_view('saved_search'), methods=['GET', 'PUT', 'DELETE'])
\ No newline at end of file
+api_bp.add_url_rule('/saved_searches/<string:search_id>', view_func=SavedSearchView.as_view('saved_search'), methods=['GET', 'PUT', 'DELETE'])
+
+# Resumable chunked uploads
+api_bp.add_url_rule('/uploads', view_func=UploadSessionsView.as_view('uploads'), methods=['POST'])
+api_bp.add_url_rule('/uploads/<string:upload_id>', view_func=UploadSessionView.as_view('upload'), methods=['HEAD', 'GET', 'PUT', 'DELETE'])
@@ -1,9 +1,8 @@
-from flask import request, current_app, url_for
+from flask import request, current_app
 import logging
 import os
-from datetime import datetime
 
-from app.services.media import document_exists, extract_first_page_as_image, resource_exists
+from app.services.template_catalogue import sync_template_catalogue
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -63,33 +62,6 @@ def rename_filename(docname, rename, folder):
 
 
 def update_files_in_documents_db():
-    flforms_docs_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'templates', 'FL_Forms')
-    mnforms_docs_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'templates', 'MN_Forms')
-    for forms_dir in [flforms_docs_dir, mnforms_docs_dir]:
-        forms_type = "FL_Forms" if forms_dir == flforms_docs_dir else "MN_Forms"
-        for folder in os.listdir(forms_dir):
-            folder_path = os.path.join(forms_dir, folder)
-            if os.path.isdir(folder_path):
-                for file in os.listdir(folder_path):
-                    if file.endswith('.pdf'):
-                        doc_name = file
-                        doc_url = url_for('serve_media', filename=os.path.join('templates/' + forms_type, folder, file).replace('\\', '/'))
-                        preview_page_url = doc_url[:-4] + '.jpg'
-                        # Check if document already exists in MongoDB
-                        if not document_exists(doc_name):
-                            image_name = extract_first_page_as_image(os.path.join(folder_path, file))
-                            if image_name:
-                                # Check if preview image already exists in MongoDB and folder
-                                if not resource_exists(preview_page_url, doc_url):
-                                    # Store data in MongoDB
-                                    document_data = {
-                                        'name': doc_name,
-                                        'url': doc_url,
-                                        'added_at': datetime.now(),
-                                        'preview_image': preview_page_url,
-                                        'description': "",
-                                        'folder': folder,
-                                        'type': forms_type
-                                    }
-                                    current_app.db.documents.insert_one(document_data)
-                                    return document_data
+    # Index the templates right away instead of waiting for the background indexer
+    inserted = sync_template_catalogue()
+    return inserted[0] if inserted else None
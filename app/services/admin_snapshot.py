@@ -0,0 +1,181 @@
+"""
+The admin dashboard snapshot: counts and the most recent users and listed properties,
+rebuilt by a background thread in one of the worker processes into the admin_snapshot
+collection so the dashboard reads a single document. The full lists are paged through user_page and property_page.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import click
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import current_app
+
+from app.services.leases import acquire_lease
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ID = 'dashboard'
+USER_PROJECTION = {'otp': 0}
+CUSTOMER_SERVICE_OWNER = {'name': "Customer-Service", 'phone': None, 'email': None, 'profile': None, 'user_id': None}
+
+
+class InvalidCursor(ValueError):
+    """The cursor is not one returned by a page."""
+
+
+def ensure_admin_snapshot_indexes(db):
+    db.property_seller_transaction.create_index('property_id')
+
+
+def _cursor_filter(cursor):
+    try:
+        return {'_id': {'$lt': ObjectId(cursor)}}
+    except (InvalidId, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def _page(items, limit):
+    """Trim the extra row fetched to detect a next page, returns (items, next_cursor)."""
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = str(items[-1]['_id'])
+    for item in items:
+        item.pop('_id', None)
+    return items, next_cursor
+
+
+def user_page(cursor=None, limit=50):
+    """Users newest first, without their _id and OTP as the dashboard always returned them."""
+    query = _cursor_filter(cursor) if cursor else {}
+    users = list(current_app.db.users.find(query, USER_PROJECTION).sort('_id', -1).limit(limit + 1))
+    return _page(users, limit)
+
+
+def _owner_info(seller):
+    if not seller:
+        # External properties
+        return CUSTOMER_SERVICE_OWNER
+    return {
+        'name': ' '.join(filter(None, [seller.get('first_name'), seller.get('last_name')])),
+        'phone': seller.get('phone'),
+        'email': seller.get('email'),
+        'profile': seller.get('profile_pic'),
+        'user_id': seller.get('uuid')
+    }
+
+
+def property_page(cursor=None, limit=50):
+    """
+    Listed properties newest first with their owner, properties without a seller
+    transaction are left out. Transactions and sellers are joined in one aggregation.
+    """
+    pipeline = []
+    if cursor:
+        pipeline.append({'$match': _cursor_filter(cursor)})
+    pipeline += [
+        {'$sort': {'_id': -1}},
+        {'$addFields': {'property_id': {'$toString': '$_id'}}},
+        {'$lookup': {
+            'from': 'property_seller_transaction',
+            'localField': 'property_id',
+            'foreignField': 'property_id',
+            'as': 'transaction'
+        }},
+        {'$match': {'transaction.0': {'$exists': True}}},
+        {'$limit': limit + 1},
+        {'$lookup': {
+            'from': 'users',
+            'let': {'seller_id': {'$arrayElemAt': ['$transaction.seller_id', 0]}},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$uuid', '$$seller_id']}}},
+                {'$limit': 1},
+                {'$project': {'_id': 0, 'first_name': 1, 'last_name': 1, 'phone': 1, 'email': 1, 'profile_pic': 1, 'uuid': 1}}
+            ],
+            'as': 'seller'
+        }}
+    ]
+    properties = list(current_app.db.properties.aggregate(pipeline))
+    for prop in properties:
+        prop.pop('transaction', None)
+        seller = prop.pop('seller', None)
+        prop['owner_info'] = _owner_info(seller[0] if seller else None)
+    return _page(properties, limit)
+
+
+def build_admin_snapshot():
+    db = current_app.db
+    recent = current_app.config.get('ADMIN_SNAPSHOT_RECENT', 10)
+    users_by_role = {
+        str(group['_id']): group['count']
+        for group in db.users.aggregate([{'$group': {'_id': '$role', 'count': {'$sum': 1}}}])
+    }
+    listed = list(db.property_seller_transaction.aggregate([{'$group': {'_id': '$property_id'}}, {'$count': 'count'}]))
+    recent_users, _ = user_page(limit=recent)
+    recent_properties, _ = property_page(limit=recent)
+
+    snapshot = {
+        'counts': {
+            'users': sum(users_by_role.values()),
+            'users_by_role': users_by_role,
+            'properties': db.properties.estimated_document_count(),
+            'listed_properties': listed[0]['count'] if listed else 0
+        },
+        'users': recent_users,
+        'properties': recent_properties,
+        'built_at': datetime.now()
+    }
+    db.admin_snapshot.replace_one({'_id': SNAPSHOT_ID}, snapshot, upsert=True)
+    return snapshot
+
+
+def get_admin_snapshot():
+    """
+    The stored snapshot, built on the spot if the refresher has not written one yet or
+    has stopped refreshing it.
+    """
+    snapshot = current_app.db.admin_snapshot.find_one({'_id': SNAPSHOT_ID}, {'_id': 0})
+    max_age = timedelta(seconds=current_app.config.get('ADMIN_SNAPSHOT_INTERVAL', 60) * 3)
+    if snapshot is None or datetime.now() - snapshot['built_at'] > max_age:
+        snapshot = build_admin_snapshot()
+    return snapshot
+
+
+class AdminSnapshotRefresher(threading.Thread):
+    """Background thread that rebuilds the admin dashboard snapshot at a fixed interval."""
+
+    def __init__(self, app):
+        super().__init__(name='admin-snapshot-refresher', daemon=True)
+        self.app = app
+        self.interval = app.config.get('ADMIN_SNAPSHOT_INTERVAL', 60)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                # Every worker process starts a refresher, the lease holder does the work
+                if acquire_lease(self.app.db, 'admin-snapshot-refresher', self.interval * 3):
+                    with self.app.app_context():
+                        build_admin_snapshot()
+            except Exception as e:
+                logger.error(f"Admin snapshot refresh error: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+
+def start_admin_snapshot_refresher(app):
+    # Not for flask CLI commands, get_admin_snapshot builds a snapshot when it is needed
+    if not app.config.get('ADMIN_SNAPSHOT_ENABLED', True) or click.get_current_context(silent=True):
+        return None
+    try:
+        ensure_admin_snapshot_indexes(app.db)
+    except Exception as e:
+        app.logger.error(f"Failed to create admin snapshot indexes: {e}")
+    refresher = AdminSnapshotRefresher(app)
+    refresher.start()
+    app.admin_snapshot_refresher = refresher
+    return refresher
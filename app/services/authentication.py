@@ -11,11 +11,11 @@ from flask_jwt_extended import verify_jwt_in_request
 from jwt.exceptions import InvalidTokenError, DecodeError
 
 from datetime import datetime
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail as SendGridMail
 
 from email_validator  import validate_email, EmailNotValidError
 
+from app.services.mail import queue_email
+
 
 
 def get_session_files(session_id):
@@ -59,31 +59,16 @@ def check_if_token_revoked(jwt_header, jwt_payload: dict) -> bool:
     return token is not None
 
 
-def send_from_directory(directory, filename):
-   
-    safe_path = os.path.join(directory, filename)
-    if not os.path.isfile(safe_path):
-        return "File not found", 404
-
-    from flask import send_file
-    return send_file(safe_path)
-
-
 def generate_otp():
     return str(random.randint(100000, 999999))
 
 
-def send_otp_via_email(email, otp, subject):
-    message = SendGridMail(
-        from_email=current_app.config['MAIL_USERNAME'],
-        to_emails=email,
-        subject= subject,
-        plain_text_content=f'Your OTP is: {otp}')
-
+def send_otp_via_email(email, otp, subject, issued_at=None):
+    # Delivered by the outbox worker. Keyed on when the OTP was issued, so a repeated
+    # 6 digit code is still sent while a retried request does not send it twice
+    issued_at = issued_at or datetime.now()
     try:
-        sg = SendGridAPIClient(current_app.config['SENDGRID_API_KEY'])
-        response = sg.send(message)
-        print(response.status_code)
+        queue_email(email, subject, f'Your OTP is: {otp}', idempotency_key=f"otp:{email}:{otp}:{issued_at.isoformat()}")
     except Exception as e:
         print(str(e))
 
@@ -0,0 +1,94 @@
+import re
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from app.services.caching import LRUCache, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query):
+    return re.sub(r'\s+', ' ', (query or '').lower()).strip()
+
+
+def matches_query(result, query):
+    # Every complete word must appear in the result, the last one may still be typed
+    display_name = normalize_query(result.get('display_name', ''))
+    words = re.findall(r'\w+', display_name)
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return True
+    *complete, partial = terms
+    return all(term in words for term in complete) and any(word.startswith(partial) for word in words)
+
+
+class AutocompleteClient:
+    """
+    Address autocomplete proxy in front of the Nominatim style search endpoint.
+    Responses are cached per (format, limit, query). A query extending a cached prefix
+    whose result list was complete (shorter than the limit) is answered by filtering that
+    list, and identical queries in flight at the same time share one upstream call.
+    """
+
+    def __init__(self, url, timeout=5, cache_size=5000, cache_ttl=3600, pool_size=10):
+        self.url = url
+        self.timeout = timeout
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.single_flight = SingleFlight()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['AUTOCOMPLETE_URL'],
+            timeout=config.get('AUTOCOMPLETE_TIMEOUT', 5),
+            cache_size=config.get('AUTOCOMPLETE_CACHE_SIZE', 5000),
+            cache_ttl=config.get('AUTOCOMPLETE_CACHE_TTL', 3600)
+        )
+
+    def from_prefix(self, format_type, limit, query):
+        for end in range(len(query) - 1, 0, -1):
+            results = self.cache.get((format_type, limit, query[:end]))
+            if results is None:
+                continue
+            if not isinstance(results, list) or len(results) >= limit:
+                # The prefix list may have been truncated, it can't answer a longer query
+                return None
+            return [result for result in results if isinstance(result, dict) and matches_query(result, query)]
+        return None
+
+    def fetch(self, format_type, limit, query):
+        response = self.session.get(
+            self.url,
+            params={'format': format_type, 'q': query, 'limit': limit},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def search(self, query, limit=5, format_type='json'):
+        query = normalize_query(query)
+        key = (format_type, limit, query)
+        results = self.cache.get(key)
+        if results is not None:
+            return results
+
+        results = self.from_prefix(format_type, limit, query)
+        if not results:
+            results = self.single_flight.do(key, self.fetch, format_type, limit, query)
+        self.cache.set(key, results)
+        return results
+
+
+def get_autocomplete_client():
+    client = current_app.extensions.get('autocomplete_client')
+    if client is None:
+        client = AutocompleteClient.from_config(current_app.config)
+        current_app.extensions['autocomplete_client'] = client
+    return client
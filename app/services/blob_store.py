@@ -0,0 +1,164 @@
+"""
+Content-addressed storage for uploads. Every upload is hashed while it is written
+and kept once under blobs/<ab>/<cd>/<sha256>. The timestamped path the views hand out
+is a hard link to that blob, so existing media URLs keep working unchanged, and
+media_paths maps each of those paths to its digest. media_blobs counts the paths
+sharing a blob, which is removed with its last path.
+"""
+import os
+import uuid
+import fcntl
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+
+from flask import current_app
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# ioctl of Linux filesystems with shared extents (btrfs, XFS), fcntl only names it from Python 3.12
+FICLONE = getattr(fcntl, 'FICLONE', 0x40049409)
+
+
+def blob_root():
+    return current_app.config.get('BLOB_STORE_FOLDER') or os.path.join(current_app.config['UPLOAD_FOLDER'], 'blobs')
+
+
+def blob_path(digest):
+    # Two levels of fan-out keep directories small
+    return os.path.join(blob_root(), digest[:2], digest[2:4], digest)
+
+
+def relative_media_path(path):
+    return os.path.relpath(path, current_app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+
+
+def _write_hashed(stream, tmp_path):
+    digest = hashlib.sha256()
+    size = 0
+    with open(tmp_path, 'wb') as f:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def _link(source, path):
+    try:
+        os.link(source, path)
+    except FileExistsError:
+        os.remove(path)
+        os.link(source, path)
+    except OSError as e:
+        if isinstance(e, FileNotFoundError):
+            raise
+        # Blob store on another filesystem, keep a full copy rather than fail the upload
+        logger.warning('Hard link to %s failed (%s), copying instead', source, e)
+        shutil.copyfile(source, path)
+
+
+def _reflink(source, path):
+    with open(source, 'rb') as src, open(path, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def clone_file(source, path):
+    """
+    Copy source to path, a reflink where the filesystem shares extents, otherwise a
+    full copy. Never a hard link: templates are written in place, a link would change
+    every document cloned from them. The copy is placed with os.replace, readers never
+    see a partial file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        try:
+            _reflink(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def store_stream(stream, path):
+    """
+    Store the bytes of stream as the media file at path, an absolute path below
+    UPLOAD_FOLDER. Returns the sha256 digest of the content.
+    """
+    tmp_dir = os.path.join(blob_root(), 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    try:
+        digest, size = _write_hashed(stream, tmp_path)
+        return store_file(tmp_path, path, digest, size)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def store_file(tmp_path, path, digest, size):
+    """Adopt an already hashed temporary file as the media file at path, tmp_path is consumed."""
+    # Counted before the blob is placed, so a concurrent release never removes it under us
+    current_app.db.media_blobs.update_one(
+        {'_id': digest},
+        {'$inc': {'refcount': 1}, '$setOnInsert': {'size': size, 'created_at': datetime.now()}},
+        upsert=True
+    )
+    target = blob_path(digest)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if not os.path.exists(target):
+        os.replace(tmp_path, target)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        _link(target, path)
+    except FileNotFoundError:
+        # The blob was released between the existence check and the link
+        os.replace(tmp_path, target)
+        _link(target, path)
+
+    previous = current_app.db.media_paths.find_one_and_update(
+        {'_id': relative_media_path(path)},
+        {'$set': {'digest': digest, 'size': size, 'stored_at': datetime.now()}},
+        upsert=True
+    )
+    if previous:
+        # The path was overwritten, its old content (possibly the same blob) loses a reference
+        _release_blob(previous['digest'])
+    return digest
+
+
+def save_upload(file, path):
+    """Drop-in for FileStorage.save(path) that stores the upload through the blob store."""
+    return store_stream(file.stream, path)
+
+
+def _release_blob(digest):
+    blob = current_app.db.media_blobs.find_one_and_update(
+        {'_id': digest}, {'$inc': {'refcount': -1}}, return_document=ReturnDocument.AFTER
+    )
+    if blob and blob['refcount'] <= 0:
+        if current_app.db.media_blobs.delete_one({'_id': digest, 'refcount': {'$lte': 0}}).deleted_count:
+            try:
+                os.remove(blob_path(digest))
+            except FileNotFoundError:
+                pass
+
+
+def release_path(path):
+    """Remove the media file at path and drop its reference on the blob behind it."""
+    if os.path.exists(path):
+        os.remove(path)
+    mapping = current_app.db.media_paths.find_one_and_delete({'_id': relative_media_path(path)})
+    if mapping:
+        _release_blob(mapping['digest'])
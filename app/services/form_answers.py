@@ -0,0 +1,166 @@
+import os
+import uuid
+import fcntl
+import logging
+import urllib.parse
+from datetime import datetime
+
+from bson import ObjectId
+from flask import current_app
+from pymongo import ReturnDocument
+
+from app.services.blob_store import clone_file
+from app.services.caching import SingleFlight
+from app.services.pdf_fill import render_filled_pdf
+from app.services.pdf_pool import PRIORITY_INTERACTIVE, get_pdf_pool
+from app.services.pdf_templates import get_parsed_template
+
+logger = logging.getLogger(__name__)
+
+# Concurrent downloads of the same pending document share one render
+_renders = SingleFlight()
+
+
+def ensure_form_answer_indexes(db):
+    db.user_document_answers.create_index([('uuid', 1), ('doc_url', 1)], unique=True)
+    db.user_document_answers.create_index('media_path', unique=True)
+
+
+def media_path_from_url(doc_url):
+    return urllib.parse.unquote(doc_url.split('/media/')[-1])
+
+
+def user_doc_path(record):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], record['media_path'])
+
+
+def create_answer_record(user, document_id, doc_url, doc_name):
+    """
+    Start the answer record of a user's copy of a template. Answers are stored here and
+    the PDF is only rendered from the template when it is needed, nothing is written to
+    disk for a copy that is never downloaded or signed.
+    """
+    now = datetime.now()
+    record = {
+        'uuid': user['uuid'],
+        'document_id': str(document_id),
+        'doc_url': doc_url,
+        'doc_name': doc_name,
+        'media_path': media_path_from_url(doc_url),
+        'answers': {},
+        'version': 0,
+        'materialized_version': 0,
+        'created_at': now,
+        'updated_at': now
+    }
+    record['_id'] = current_app.db.user_document_answers.insert_one(record).inserted_id
+    return record
+
+
+def get_answer_record(user, doc_url):
+    return current_app.db.user_document_answers.find_one({'uuid': user['uuid'], 'doc_url': doc_url})
+
+
+def delete_answer_record(user, doc_url):
+    record = current_app.db.user_document_answers.find_one_and_delete({'uuid': user['uuid'], 'doc_url': doc_url})
+    if record:
+        try:
+            os.remove(f'{user_doc_path(record)}.lock')
+        except FileNotFoundError:
+            pass
+    return record
+
+
+def save_answers(record, answers):
+    """Store answers ({question_id, answer, values}) on the record and bump its version."""
+    now = datetime.now()
+    fields = {
+        f"answers.{item['question_id']}": {'answer': item['answer'], 'values': item.get('values'), 'answered_at': now}
+        for item in answers
+    }
+    fields['updated_at'] = now
+    return current_app.db.user_document_answers.find_one_and_update(
+        {'_id': record['_id']},
+        {'$set': fields, '$inc': {'version': 1}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def is_materialized(record):
+    return record.get('materialized_version', 0) >= record.get('version', 0) and os.path.isfile(user_doc_path(record))
+
+
+def _render(record, priority):
+    document = current_app.db.documents.find_one({'_id': ObjectId(record['document_id'])})
+    if not document:
+        raise FileNotFoundError('Template document not found')
+    template = get_parsed_template(document)
+
+    fill_batch = []
+    for question_id, stored in record.get('answers', {}).items():
+        question = template.question(question_id)
+        if not question:
+            # The question was removed from the template after it was answered
+            continue
+        fill_batch.append({
+            'question_id': question_id,
+            'answer_locations': question.get('answer_locations', []),
+            'answer': stored['answer'],
+            'values': stored.get('values')
+        })
+
+    path = user_doc_path(record)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rendered_path = f"{path}.v{record['version']}.{uuid.uuid4().hex}.tmp"
+    try:
+        if fill_batch:
+            get_pdf_pool().run(render_filled_pdf, template.pdf_bytes, fill_batch, rendered_path, priority=priority)
+        else:
+            # Nothing to draw yet, a plain copy of the template
+            clone_file(template.path, rendered_path)
+        _publish(record, rendered_path, path)
+    finally:
+        if os.path.exists(rendered_path):
+            os.remove(rendered_path)
+    return path
+
+
+def _publish(record, rendered_path, path):
+    """
+    Move a rendered version into place unless a newer one got there first. Renders of
+    different versions can finish in any order, the check and the replace happen under
+    a lock on the document so an older render never overwrites a newer file.
+    """
+    with open(f'{path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            claimed = current_app.db.user_document_answers.update_one(
+                {'_id': record['_id'], 'materialized_version': {'$lt': record['version']}},
+                {'$set': {'materialized_version': record['version'], 'materialized_at': datetime.now()}}
+            ).matched_count
+            if claimed or not os.path.isfile(path):
+                os.replace(rendered_path, path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def materialize(record, priority=PRIORITY_INTERACTIVE):
+    """Render the user's PDF from the template and its stored answers unless it is up to date."""
+    if is_materialized(record):
+        return user_doc_path(record)
+    return _renders.do((str(record['_id']), record['version']), _render, record, priority)
+
+
+def materialize_media_path(relative_path):
+    """Bring a user document up to date before it is served, other media paths are left alone."""
+    if not relative_path.startswith('user_docs/') or not relative_path.lower().endswith('.pdf'):
+        return None
+    record = current_app.db.user_document_answers.find_one({'media_path': relative_path})
+    if not record:
+        return None
+    try:
+        return materialize(record)
+    except Exception:
+        # Serve the last rendered copy rather than failing the download
+        logger.exception('Failed to render %s', relative_path)
+        return None
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from flask import current_app
+from pymongo.errors import DuplicateKeyError
+
+from app.services.caching import LRUCache
+
+CHECKBOX_CHOICE_TYPES = ('multiple-checkbox-single-choice-answer', 'multiple-checkbox-multiple-choice-answer')
+
+
+def compile_question(question):
+    """The client facing description of one question, None when it has no answer locations yet."""
+    answer_locations = question.get('answer_locations', [])
+    if not answer_locations:
+        return None
+
+    input_type = answer_locations[0].get('answerInputType')
+    question_info = {
+        'question_id': str(question['_id']),
+        'text': question.get('text'),
+        'type': question.get('type'),
+        'answer_input_type': input_type,
+        'answer_data_type': answer_locations[0].get('answerOutputType')
+    }
+    if input_type in CHECKBOX_CHOICE_TYPES:
+        values = {}
+        for location in answer_locations:
+            values.setdefault(location['position'], []).append(location['value'])
+        question_info['values'] = values
+    elif input_type == 'multiline':
+        max_width = {}
+        for location in answer_locations:
+            max_width.setdefault(location['position'], []).append(location['endX'] - location['startX'])
+        question_info['max_width'] = max_width
+    elif input_type == 'single-line':
+        question_info['max_width'] = [location['endX'] - location['startX'] for location in answer_locations]
+    return question_info
+
+
+def compile_question_schema(doc_questions):
+    return [info for info in (compile_question(question) for question in doc_questions) if info]
+
+
+def get_schema_cache():
+    cache = current_app.extensions.get('question_schema_cache')
+    if cache is None:
+        cache = LRUCache(
+            maxsize=current_app.config.get('QUESTION_SCHEMA_CACHE_SIZE', 256),
+            ttl=current_app.config.get('QUESTION_SCHEMA_CACHE_TTL', 60)
+        )
+        current_app.extensions['question_schema_cache'] = cache
+    return cache
+
+
+def rebuild_question_schema(document_id):
+    """
+    Compile the questions of a document into doc_question_schemas under a new version.
+    The write only succeeds on the version read before the questions were, so a rebuild
+    that read older questions can never overwrite a newer one, it retries instead.
+    """
+    document_id = str(document_id)
+    collection = current_app.db.doc_question_schemas
+    while True:
+        current = collection.find_one({'_id': document_id}, {'version': 1})
+        questions = compile_question_schema(current_app.db.doc_questions_answers.find({'document_id': document_id}))
+        schema = {'_id': document_id, 'questions': questions, 'compiled_at': datetime.now()}
+        if current is None:
+            schema['version'] = 1
+            try:
+                collection.insert_one(schema)
+                break
+            except DuplicateKeyError:
+                continue
+        schema['version'] = current.get('version', 0) + 1
+        if collection.replace_one({'_id': document_id, 'version': current.get('version')}, schema).matched_count:
+            break
+    get_schema_cache().set(document_id, schema)
+    return schema
+
+
+def get_schema_version(document_id):
+    """The stored schema version of a document, compiling its schema when there is none yet."""
+    stored = current_app.db.doc_question_schemas.find_one({'_id': str(document_id)}, {'version': 1})
+    if stored is None:
+        return rebuild_question_schema(document_id)['version']
+    return stored.get('version')
+
+
+def get_question_schema(document_id):
+    """
+    The compiled question schema of a document. The in-process copy is only used while
+    its version matches the stored one, any worker's rebuild invalidates it everywhere.
+    Schemas are only compiled here for documents whose questions predate them.
+    """
+    document_id = str(document_id)
+    cache = get_schema_cache()
+    schema = cache.get(document_id)
+    if schema is not None and schema.get('version') == get_schema_version(document_id):
+        return schema
+    schema = current_app.db.doc_question_schemas.find_one({'_id': document_id})
+    if schema is None:
+        return rebuild_question_schema(document_id)
+    cache.set(document_id, schema)
+    return schema
@@ -0,0 +1,100 @@
+import re
+import logging
+from datetime import datetime
+
+from flask import current_app, g
+from geopy.geocoders import GoogleV3
+from pymongo import ASCENDING
+
+from app.services.caching import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodeResult:
+    """The parts of a geopy Location the app uses, in a form that can be cached in Mongo."""
+
+    def __init__(self, latitude, longitude, address=None, raw=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.address = address
+        self.raw = raw or {}
+
+    @classmethod
+    def from_location(cls, location):
+        return cls(location.latitude, location.longitude, location.address, location.raw)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['latitude'], data['longitude'], data.get('address'), data.get('raw'))
+
+    def to_dict(self):
+        return {'latitude': self.latitude, 'longitude': self.longitude, 'address': self.address, 'raw': self.raw}
+
+
+def normalize_address(address):
+    address = (address or '').lower()
+    address = re.sub(r'[.#]', ' ', address)
+    address = re.sub(r'\s*,\s*', ', ', address)
+    return re.sub(r'\s+', ' ', address).strip(' ,')
+
+
+def ensure_geocode_cache_indexes(db, ttl):
+    db.geocode_cache.create_index([('created_at', ASCENDING)], expireAfterSeconds=ttl)
+
+
+def get_geocoder():
+    # Tests can put a fake with a geocode(address) method in app.extensions['geocoder']
+    geocoder = current_app.extensions.get('geocoder')
+    if geocoder is None:
+        geocoder = GoogleV3(api_key=current_app.config['GOOGLE_LOCATION_API_KEY'])
+        current_app.extensions['geocoder'] = geocoder
+    return geocoder
+
+
+def get_memory_cache():
+    cache = current_app.extensions.get('geocode_memory_cache')
+    if cache is None:
+        cache = LRUCache(
+            maxsize=current_app.config.get('GEOCODE_MEMORY_CACHE_SIZE', 2048),
+            ttl=current_app.config.get('GEOCODE_CACHE_TTL', 30 * 24 * 3600)
+        )
+        current_app.extensions['geocode_memory_cache'] = cache
+    return cache
+
+
+def geocode_address(address):
+    """
+    Geocode an address through the request, process and Mongo caches, in that order.
+    Returns a GeocodeResult or None when the geocoder found nothing. Geocoder errors
+    are raised to the caller and never cached.
+    """
+    key = normalize_address(address)
+    if not key:
+        return None
+
+    # Lookups in the same request share one result, including "not found"
+    request_results = g.setdefault('geocode_results', {})
+    if key in request_results:
+        return request_results[key]
+
+    memory_cache = get_memory_cache()
+    result = memory_cache.get(key)
+    if result is None:
+        cached = current_app.db.geocode_cache.find_one({'_id': key})
+        if cached:
+            result = GeocodeResult.from_dict(cached['result'])
+        else:
+            location = get_geocoder().geocode(address)
+            if location:
+                result = GeocodeResult.from_location(location)
+                current_app.db.geocode_cache.update_one(
+                    {'_id': key},
+                    {'$set': {'result': result.to_dict(), 'created_at': datetime.now()}},
+                    upsert=True
+                )
+        if result is not None:
+            memory_cache.set(key, result)
+
+    request_results[key] = result
+    return result
@@ -0,0 +1,104 @@
+import os
+import logging
+import urllib.parse
+from datetime import datetime
+
+from bson import ObjectId
+from flask import current_app
+
+from app.services.image_jobs import DERIVATIVE_FORMATS, DERIVATIVE_SIZES, build_image_derivatives, derivative_name
+from app.services.pdf_pool import PRIORITY_BACKGROUND, get_image_pool
+
+logger = logging.getLogger(__name__)
+
+
+def image_path_from_url(image_url):
+    relative_path = urllib.parse.unquote(image_url.split('/media/')[-1])
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path)
+
+
+def derivative_urls(image_url, derivatives):
+    # Derivatives sit next to the original, so their URLs only differ in the file name
+    base_url = image_url.rsplit('/', 1)[0]
+    urls = {}
+    for size_name, entry in derivatives.items():
+        urls[size_name] = {
+            'width': entry['width'],
+            'height': entry['height'],
+            'webp': f"{base_url}/{urllib.parse.quote(entry['webp'])}",
+            'jpg': f"{base_url}/{urllib.parse.quote(entry['jpg'])}"
+        }
+    return urls
+
+
+def remove_image_derivatives(image_path):
+    """Remove every derivative file of an original, whether it was built or not."""
+    directory, filename = os.path.split(image_path)
+    for size_name in DERIVATIVE_SIZES:
+        for extension in DERIVATIVE_FORMATS:
+            try:
+                os.remove(os.path.join(directory, derivative_name(filename, size_name, extension)))
+            except FileNotFoundError:
+                pass
+
+
+def _record_derivatives(app, property_id, image_name, image_url, future):
+    with app.app_context():
+        try:
+            derivatives = future.result()
+        except Exception as e:
+            logger.error(f"Failed to build derivatives of {image_url}: {e}")
+            return
+        result = current_app.db.properties.update_one(
+            {'_id': ObjectId(property_id), 'images': {'$elemMatch': {'name': image_name, 'image_url': image_url}}},
+            {'$set': {
+                'images.$.derivatives': derivative_urls(image_url, derivatives),
+                'images.$.derivatives_built_at': datetime.now()
+            }}
+        )
+        if result.matched_count == 0:
+            # The image was deleted while its derivatives were being built
+            remove_image_derivatives(image_path_from_url(image_url))
+
+
+def schedule_image_derivatives(property_id, image):
+    """
+    Queue the derivatives of one images entry ({name, image_url}) as background work
+    in the process pool. The entry is updated with their URLs once they are written.
+    """
+    app = current_app._get_current_object()
+    try:
+        future = get_image_pool().submit(
+            build_image_derivatives, image_path_from_url(image['image_url']), priority=PRIORITY_BACKGROUND
+        )
+    except Exception as e:
+        # The original is stored either way, `flask build-image-derivatives` catches up later
+        logger.warning(f"Could not queue derivatives of {image['image_url']}: {e}")
+        return None
+    future.add_done_callback(
+        lambda done: _record_derivatives(app, property_id, image['name'], image['image_url'], done)
+    )
+    return future
+
+
+def build_missing_derivatives(rebuild=False):
+    """Build derivatives for every property image lacking them, returns how many were built."""
+    query = {} if rebuild else {'images': {'$elemMatch': {'derivatives': {'$exists': False}}}}
+    built = 0
+    for property_data in current_app.db.properties.find(query, {'images': 1}):
+        for image in property_data.get('images') or []:
+            if not image.get('image_url') or (image.get('derivatives') and not rebuild):
+                continue
+            path = image_path_from_url(image['image_url'])
+            if not os.path.isfile(path):
+                continue
+            derivatives = get_image_pool().run(build_image_derivatives, path, priority=PRIORITY_BACKGROUND)
+            current_app.db.properties.update_one(
+                {'_id': property_data['_id'], 'images.name': image['name']},
+                {'$set': {
+                    'images.$.derivatives': derivative_urls(image['image_url'], derivatives),
+                    'images.$.derivatives_built_at': datetime.now()
+                }}
+            )
+            built += 1
+    return built
@@ -0,0 +1,131 @@
+"""
+Image jobs that run inside the process pool, like the PDF jobs in pdf_fill they only
+take and return plain values and paths.
+"""
+import os
+import json
+import uuid
+
+from PIL import Image, ImageOps
+
+# name: longest side in pixels
+DERIVATIVE_SIZES = {'thumb': 320, 'card': 800, 'full': 1920}
+DERIVATIVE_FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}), 'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+
+
+def derivative_name(filename, size_name, extension):
+    return f'{os.path.splitext(filename)[0]}_{size_name}.{extension}'
+
+
+def _is_current(path, source_mtime):
+    return os.path.exists(path) and os.path.getmtime(path) >= source_mtime
+
+
+def build_image_derivatives(source_path, sizes=None):
+    """
+    Write resized WebP and JPEG copies of the image next to it, with the EXIF
+    orientation applied and the metadata dropped. Derivatives newer than the source
+    are kept, so re-running is cheap. Returns {size_name: {format: filename, 'width',
+    'height'}}.
+    """
+    sizes = sizes or DERIVATIVE_SIZES
+    directory, filename = os.path.split(source_path)
+    source_mtime = os.path.getmtime(source_path)
+    derivatives = {}
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+
+        for size_name, max_side in sorted(sizes.items(), key=lambda item: -item[1]):
+            resized = image.copy()
+            # Never upscale, small originals keep their size
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+            entry = {'width': resized.width, 'height': resized.height}
+
+            for extension, (image_format, options) in DERIVATIVE_FORMATS.items():
+                name = derivative_name(filename, size_name, extension)
+                entry[extension] = name
+                path = os.path.join(directory, name)
+                if _is_current(path, source_mtime):
+                    continue
+                output = resized if image_format != 'JPEG' or resized.mode == 'RGB' else resized.convert('RGB')
+                tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+                try:
+                    output.save(tmp_path, format=image_format, **options)
+                    os.replace(tmp_path, path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+
+            derivatives[size_name] = entry
+            # Each smaller size is resized from the previous one, cheaper than from the original
+            image = resized
+    return derivatives
+
+
+def _save_jpeg(image, path, quality=82):
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        image.save(tmp_path, format='JPEG', quality=quality, optimize=True)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def build_panorama_tiles(source_path, output_dir, tile_size=512, preview_width=1024):
+    """
+    Cut an equirectangular panorama into a tile pyramid under output_dir: level 0 fits
+    in a single tile row, every next level doubles the width up to the original, and
+    each level is stored as <level>/<row>_<col>.jpg. A preview.jpg of preview_width is
+    written alongside. Returns the manifest the viewer needs, which is also written as
+    manifest.json; an existing manifest newer than the source is returned as is.
+    """
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    if _is_current(manifest_path, os.path.getmtime(source_path)):
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    os.makedirs(output_dir, exist_ok=True)
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+
+    full_width, full_height = image.size
+    level_count = 1
+    while (tile_size * 2 ** (level_count - 1)) * 2 < full_width:
+        level_count += 1
+
+    levels = []
+    for level in range(level_count):
+        scale = 2 ** (level_count - 1 - level)
+        width, height = max(1, full_width // scale), max(1, full_height // scale)
+        level_image = image if scale == 1 else image.resize((width, height), Image.LANCZOS)
+        cols, rows = -(-width // tile_size), -(-height // tile_size)
+        level_dir = os.path.join(output_dir, str(level))
+        os.makedirs(level_dir, exist_ok=True)
+        for row in range(rows):
+            for col in range(cols):
+                box = (col * tile_size, row * tile_size, min((col + 1) * tile_size, width), min((row + 1) * tile_size, height))
+                _save_jpeg(level_image.crop(box), os.path.join(level_dir, f'{row}_{col}.jpg'))
+        levels.append({'level': level, 'width': width, 'height': height, 'cols': cols, 'rows': rows})
+
+    preview = image.resize((preview_width, max(1, preview_width * full_height // full_width)), Image.LANCZOS)
+    _save_jpeg(preview, os.path.join(output_dir, 'preview.jpg'), quality=75)
+
+    manifest = {
+        'projection': 'equirectangular',
+        'tile_size': tile_size,
+        'tile_path': '{level}/{row}_{col}.jpg',
+        'width': full_width,
+        'height': full_height,
+        'levels': levels,
+        'preview': 'preview.jpg'
+    }
+    # Written last, its presence marks a complete pyramid
+    tmp_path = f'{manifest_path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    return manifest
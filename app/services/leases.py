@@ -0,0 +1,33 @@
+"""
+Leases in the background_leases collection, so periodic jobs started in every worker
+process only run in one of them. The holder renews its lease on every run, another
+process takes it over once it has expired.
+"""
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+# One owner id per process, threads of the same process share their leases
+PROCESS_OWNER = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def acquire_lease(db, name, ttl, owner=PROCESS_OWNER):
+    """Take or renew the lease called name for ttl seconds, returns False while another process holds it."""
+    now = datetime.now()
+    try:
+        db.background_leases.update_one(
+            {'_id': name, '$or': [{'owner': owner}, {'expires_at': {'$lte': now}}]},
+            {'$set': {'owner': owner, 'expires_at': now + timedelta(seconds=ttl), 'renewed_at': now}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease exists, is held by someone else and has not expired
+        return False
+    return True
+
+
+def release_lease(db, name, owner=PROCESS_OWNER):
+    db.background_leases.delete_one({'_id': name, 'owner': owner})
@@ -0,0 +1,305 @@
+import os
+import re
+import json
+import uuid
+import base64
+import hashlib
+import logging
+import mimetypes
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_SEND_URL = 'https://api.sendgrid.com/v3/mail/send'
+
+OUTBOX_PENDING = 'pending'
+OUTBOX_SENDING = 'sending'
+OUTBOX_SENT = 'sent'
+OUTBOX_FAILED = 'failed'
+
+
+class MailTransportError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def build_sendgrid_payload(email, from_email):
+    payload = {
+        'personalizations': [{'to': [{'email': email['to']}]}],
+        'from': {'email': from_email},
+        'subject': email['subject'],
+        'content': [{'type': 'text/plain', 'value': email['text']}]
+    }
+    attachments = []
+    for attachment in email.get('attachments', []):
+        with open(attachment['path'], 'rb') as f:
+            encoded = base64.b64encode(f.read()).decode('utf-8')
+        attachments.append({
+            'content': encoded,
+            'type': attachment['type'],
+            'filename': attachment['filename'],
+            'disposition': 'attachment'
+        })
+    if attachments:
+        payload['attachments'] = attachments
+    return payload
+
+
+class SendGridTransport:
+    """Delivers outbox emails through the SendGrid v3 REST API over a pooled session."""
+
+    def __init__(self, api_key, from_email, timeout=10, pool_size=4):
+        self.from_email = from_email
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        })
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def send(self, email):
+        try:
+            payload = build_sendgrid_payload(email, self.from_email)
+        except OSError as e:
+            raise MailTransportError(f'Unable to read attachment: {e}', retryable=False)
+
+        try:
+            response = self.session.post(SENDGRID_SEND_URL, json=payload, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise MailTransportError(str(e))
+
+        if 200 <= response.status_code < 300:
+            return response.status_code
+        # 429 and 5xx are transient, any other 4xx will fail the same way on every attempt
+        retryable = response.status_code == 429 or response.status_code >= 500
+        raise MailTransportError(f'SendGrid returned {response.status_code}: {response.text}', retryable=retryable)
+
+
+class FileSinkTransport:
+    """Writes outbox emails as JSON files instead of sending them, for offline testing."""
+
+    def __init__(self, directory, from_email=None):
+        self.directory = directory
+        self.from_email = from_email
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, email):
+        message = {
+            'idempotency_key': email['idempotency_key'],
+            'from': self.from_email,
+            'to': email['to'],
+            'subject': email['subject'],
+            'text': email['text'],
+            'attachments': [
+                {
+                    'filename': attachment['filename'],
+                    'type': attachment['type'],
+                    'size': os.path.getsize(attachment['path']) if os.path.isfile(attachment['path']) else None
+                }
+                for attachment in email.get('attachments', [])
+            ],
+            'written_at': datetime.now().isoformat()
+        }
+        safe_key = re.sub(r'[^A-Za-z0-9_.-]', '_', email['idempotency_key'])
+        filename = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{safe_key}.json"
+        with open(os.path.join(self.directory, filename), 'w') as f:
+            json.dump(message, f, indent=2)
+        return 202
+
+
+def get_mail_transport(config):
+    if config.get('MAIL_TRANSPORT') == 'file':
+        return FileSinkTransport(config['MAIL_FILE_SINK_DIR'], config.get('MAIL_USERNAME'))
+    return SendGridTransport(
+        config.get('SENDGRID_API_KEY'),
+        config.get('MAIL_USERNAME'),
+        timeout=config.get('MAIL_HTTP_TIMEOUT', 10)
+    )
+
+
+def ensure_outbox_indexes(db, retention=None):
+    db.email_outbox.create_index([('idempotency_key', ASCENDING)], unique=True)
+    db.email_outbox.create_index([('status', ASCENDING), ('next_attempt_at', ASCENDING)])
+    if retention:
+        # Only sent and permanently failed emails carry finished_at, pending ones never expire.
+        # Their idempotency keys are released with them
+        db.email_outbox.create_index([('finished_at', ASCENDING)], expireAfterSeconds=retention)
+
+
+def outbox_attachment_dir():
+    return current_app.config.get('MAIL_OUTBOX_ATTACHMENTS_DIR') or os.path.join(current_app.config['UPLOAD_FOLDER'], 'outbox')
+
+
+def snapshot_attachment(path):
+    """
+    Copy a file into the outbox attachment folder so the email carries the content as it
+    was when queued, even if the original is rewritten before delivery. The copy is
+    removed once the email is sent or has failed for good.
+    """
+    directory = outbox_attachment_dir()
+    os.makedirs(directory, exist_ok=True)
+    snapshot_path = os.path.join(directory, uuid.uuid4().hex + os.path.splitext(path)[1])
+    digest = hashlib.sha256()
+    with open(path, 'rb') as src, open(snapshot_path, 'wb') as dst:
+        for chunk in iter(lambda: src.read(1024 * 1024), b''):
+            digest.update(chunk)
+            dst.write(chunk)
+    return {
+        'path': snapshot_path,
+        'filename': os.path.basename(path),
+        'type': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+        'sha256': digest.hexdigest()
+    }
+
+
+def remove_attachment_snapshots(attachments):
+    directory = os.path.abspath(outbox_attachment_dir())
+    for attachment in attachments or []:
+        # Emails queued before attachments were snapshotted point at the original files
+        if os.path.dirname(os.path.abspath(attachment['path'])) != directory:
+            continue
+        try:
+            os.remove(attachment['path'])
+        except FileNotFoundError:
+            pass
+
+
+def queue_email(to_email, subject, text, attachment_paths=None, idempotency_key=None, attachments=None):
+    """
+    Add an email to the outbox. Emails sharing an idempotency key are only queued once.
+    Attachments are snapshotted when queued, attachment_paths are snapshotted here and
+    attachments are ones already taken with snapshot_attachment. Returns the idempotency
+    key of the queued (or already queued) email.
+    """
+    idempotency_key = idempotency_key or str(uuid.uuid4())
+    attachments = list(attachments or []) + [snapshot_attachment(path) for path in attachment_paths or []]
+
+    now = datetime.now()
+    email = {
+        'idempotency_key': idempotency_key,
+        'to': to_email,
+        'subject': subject,
+        'text': text,
+        'attachments': attachments,
+        'status': OUTBOX_PENDING,
+        'attempts': 0,
+        'last_error': None,
+        'created_at': now,
+        'next_attempt_at': now
+    }
+    try:
+        current_app.db.email_outbox.insert_one(email)
+    except DuplicateKeyError:
+        remove_attachment_snapshots(attachments)
+        logger.info(f"Email with idempotency key {idempotency_key} is already queued.")
+    return idempotency_key
+
+
+class EmailOutboxWorker(threading.Thread):
+    """Background thread that drains the email outbox through the configured transport."""
+
+    def __init__(self, app, transport=None):
+        super().__init__(name='email-outbox-worker', daemon=True)
+        self.app = app
+        self.transport = transport or get_mail_transport(app.config)
+        self.poll_interval = app.config.get('MAIL_OUTBOX_POLL_INTERVAL', 2)
+        self.max_attempts = app.config.get('MAIL_OUTBOX_MAX_ATTEMPTS', 5)
+        self.retry_backoff = app.config.get('MAIL_OUTBOX_RETRY_BACKOFF', 30)
+        self.lock_timeout = timedelta(seconds=app.config.get('MAIL_OUTBOX_LOCK_TIMEOUT', 300))
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    delivered = self.drain()
+            except Exception as e:
+                logger.error(f"Email outbox worker error: {str(e)}")
+                delivered = 0
+            if not delivered:
+                self._stop_event.wait(self.poll_interval)
+
+    def claim_next(self):
+        now = datetime.now()
+        # Emails stuck in "sending" belonged to a worker that died mid-delivery
+        return self.app.db.email_outbox.find_one_and_update(
+            {'$or': [
+                {'status': OUTBOX_PENDING, 'next_attempt_at': {'$lte': now}},
+                {'status': OUTBOX_SENDING, 'locked_at': {'$lte': now - self.lock_timeout}}
+            ]},
+            {'$set': {'status': OUTBOX_SENDING, 'locked_at': now}, '$inc': {'attempts': 1}},
+            sort=[('next_attempt_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def drain(self):
+        delivered = 0
+        while not self._stop_event.is_set():
+            email = self.claim_next()
+            if not email:
+                break
+            self.deliver(email)
+            delivered += 1
+        return delivered
+
+    def deliver(self, email):
+        try:
+            self.transport.send(email)
+        except MailTransportError as e:
+            self.mark_failed(email, str(e), e.retryable)
+            return
+        except Exception as e:
+            self.mark_failed(email, str(e), True)
+            return
+
+        now = datetime.now()
+        self.app.db.email_outbox.update_one(
+            {'_id': email['_id']},
+            {'$set': {'status': OUTBOX_SENT, 'sent_at': now, 'finished_at': now, 'last_error': None},
+             '$unset': {'locked_at': ''}}
+        )
+        remove_attachment_snapshots(email.get('attachments'))
+
+    def mark_failed(self, email, error, retryable):
+        if retryable and email['attempts'] < self.max_attempts:
+            delay = self.retry_backoff * (2 ** (email['attempts'] - 1))
+            update = {
+                'status': OUTBOX_PENDING,
+                'next_attempt_at': datetime.now() + timedelta(seconds=delay),
+                'last_error': error
+            }
+            logger.warning(f"Email {email['idempotency_key']} failed (attempt {email['attempts']}), retrying in {delay}s: {error}")
+        else:
+            now = datetime.now()
+            update = {'status': OUTBOX_FAILED, 'failed_at': now, 'finished_at': now, 'last_error': error}
+            logger.error(f"Email {email['idempotency_key']} failed permanently: {error}")
+            remove_attachment_snapshots(email.get('attachments'))
+        self.app.db.email_outbox.update_one(
+            {'_id': email['_id']},
+            {'$set': update, '$unset': {'locked_at': ''}}
+        )
+
+
+def start_email_outbox_worker(app):
+    if not app.config.get('MAIL_OUTBOX_WORKER_ENABLED', True):
+        return None
+    try:
+        ensure_outbox_indexes(app.db, app.config.get('MAIL_OUTBOX_RETENTION'))
+    except Exception as e:
+        app.logger.error(f"Failed to create email outbox indexes: {e}")
+    worker = EmailOutboxWorker(app)
+    worker.start()
+    app.email_outbox_worker = worker
+    return worker
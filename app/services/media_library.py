@@ -0,0 +1,144 @@
+"""
+The user media library, one user_media_items document per file instead of a
+user_media array on a single per-user media document. Items are listed in upload
+order with cursor pagination on (uploaded_at, _id).
+"""
+import os
+import re
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import current_app
+from pymongo import ReturnDocument, UpdateOne
+
+# Uploaded files are named {%Y%m%d%H%M%S}_..., migrated items take their date from it
+FILENAME_TIMESTAMP = re.compile(r'^(\d{14})_')
+EPOCH = datetime(1970, 1, 1)
+
+
+class InvalidCursor(ValueError):
+    """The cursor is not one returned by list_media_items."""
+
+
+def ensure_media_library_indexes(db):
+    # The _id ordered indexes are replaced by the upload date ones
+    existing = db.user_media_items.index_information()
+    for name in ('user_id_1__id_1', 'user_id_1_label_1__id_1'):
+        if name in existing:
+            db.user_media_items.drop_index(name)
+    db.user_media_items.create_index([('user_id', 1), ('uploaded_at', 1), ('_id', 1)])
+    db.user_media_items.create_index([('user_id', 1), ('label', 1), ('uploaded_at', 1), ('_id', 1)])
+    db.user_media_items.create_index([('user_id', 1), ('file', 1)], unique=True)
+
+
+def serialize_media_item(item):
+    return {
+        'id': str(item['_id']),
+        'file': item['file'],
+        'label': item.get('label'),
+        'uploaded_at': item.get('uploaded_at')
+    }
+
+
+def add_media_item(user_id, file_url, label):
+    """Add the file, a file stored again under the same name takes the new label and date."""
+    return current_app.db.user_media_items.find_one_and_update(
+        {'user_id': user_id, 'file': file_url},
+        {'$set': {'label': label, 'uploaded_at': datetime.now()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _encode_cursor(item):
+    # Stored dates have millisecond precision
+    milliseconds = (item['uploaded_at'] - EPOCH) // timedelta(milliseconds=1)
+    return f"{milliseconds}_{item['_id']}"
+
+
+def _cursor_filter(cursor):
+    try:
+        milliseconds, item_id = cursor.split('_')
+        uploaded_at = EPOCH + timedelta(milliseconds=int(milliseconds))
+        item_id = ObjectId(item_id)
+    except (InvalidId, TypeError, ValueError, AttributeError):
+        raise InvalidCursor('Invalid cursor')
+    return {'$or': [
+        {'uploaded_at': {'$gt': uploaded_at}},
+        {'uploaded_at': uploaded_at, '_id': {'$gt': item_id}}
+    ]}
+
+
+def list_media_items(user_id, label=None, cursor=None, limit=50):
+    """Return (items, next_cursor), next_cursor is None on the last page."""
+    query = {'user_id': user_id}
+    if label:
+        query['label'] = label
+    if cursor:
+        query.update(_cursor_filter(cursor))
+
+    # One extra row tells whether another page follows
+    items = list(
+        current_app.db.user_media_items.find(query).sort([('uploaded_at', 1), ('_id', 1)]).limit(limit + 1)
+    )
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = _encode_cursor(items[-1])
+    return [serialize_media_item(item) for item in items], next_cursor
+
+
+def delete_media_item(user_id, file_url):
+    return current_app.db.user_media_items.delete_one({'user_id': user_id, 'file': file_url})
+
+
+def media_by_user():
+    """Every user's media grouped per user, the shape the admin media view returns."""
+    pipeline = [
+        {'$sort': {'uploaded_at': 1, '_id': 1}},
+        {'$group': {'_id': '$user_id', 'user_media': {'$push': {'file': '$file', 'label': '$label'}}}},
+        {'$project': {'_id': 0, 'user_id': '$_id', 'user_media': 1}}
+    ]
+    return list(current_app.db.user_media_items.aggregate(pipeline, allowDiskUse=True))
+
+
+def _legacy_uploaded_at(media, file_url):
+    """The date in the file name, files named otherwise get the media document's creation time."""
+    match = FILENAME_TIMESTAMP.match(os.path.basename(file_url))
+    if match:
+        try:
+            return datetime.strptime(match.group(1), '%Y%m%d%H%M%S')
+        except ValueError:
+            pass
+    return media['_id'].generation_time.replace(tzinfo=None)
+
+
+def migrate_user_media(batch_size=500):
+    """
+    Copy the user_media arrays of the media collection into user_media_items. Items are
+    upserted on (user_id, file), so it can be re-run. Each item is dated from its file
+    name, and _ids are minted here in array order so items sharing a date keep the order
+    of the array. Returns how many were added.
+    """
+    added = 0
+    operations = []
+    for media in current_app.db.media.find({}, {'user_id': 1, 'user_media': 1}):
+        for entry in media.get('user_media') or []:
+            if not entry.get('file'):
+                continue
+            operations.append(UpdateOne(
+                {'user_id': media['user_id'], 'file': entry['file']},
+                {'$setOnInsert': {
+                    '_id': ObjectId(),
+                    'label': entry.get('label'),
+                    'uploaded_at': _legacy_uploaded_at(media, entry['file'])
+                }},
+                upsert=True
+            ))
+            if len(operations) >= batch_size:
+                added += current_app.db.user_media_items.bulk_write(operations).upserted_count
+                operations = []
+    if operations:
+        added += current_app.db.user_media_items.bulk_write(operations).upserted_count
+    return added
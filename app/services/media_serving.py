@@ -0,0 +1,59 @@
+import os
+import re
+import mimetypes
+import urllib.parse
+
+from flask import Response, current_app, send_file
+from werkzeug.security import safe_join
+
+# Uploads are saved as <%Y%m%d%H%M%S>_<name> (or %Y%m%d_%H%M%S) and never rewritten
+TIMESTAMPED_NAME = re.compile(r'^\d{8}_?\d{6}_')
+IMMUTABLE_CACHE_CONTROL = 'max-age=31536000, immutable'
+
+
+def is_mutable_media(filename):
+    # Fill-and-sign copies keep their timestamped name while answers are rendered into them
+    parts = filename.split('/')
+    return len(parts) >= 3 and parts[0] == 'user_docs' and parts[2] == 'uploaded_docs'
+
+
+def cache_control_for(filename):
+    scope = 'private' if filename.startswith('user_docs/') else 'public'
+    if is_mutable_media(filename):
+        return f'{scope}, no-cache'
+    if TIMESTAMPED_NAME.match(os.path.basename(filename)):
+        return f'{scope}, {IMMUTABLE_CACHE_CONTROL}'
+    return f"{scope}, max-age={current_app.config.get('MEDIA_CACHE_MAX_AGE', 3600)}"
+
+
+def media_etag(stat):
+    # Strong validator, a rewrite changes the mtime and usually the size
+    return f'{stat.st_size:x}-{stat.st_mtime_ns:x}'
+
+
+def send_media(directory, filename):
+    """
+    Serve a file below directory with a strong ETag, Last-Modified, Range support and a
+    Cache-Control matching how the file is used. Conditional and range requests are
+    answered with 304/206/416 by send_file. With MEDIA_ACCEL_REDIRECT_PREFIX set the
+    body is left to the front proxy through X-Accel-Redirect.
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        return "File not found", 404
+    stat = os.stat(path)
+
+    accel_prefix = current_app.config.get('MEDIA_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        response = Response(status=200, mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + urllib.parse.quote(filename)
+    else:
+        response = send_file(
+            path,
+            conditional=True,
+            etag=media_etag(stat),
+            last_modified=stat.st_mtime,
+            max_age=None
+        )
+    response.headers['Cache-Control'] = cache_control_for(filename)
+    return response
@@ -0,0 +1,114 @@
+import uuid
+import logging
+
+from flask import current_app
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Fields identifying a single conversation document in each chat collection
+CONVERSATION_KEYS = {
+    'buyer_seller_messaging': ('buyer_id', 'seller_id', 'property_id'),
+    'archived_messages': ('buyer_id', 'seller_id', 'property_id'),
+    'users_customer_service_property_chat': ('user_id', 'property_id'),
+    'messages': ('user_id',),
+}
+
+MESSAGE_INSERTED = 'inserted'
+MESSAGE_APPENDED = 'appended'
+MESSAGE_DUPLICATE = 'duplicate'
+
+
+def message_array_field(collection_name):
+    # The customer service collection predates message_content and stores its messages under "messages"
+    return 'messages' if collection_name == 'messages' else 'message_content'
+
+
+def new_message_uid():
+    return str(uuid.uuid4())
+
+
+def has_unique_conversation_index(collection, keys):
+    expected = [(key, ASCENDING) for key in keys]
+    return any(
+        index.get('unique') and list(index['key']) == expected
+        for index in collection.index_information().values()
+    )
+
+
+def ensure_message_indexes(db):
+    """
+    Create the unique conversation indexes the upsert in append_chat_message relies on.
+    Returns the collections that have one, the others fall back to a slower path.
+    """
+    unique_collections = set()
+    for collection_name, keys in CONVERSATION_KEYS.items():
+        collection = db[collection_name]
+        uid_index = f'{message_array_field(collection_name)}.message_uid_1'
+        try:
+            # A message_uid only has to be unique within its conversation, which the upsert
+            # filter already guarantees, a collection-wide index rejects reused uids
+            if uid_index in collection.index_information():
+                collection.drop_index(uid_index)
+            collection.create_index([(key, ASCENDING) for key in keys], unique=True)
+        except Exception as e:
+            # Usually legacy duplicate conversation documents, they have to be merged by hand
+            logger.error(f"Failed to create message indexes on {collection_name}: {str(e)}")
+        if has_unique_conversation_index(collection, keys):
+            unique_collections.add(collection_name)
+        else:
+            logger.error(f"{collection_name} has no unique conversation index, messages are appended without upserts")
+    return unique_collections
+
+
+def _append_without_upsert(collection_name, query, update, conversation_query):
+    # Without the unique index an upsert that misses on a duplicate message_uid would
+    # create a second conversation document, so the conversation is looked up instead
+    collection = current_app.db[collection_name]
+    if collection.update_one(query, update).matched_count:
+        return MESSAGE_APPENDED
+    if collection.find_one(conversation_query, {'_id': 1}):
+        return MESSAGE_DUPLICATE
+    document = dict(update.get('$setOnInsert', {}), **conversation_query)
+    document[message_array_field(collection_name)] = [update['$push'][message_array_field(collection_name)]]
+    collection.insert_one(document)
+    return MESSAGE_INSERTED
+
+
+def append_chat_message(collection_name, conversation, message, insert_fields=None):
+    """
+    Append a message to its conversation document with a single upsert.
+    Returns MESSAGE_INSERTED when the conversation was created, MESSAGE_APPENDED
+    when it already existed and MESSAGE_DUPLICATE when a message with the same
+    message_uid was stored before, in which case nothing is written.
+    """
+    array_field = message_array_field(collection_name)
+    message.setdefault('message_uid', new_message_uid())
+
+    conversation_query = {key: conversation[key] for key in CONVERSATION_KEYS[collection_name]}
+    query = dict(conversation_query)
+    query[f'{array_field}.message_uid'] = {'$ne': message['message_uid']}
+    update = {'$push': {array_field: message}}
+    if insert_fields:
+        update['$setOnInsert'] = {
+            key: value for key, value in insert_fields.items()
+            if key not in query and key != array_field
+        }
+
+    if collection_name not in current_app.extensions.get('unique_conversation_collections', ()):
+        return _append_without_upsert(collection_name, query, update, conversation_query)
+
+    collection = current_app.db[collection_name]
+    try:
+        result = collection.update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        # Either the conversation already holds this message_uid, or a concurrent first
+        # message created the conversation after this upsert missed it. Only a plain
+        # append that still misses means the message was stored before
+        retry = collection.update_one(query, {'$push': update['$push']})
+        return MESSAGE_APPENDED if retry.matched_count else MESSAGE_DUPLICATE
+
+    if result.upserted_id is not None:
+        return MESSAGE_INSERTED
+    return MESSAGE_APPENDED
@@ -0,0 +1,100 @@
+import os
+import shutil
+import logging
+from datetime import datetime
+
+from bson import ObjectId
+from flask import current_app
+
+from app.services.image_derivatives import image_path_from_url
+from app.services.image_jobs import build_panorama_tiles
+from app.services.pdf_pool import PRIORITY_BACKGROUND, get_image_pool
+
+logger = logging.getLogger(__name__)
+
+
+def tiles_dir(image_path):
+    return os.path.splitext(image_path)[0] + '_tiles'
+
+
+def tiles_entry(image_url, manifest):
+    """The tiles field of a 3d_images entry, URLs are relative to the panorama's own URL."""
+    base_url = os.path.splitext(image_url)[0] + '_tiles'
+    return {
+        'base_url': base_url,
+        'manifest_url': f'{base_url}/manifest.json',
+        'preview_url': f"{base_url}/{manifest['preview']}",
+        'tile_url': f"{base_url}/{manifest['tile_path']}",
+        'tile_size': manifest['tile_size'],
+        'levels': manifest['levels'],
+        'built_at': datetime.now()
+    }
+
+
+def record_tiles(property_id, image_name, image_url, manifest):
+    """Store the tiles entry, returns False when the panorama is no longer there."""
+    result = current_app.db.properties.update_one(
+        {'_id': ObjectId(property_id), 'panoramic_images.3d_images': {'$elemMatch': {'name': image_name, 'url': image_url}}},
+        {'$set': {'panoramic_images.$[].3d_images.$[image].tiles': tiles_entry(image_url, manifest)}},
+        array_filters=[{'image.name': image_name, 'image.url': image_url}]
+    )
+    return result.matched_count > 0
+
+
+def remove_panorama_tiles(image_url):
+    shutil.rmtree(tiles_dir(image_path_from_url(image_url)), ignore_errors=True)
+
+
+def _tile_job_args(image_url):
+    image_path = image_path_from_url(image_url)
+    config = current_app.config
+    return (image_path, tiles_dir(image_path)), {
+        'tile_size': config.get('PANORAMA_TILE_SIZE', 512),
+        'preview_width': config.get('PANORAMA_PREVIEW_WIDTH', 1024)
+    }
+
+
+def _on_tiles_built(app, property_id, image_name, image_url, future):
+    with app.app_context():
+        try:
+            manifest = future.result()
+        except Exception as e:
+            logger.error(f"Failed to tile panorama {image_url}: {e}")
+            return
+        if not record_tiles(property_id, image_name, image_url, manifest):
+            # Replaced or deleted while it was being tiled
+            remove_panorama_tiles(image_url)
+
+
+def schedule_panorama_tiles(property_id, image_name, image_url):
+    """Queue tiling of a stored panorama as background work in the process pool."""
+    app = current_app._get_current_object()
+    args, kwargs = _tile_job_args(image_url)
+    try:
+        future = get_image_pool().submit(build_panorama_tiles, *args, priority=PRIORITY_BACKGROUND, **kwargs)
+    except Exception as e:
+        logger.warning(f"Could not queue tiling of {image_url}: {e}")
+        return None
+    future.add_done_callback(lambda done: _on_tiles_built(app, property_id, image_name, image_url, done))
+    return future
+
+
+def build_missing_panorama_tiles():
+    """Tile every panorama without a tiles entry, returns how many were tiled."""
+    built = 0
+    query = {'panoramic_images.3d_images': {'$elemMatch': {'tiles': {'$exists': False}}}}
+    for property_data in current_app.db.properties.find(query, {'panoramic_images': 1}):
+        for panorama in property_data.get('panoramic_images') or []:
+            for image in panorama.get('3d_images') or []:
+                if image.get('tiles') or not image.get('url'):
+                    continue
+                args, kwargs = _tile_job_args(image['url'])
+                if not os.path.isfile(args[0]):
+                    continue
+                manifest = get_image_pool().run(
+                    build_panorama_tiles, *args, priority=PRIORITY_BACKGROUND,
+                    timeout=current_app.config.get('PANORAMA_TILE_TIMEOUT', 600), **kwargs
+                )
+                record_tiles(str(property_data['_id']), image['name'], image['url'], manifest)
+                built += 1
+    return built
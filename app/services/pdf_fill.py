@@ -0,0 +1,192 @@
+"""
+PDF jobs that run inside the PDF process pool. Everything here has to be picklable
+and independent of Flask: arguments and results are plain values and paths.
+"""
+import io
+import os
+import uuid
+from datetime import datetime
+
+import fitz
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+
+from app.services.previews import render_first_page_previews
+from app.services.text_layout import fit_text, wrap_text
+
+
+class PdfJobError(Exception):
+    """A job refused its input, the message is meant for the API client."""
+
+
+# Function to check if the answer is a datetime string
+def is_datetime_string(s):
+    try:
+        datetime.fromisoformat(s)
+        return True
+    except ValueError:
+        return False
+
+
+def check_answer_type(answer):
+    if type(answer) == int or type(answer) == float:
+        answer_type = 'number'
+    elif type(answer) == str:
+        if is_datetime_string(answer):
+            answer_type = 'datetime'
+        else:
+            answer_type = 'text'
+    elif type(answer) == bool:
+        answer_type = 'boolean'
+
+    return answer_type
+
+
+def draw_answer(can, page_answer_locations, answer, values):
+    """Draw one answer at its locations on a page overlay, raising PdfJobError on invalid answers."""
+    for location in page_answer_locations:
+        answer_type = check_answer_type(answer)
+        if location['answerInputType'] == 'single-checkbox':
+            if answer_type != location['answerOutputType']:
+                raise PdfJobError('Answer data type is incorrect for this question')
+            x = location['startX']
+            y = letter[1] - location['endY'] + 6
+            can.drawString(x, y, '✔')
+        elif location['answerInputType'] == 'multiple-checkbox':
+            if answer_type != location['answerOutputType'] or (not isinstance(values, list) or not values):
+                raise PdfJobError('Answer data type is correct for this answer or missing value or incorrect datatype for value')
+            position = location['position']
+            # Filter locations with the same position
+            positions = [loc for loc in page_answer_locations if loc['position'] == position]
+            existing_values = [position.get('value') for position in positions]
+            for value in values:
+                if value not in existing_values:
+                    raise PdfJobError('incorrect value provided for option to mark')
+            if location['value'] in values:
+                x = location['startX']
+                y = letter[1] - location['endY'] + 6
+                can.drawString(x, y, '✔')
+        elif location['answerInputType'] == 'multiline':
+            if answer_type != location['answerOutputType']:
+                raise PdfJobError('Answer data type is incorrect for this question')
+            position = location['position']
+            text = str(answer)
+            # Filter locations with the same position
+            positions = [loc for loc in page_answer_locations if loc['position'] == position]
+            if location is not positions[0]:
+                # The whole position is laid out once, from its first line
+                continue
+
+            # Word-aware wrapping of the answer across the lines of this position
+            lines = wrap_text(text, [pos['endX'] - pos['startX'] for pos in positions])
+            for pos, line in zip(positions, lines):
+                if line:
+                    can.drawString(pos['startX'], letter[1] - pos['endY'] + 2, line)
+        else:
+            if answer_type != location['answerOutputType']:
+                raise PdfJobError('Answer data type is incorrect for this question')
+            x = location['startX']
+            y = letter[1] - location['endY'] + 2
+            max_width = location['endX'] - location['startX']
+            can.drawString(x, y, fit_text(str(answer), max_width))
+
+
+class _NullCanvas:
+    """Stands in for a reportlab canvas when answers are only validated."""
+
+    def drawString(self, x, y, text):
+        pass
+
+
+def _draw_page_answers(can, page_answers):
+    for item, page_answer_locations in page_answers:
+        try:
+            draw_answer(can, page_answer_locations, item['answer'], item.get('values'))
+        except PdfJobError as e:
+            if item.get('question_id'):
+                raise PdfJobError(f"{e} (question_id: {item['question_id']})")
+            raise
+
+
+def _merge_answers(reader, answers):
+    writer = PdfWriter()
+    for page_num, page in enumerate(reader.pages):
+        page_answers = []
+        for item in answers:
+            page_answer_locations = [loc for loc in item['answer_locations'] if loc.get('pageNum') == page_num + 1]
+            if page_answer_locations:
+                page_answers.append((item, page_answer_locations))
+
+        if page_answers:
+            packet = io.BytesIO()
+            can = canvas.Canvas(packet, pagesize=letter)
+            can.setFillColorRGB(0, 0, 1)
+            _draw_page_answers(can, page_answers)
+            can.save()
+
+            # Merge the overlay with all answers of this page into the existing page
+            packet.seek(0)
+            page.merge_page(PdfReader(packet).pages[0])
+
+        writer.add_page(page)
+    return writer
+
+
+def _write_atomic(writer, output_path):
+    # Unique temp name, two renders of the same document may overlap
+    tmp_path = f'{output_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(tmp_path, 'wb') as fp:
+            writer.write(fp)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+def validate_answers(answers):
+    """Run the answer checks of a fill without rendering anything, raising PdfJobError."""
+    for item in answers:
+        pages = {}
+        for location in item['answer_locations']:
+            pages.setdefault(location.get('pageNum'), []).append(location)
+        # Same per-page grouping as a real fill, so the same answers pass and fail
+        _draw_page_answers(_NullCanvas(), [(item, locations) for locations in pages.values()])
+
+
+def fill_answers(doc_path, answers):
+    """
+    Merge a batch of answers into the PDF at doc_path in a single pass: one overlay per
+    page carrying every answer on it, and one write. Each answer is a dict with
+    answer_locations, answer, values and optionally question_id. Nothing is written
+    when any answer is invalid.
+    """
+    return _write_atomic(_merge_answers(PdfReader(doc_path), answers), doc_path)
+
+
+def render_filled_pdf(template_bytes, answers, output_path):
+    """Write the template with every answer merged in to output_path, replacing it atomically."""
+    return _write_atomic(_merge_answers(PdfReader(io.BytesIO(template_bytes)), answers), output_path)
+
+
+def fill_answer(doc_path, answer_locations, answer, values):
+    """Merge one answer into the PDF at doc_path, the file is replaced atomically."""
+    return fill_answers(doc_path, [{'answer_locations': answer_locations, 'answer': answer, 'values': values}])
+
+
+def stamp_signature(template_path, signature_png, output_path, client_ip):
+    """Write a copy of the template with the client IP on page one and the signature on page four."""
+    with fitz.open(template_path) as template_pdf, fitz.open(stream=signature_png, filetype='png') as signature_pdf:
+        if template_pdf.page_count < 4:
+            raise PdfJobError('PDF does not have enough pages to insert the signature.')
+        template_pdf[0].insert_text((20, 20), f"User IP: {client_ip}")
+        rect = fitz.Rect(430, 0, 625, 850)
+        template_pdf[3].insert_image(rect, pixmap=signature_pdf[0].get_pixmap(), keep_proportion=True)
+        template_pdf.save(output_path)
+    return output_path
+
+
+def render_previews(pdf_path, preview_path, thumbnail_path=None, **options):
+    return render_first_page_previews(pdf_path, preview_path, thumbnail_path, **options)
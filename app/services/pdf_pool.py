@@ -0,0 +1,248 @@
+import time
+import queue
+import logging
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class PdfPoolBusy(Exception):
+    """The job queue is full."""
+
+
+class PdfJobTimeout(Exception):
+    """The job did not finish within its timeout."""
+
+
+class PdfJobPool:
+    """
+    Runs CPU-bound PDF jobs in a bounded process pool so request threads only wait on
+    them. Jobs queue by priority, interactive requests ahead of background work, and at
+    most max_workers jobs are handed to the executor at a time so priorities still apply
+    while the pool is saturated. A job that runs past its timeout, or a crashed worker
+    process, gets the executor replaced; other jobs running in it are retried once.
+    """
+
+    def __init__(self, max_workers=2, max_queue=100, default_timeout=60, start_method='spawn'):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.default_timeout = default_timeout
+        self.start_method = start_method
+        self._executor = None
+        self._queue = queue.PriorityQueue()
+        self._slots = threading.Semaphore(max_workers)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._generation = 0
+        # future -> generation of the executor running it
+        self._running = {}
+        self._abandoned = set()
+        self._stats = {
+            'submitted': 0, 'completed': 0, 'failed': 0, 'timed_out': 0, 'rejected': 0,
+            'recycled': 0, 'running': 0, 'total_wait_seconds': 0.0, 'total_run_seconds': 0.0
+        }
+        self._queued_by_priority = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_workers=config.get('PDF_POOL_WORKERS', 2),
+            max_queue=config.get('PDF_POOL_MAX_QUEUE', 100),
+            default_timeout=config.get('PDF_JOB_TIMEOUT', 60),
+            start_method=config.get('PDF_POOL_START_METHOD', 'spawn')
+        )
+
+    def _ensure_started(self):
+        # Started lazily so every gunicorn worker gets its own pool after the fork
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+                self._dispatcher = threading.Thread(target=self._dispatch, name='pdf-pool-dispatcher', daemon=True)
+                self._dispatcher.start()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(self.start_method)
+        )
+
+    def _recycle(self, generation):
+        """Replace the executor of the given generation, killing its worker processes."""
+        with self._lock:
+            if generation != self._generation:
+                # Already replaced by another timeout or crash
+                return
+            old_executor = self._executor
+            self._executor = self._new_executor()
+            self._generation += 1
+            self._stats['recycled'] += 1
+        logger.warning('Replacing the PDF process pool (generation %s)', generation)
+        # Private, but the executor offers no other way to stop a running job
+        for process in list((getattr(old_executor, '_processes', None) or {}).values()):
+            process.terminate()
+        old_executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        self._ensure_started()
+        with self._lock:
+            if self._queue.qsize() >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise PdfPoolBusy('PDF service is busy, please try again shortly.')
+            self._stats['submitted'] += 1
+            self._queued_by_priority[priority] = self._queued_by_priority.get(priority, 0) + 1
+
+        future = Future()
+        self._queue.put((priority, next(self._sequence), time.monotonic(), 0, future, fn, args, kwargs))
+        return future
+
+    def run(self, fn, *args, priority=PRIORITY_INTERACTIVE, timeout=None, **kwargs):
+        """Submit a job and wait for its result, the timeout covers queueing and running."""
+        future = self.submit(fn, *args, priority=priority, **kwargs)
+        try:
+            return future.result(timeout=timeout or self.default_timeout)
+        except FutureTimeoutError:
+            # A queued job is dropped, a running one would hold its process slot for as long
+            # as it keeps going, so its executor is replaced
+            if not future.cancel():
+                with self._lock:
+                    generation = self._running.get(future)
+                    self._abandoned.add(future)
+                if generation is not None:
+                    self._recycle(generation)
+            with self._lock:
+                self._stats['timed_out'] += 1
+            raise PdfJobTimeout(f'PDF job {getattr(fn, "__name__", fn)} timed out')
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            priority, _, queued_at, attempt, future, fn, args, kwargs = self._queue.get()
+            with self._lock:
+                self._queued_by_priority[priority] -= 1
+            # A retried job's future is already running
+            if not attempt and not future.set_running_or_notify_cancel():
+                self._slots.release()
+                continue
+
+            started_at = time.monotonic()
+            with self._lock:
+                self._stats['running'] += 1
+                self._stats['total_wait_seconds'] += started_at - queued_at
+                executor, generation = self._executor, self._generation
+                self._running[future] = generation
+            job = (priority, attempt, future, fn, args, kwargs)
+            try:
+                executor_future = executor.submit(fn, *args, **kwargs)
+            except Exception as e:
+                self._on_error(job, started_at, generation, e)
+                continue
+            executor_future.add_done_callback(
+                lambda done, job=job, started_at=started_at, generation=generation: self._on_done(done, job, started_at, generation)
+            )
+
+    def _on_done(self, executor_future, job, started_at, generation):
+        error = executor_future.exception()
+        if error:
+            self._on_error(job, started_at, generation, error)
+        else:
+            self._finish(job[2], started_at, result=executor_future.result())
+
+    def _on_error(self, job, started_at, generation, error):
+        priority, attempt, future, fn, args, kwargs = job
+        if not isinstance(error, BrokenProcessPool):
+            self._finish(future, started_at, error=error)
+            return
+
+        # A worker process died, either killed for another job's timeout or crashed
+        self._recycle(generation)
+        with self._lock:
+            abandoned = future in self._abandoned
+        if abandoned:
+            self._finish(future, started_at, error=PdfJobTimeout(f'PDF job {getattr(fn, "__name__", fn)} timed out'))
+        elif attempt == 0:
+            self._retry(job, started_at)
+        else:
+            self._finish(future, started_at, error=error)
+
+    def _retry(self, job, started_at):
+        priority, attempt, future, fn, args, kwargs = job
+        with self._lock:
+            self._running.pop(future, None)
+            self._stats['running'] -= 1
+            self._stats['total_run_seconds'] += time.monotonic() - started_at
+            self._queued_by_priority[priority] = self._queued_by_priority.get(priority, 0) + 1
+        self._slots.release()
+        self._queue.put((priority, next(self._sequence), time.monotonic(), attempt + 1, future, fn, args, kwargs))
+
+    def _finish(self, future, started_at, result=None, error=None):
+        with self._lock:
+            self._running.pop(future, None)
+            self._abandoned.discard(future)
+            self._stats['running'] -= 1
+            self._stats['total_run_seconds'] += time.monotonic() - started_at
+            self._stats['failed' if error else 'completed'] += 1
+        self._slots.release()
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            queued_by_priority = {str(priority): count for priority, count in self._queued_by_priority.items() if count}
+        finished = stats['completed'] + stats['failed']
+        started = finished + stats['running']
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'queue_depth': sum(queued_by_priority.values()),
+            'queue_depth_by_priority': queued_by_priority,
+            'running': stats['running'],
+            'submitted': stats['submitted'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'timed_out': stats['timed_out'],
+            'rejected': stats['rejected'],
+            'recycled': stats['recycled'],
+            'avg_wait_ms': round(stats['total_wait_seconds'] * 1000 / started, 2) if started else 0,
+            'avg_run_ms': round(stats['total_run_seconds'] * 1000 / finished, 2) if finished else 0
+        }
+
+
+def init_pdf_pool(app):
+    app.extensions['pdf_pool'] = PdfJobPool.from_config(app.config)
+    return app.extensions['pdf_pool']
+
+
+def get_pdf_pool():
+    return current_app.extensions['pdf_pool']
+
+
+def init_image_pool(app):
+    """
+    A separate pool for image derivatives and panorama tiles. Those jobs run for minutes,
+    in the PDF pool they would hold the slots interactive fills wait for.
+    """
+    config = app.config
+    app.extensions['image_pool'] = PdfJobPool(
+        max_workers=config.get('IMAGE_POOL_WORKERS', 1),
+        max_queue=config.get('IMAGE_POOL_MAX_QUEUE', 200),
+        default_timeout=config.get('IMAGE_JOB_TIMEOUT', 600),
+        start_method=config.get('PDF_POOL_START_METHOD', 'spawn')
+    )
+    return app.extensions['image_pool']
+
+
+def get_image_pool():
+    return current_app.extensions['image_pool']
@@ -0,0 +1,94 @@
+import io
+import os
+import urllib.parse
+
+from flask import current_app
+from PyPDF2 import PdfReader
+
+from app.services.caching import LRUCache
+from app.services.form_schemas import get_schema_version
+
+
+class ParsedTemplate:
+    """
+    Everything form operations need from a template: its bytes, page sizes and the
+    answer locations of its questions. Page objects themselves are not kept, PyPDF2
+    mutates them on merge, so fills start from the cached bytes instead. It is valid for
+    one file mtime and one question schema version.
+    """
+
+    def __init__(self, document_id, path, mtime, pdf_bytes, page_sizes, questions, schema_version=None):
+        self.document_id = document_id
+        self.path = path
+        self.mtime = mtime
+        self.schema_version = schema_version
+        self.pdf_bytes = pdf_bytes
+        self.page_sizes = page_sizes
+        self.questions = questions
+
+    def question(self, question_id):
+        return self.questions.get(str(question_id))
+
+
+def template_path(document):
+    relative_path = urllib.parse.unquote(document['url'].split('/media/')[-1])
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path)
+
+
+def compile_questions(doc_questions):
+    questions = {}
+    for question in doc_questions:
+        answer_locations = question.get('answer_locations', [])
+        questions[str(question['_id'])] = {
+            'text': question.get('text'),
+            'type': question.get('type'),
+            'answer_locations': answer_locations,
+            'pages': sorted({location.get('pageNum') for location in answer_locations if location.get('pageNum')})
+        }
+    return questions
+
+
+def get_template_cache():
+    cache = current_app.extensions.get('pdf_template_cache')
+    if cache is None:
+        cache = LRUCache(
+            maxsize=current_app.config.get('PDF_TEMPLATE_CACHE_SIZE', 64),
+            ttl=current_app.config.get('PDF_TEMPLATE_CACHE_TTL', 600)
+        )
+        current_app.extensions['pdf_template_cache'] = cache
+    return cache
+
+
+def get_parsed_template(document):
+    """
+    Return the ParsedTemplate of a documents entry. It is re-parsed when the file's mtime
+    changed and its questions are recompiled when the shared question schema version
+    moved on, so edits made through any worker are picked up by all of them.
+    """
+    document_id = str(document['_id'])
+    path = template_path(document)
+    mtime = os.path.getmtime(path)
+    # Read before the questions, a concurrent edit then only makes the next call recompile
+    schema_version = get_schema_version(document_id)
+
+    cache = get_template_cache()
+    template = cache.get(document_id)
+    if template is not None and template.mtime == mtime and template.schema_version == schema_version:
+        return template
+
+    questions = compile_questions(current_app.db.doc_questions_answers.find({'document_id': document_id}))
+    if template is not None and template.mtime == mtime:
+        # Only the questions changed, the parsed file is still good
+        template = ParsedTemplate(document_id, path, mtime, template.pdf_bytes, template.page_sizes, questions, schema_version)
+    else:
+        with open(path, 'rb') as f:
+            pdf_bytes = f.read()
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        page_sizes = [(float(page.mediabox.width), float(page.mediabox.height)) for page in reader.pages]
+        template = ParsedTemplate(document_id, path, mtime, pdf_bytes, page_sizes, questions, schema_version)
+    cache.set(document_id, template)
+    return template
+
+
+def invalidate_parsed_template(document_id):
+    get_template_cache().pop(str(document_id))
@@ -0,0 +1,135 @@
+import re
+import time
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from app.services.caching import LRUCache, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class PrefillError(Exception):
+    """The prefill search could not answer, status_code is what the view returns."""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for `reset_timeout`
+    seconds, after which a single trial call is let through to probe the service.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+def normalize_address_part(value):
+    return re.sub(r'\s+', ' ', str(value or '').lower()).strip()
+
+
+class PrefillClient:
+    """
+    Client of the property prefill search service. Results are cached per normalized
+    (street_number, street_name, city, state), concurrent lookups of the same address
+    share one upstream call, and a circuit breaker stops calls to a failing service.
+    """
+
+    def __init__(self, url, connect_timeout=3, timeout=10, cache_size=2000, cache_ttl=900,
+                 breaker_threshold=5, breaker_reset=30, pool_size=10):
+        self.url = url
+        self.timeout = (connect_timeout, timeout)
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.single_flight = SingleFlight()
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['PREFILL_URL'],
+            connect_timeout=config.get('PREFILL_CONNECT_TIMEOUT', 3),
+            timeout=config.get('PREFILL_TIMEOUT', 10),
+            cache_size=config.get('PREFILL_CACHE_SIZE', 2000),
+            cache_ttl=config.get('PREFILL_CACHE_TTL', 900),
+            breaker_threshold=config.get('PREFILL_BREAKER_THRESHOLD', 5),
+            breaker_reset=config.get('PREFILL_BREAKER_RESET', 30)
+        )
+
+    def fetch(self, payload):
+        if not self.breaker.allow():
+            raise PrefillError('Prefill service is unavailable, please try again later', 503)
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            logger.warning(f"Prefill search failed: {e}")
+            raise PrefillError('Something went wrong, unable to get prefill data')
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if response.status_code != 200:
+            raise PrefillError('Something went wrong, unable to get prefill data')
+        return response.json()
+
+    def search(self, street_number, street_name, city, state):
+        payload = {
+            'street_number': street_number,
+            'street_name': street_name,
+            'city': city,
+            'state': state
+        }
+        key = tuple(normalize_address_part(value) for value in payload.values())
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+
+        result = self.single_flight.do(key, self.fetch, payload)
+        self.cache.set(key, result)
+        return result
+
+
+def get_prefill_client():
+    client = current_app.extensions.get('prefill_client')
+    if client is None:
+        client = PrefillClient.from_config(current_app.config)
+        current_app.extensions['prefill_client'] = client
+    return client
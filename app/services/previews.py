@@ -0,0 +1,35 @@
+import os
+
+import fitz
+
+
+def _page_matrix(page, dpi, max_dimension):
+    # Scale for the requested DPI, reduced when the longest side would exceed max_dimension
+    zoom = dpi / 72
+    longest_side = max(page.rect.width, page.rect.height)
+    if max_dimension and longest_side * zoom > max_dimension:
+        zoom = max_dimension / longest_side
+    return fitz.Matrix(zoom, zoom)
+
+
+def render_first_page_previews(pdf_path, preview_path, thumbnail_path=None, dpi=110,
+                               max_dimension=1400, thumbnail_max_dimension=320, quality=85):
+    """
+    Rasterize only the first page of a PDF into a JPEG preview and an optional thumbnail.
+    Returns the list of written paths, empty when the PDF has no pages.
+    """
+    written = []
+    with fitz.open(pdf_path) as document:
+        if document.page_count == 0:
+            return written
+        page = document[0]
+        targets = [(preview_path, max_dimension)]
+        if thumbnail_path:
+            targets.append((thumbnail_path, thumbnail_max_dimension))
+        for path, dimension in targets:
+            pixmap = page.get_pixmap(matrix=_page_matrix(page, dpi, dimension), alpha=False)
+            tmp_path = f'{path}.tmp.jpg'
+            pixmap.save(tmp_path, jpg_quality=quality)
+            os.replace(tmp_path, path)
+            written.append(path)
+    return written
@@ -9,20 +9,23 @@ from firebase_admin import credentials, messaging
 from bson import ObjectId
 from flask import current_app, request, url_for
 from werkzeug.utils import secure_filename  
-import sendgrid
-from sendgrid.helpers.mail import Mail, Email, To
 from datetime import timezone
-from geopy.geocoders import GoogleV3
+
+from app.services.mail import queue_email
+from app.services.geocoding import geocode_address
+from app.services.zip_lookup import extract_zipcode, lookup_zip
+from app.services.blob_store import save_upload
 
 logger = logging.getLogger(__name__)
 
 
 def create_property(property_data):
     try: 
-        google_location_api_key = current_app.config['GOOGLE_LOCATION_API_KEY']
-        geocoder = GoogleV3(api_key=google_location_api_key)  
-        location = geocoder.geocode(property_data['address'])
-        if location:
+        location = geocode_address(property_data['address'])
+        if not location:
+            # Approximate with the ZIP code centroid when the geocoder has no match
+            location = lookup_zip(extract_zipcode(property_data['address']))
+        if location and location.latitude is not None:
             property_data['latitude'] = location.latitude
             property_data['longitude'] = location.longitude
             
@@ -35,29 +38,13 @@ def create_property(property_data):
         return False
 
 
-def send_email(subject, message, recipient):
+def send_email(subject, message, recipient, idempotency_key=None):
     try:
-        # Replace 'YOUR_SENDGRID_API_KEY' with your actual SendGrid API key
-        sg = sendgrid.SendGridAPIClient(current_app.config['SENDGRID_API_KEY'])
-
-        # Set up the sender and recipient
-        from_email = Email(current_app.config['MAIL_USERNAME'])  # Change to your verified sender
-        to_email = To(recipient)  # Change to your recipient
-
-        # Create a Mail object
-        mail = Mail(from_email, to_email)
-
-        # Set the email subject
-        mail.subject = subject
-
-        # Set the email content (plain text or HTML)
-        mail.content = sendgrid.helpers.mail.Content("text/plain", message)  # Changed 'contents' to 'content'
+        # Queue the email in the outbox, the background worker delivers it through SendGrid
+        queue_email(recipient, subject, message, idempotency_key=idempotency_key)
 
-        # Send an HTTP POST request to /mail/send
-        response = sg.send(mail)
-        
-        # Return status code and headers
-        return response.status_code, response.headers
+        # 202 mirrors SendGrid's "accepted for delivery" status
+        return 202, {}
     except Exception as e:
         return 400 , {"error": str(e)}
 
@@ -110,12 +97,14 @@ def is_valid(coupon):
 
 def validate_address(address):
 
+    # Addresses with an unknown ZIP code are rejected without calling the geocoder
+    zipcode = extract_zipcode(address)
+    if zipcode and not lookup_zip(zipcode):
+        return False
+
     # Use Google Maps Geocoding API to validate the entered address
-    google_location_api_key = current_app.config['GOOGLE_LOCATION_API_KEY']
-    
-    geocoder = GoogleV3(api_key=google_location_api_key)
     try:
-        location = geocoder.geocode(address)
+        location = geocode_address(address)
         if location:
             address_components = location.raw['address_components']
             # Check if the address contains necessary components (e.g., country, state, postal code)
@@ -141,7 +130,7 @@ def save_panoramic_image(panoramic_image, user, property_id):
             return {'error': 'File with the same name already exists in the folder'}
         
         image_path = os.path.join(user_media_dir, filename)
-        panoramic_image.save(image_path)
+        save_upload(panoramic_image, image_path)
 
         image_url = f"https://papi.airebrokers.com/media/user_properties/{str(user['uuid'])}/{str(property_id)}/panoramic_image/{filename}"
 
@@ -422,9 +411,3 @@ def send_notification(device_token):
     except Exception as e:
         # Handle any other exceptions
         return {"error": str(e)}
-    
-
-def save_archived_message(chat_message):
-    # Save the archived message only in the 'archived_messages' collection
-    current_app.db.archived_messages.insert_one(chat_message)
-    
\ No newline at end of file
@@ -0,0 +1,248 @@
+import json
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import paho.mqtt.client as mqtt
+from flask_jwt_extended import decode_token
+
+from app.services.authentication import validate_user
+
+logger = logging.getLogger(__name__)
+
+
+def customer_service_topic(user):
+    return f"user_chat/{user['email']}"
+
+
+def customer_service_property_topic(user, property_id):
+    return f"user_customer_service_property_chat/{user['email']}/{property_id}"
+
+
+def buyer_seller_topic(seller_email, property_id, buyer_id):
+    return f"buyer_seller_chat/{seller_email}/{property_id}/{buyer_id}"
+
+
+def _offer(queue, event):
+    # Slow consumers lose events instead of growing the queue without bound,
+    # they can always re-sync through the chat GET endpoints
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        logger.warning("Chat stream queue is full, dropping event.")
+
+
+class ChatStreamHub:
+    """
+    Fans out MQTT chat messages to connected stream clients. The hub only
+    subscribes to a conversation topic while at least one client is listening
+    and never persists anything, persistence stays with the app MQTT client.
+    """
+
+    def __init__(self, broker_address, username=None, password=None, port=1883):
+        self.broker_address = broker_address
+        self.port = port
+        self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, clean_session=True)
+        if username:
+            self._client.username_pw_set(username, password)
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+        self._lock = threading.Lock()
+        self._listeners = {}
+        self._started = False
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['MQTT_BROKER_ADDRESS'], config.get('MQTT_USERNAME'), config.get('MQTT_PASSWD'))
+
+    def _ensure_started(self):
+        if not self._started:
+            self._client.connect_async(self.broker_address, self.port)
+            self._client.loop_start()
+            self._started = True
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        # Re-subscribe after a reconnect, the broker forgets subscriptions of clean sessions
+        with self._lock:
+            topics = list(self._listeners)
+        for topic in topics:
+            client.subscribe(topic)
+
+    def add_listener(self, topic, loop, queue):
+        with self._lock:
+            self._ensure_started()
+            listeners = self._listeners.setdefault(topic, set())
+            is_new_topic = not listeners
+            listeners.add((loop, queue))
+        if is_new_topic:
+            self._client.subscribe(topic)
+
+    def remove_listener(self, topic, loop, queue):
+        with self._lock:
+            listeners = self._listeners.get(topic, set())
+            listeners.discard((loop, queue))
+            is_last = not listeners
+            if is_last:
+                self._listeners.pop(topic, None)
+        if is_last:
+            self._client.unsubscribe(topic)
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            payload = json.loads(msg.payload)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return
+
+        with self._lock:
+            listeners = list(self._listeners.get(msg.topic, ()))
+
+        for message in payload.get('message_content') or []:
+            event = dict(message)
+            event.setdefault('timestamp', datetime.now().isoformat())
+            if payload.get('property_id'):
+                event.setdefault('property_id', payload['property_id'])
+            for loop, queue in listeners:
+                loop.call_soon_threadsafe(_offer, queue, event)
+
+
+class ChatStreamApp:
+    """
+    ASGI app serving Server-Sent Events for a single conversation, every other
+    request is passed through to the wrapped WSGI app.
+
+    GET <path>?type=customer_service
+    GET <path>?type=customer_service_property&property_id=<id>
+    GET <path>?type=buyer_seller&property_id=<id>&user_id=<other user uuid>
+
+    The access token is read from the Authorization header, or from the
+    access_token query parameter for browser EventSource clients.
+    """
+
+    def __init__(self, flask_app, fallback, hub, path='/api/stream/chat'):
+        self.flask_app = flask_app
+        self.fallback = fallback
+        self.hub = hub
+        self.path = path
+        self.keepalive_interval = flask_app.config.get('STREAM_KEEPALIVE_INTERVAL', 15)
+        self.queue_size = flask_app.config.get('STREAM_QUEUE_SIZE', 100)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            await self.stream(scope, receive, send)
+        else:
+            await self.fallback(scope, receive, send)
+
+    def resolve_topic(self, token, params):
+        with self.flask_app.app_context():
+            db = self.flask_app.db
+            try:
+                jwt_payload = decode_token(token)
+            except Exception:
+                return None, (401, {'error': 'Token has expired or invalid!'})
+            if db.user_token_blocklist.find_one({'jti': jwt_payload['jti']}):
+                return None, (401, {'error': 'User session has expired, please log in again.'})
+
+            user = validate_user(jwt_payload[self.flask_app.config.get('JWT_IDENTITY_CLAIM', 'sub')])
+            if not user:
+                return None, (404, {'error': 'User not found'})
+
+            stream_type = params.get('type')
+            property_id = params.get('property_id')
+            if stream_type == 'customer_service':
+                return customer_service_topic(user), None
+            if stream_type == 'customer_service_property':
+                if not property_id:
+                    return None, (400, {'error': 'Missing property_id'})
+                return customer_service_property_topic(user, property_id), None
+            if stream_type == 'buyer_seller':
+                other_user_id = params.get('user_id')
+                if not property_id or not other_user_id:
+                    return None, (400, {'error': 'Missing property_id or user_id'})
+                if user.get('role') == 'realtor':
+                    return None, (403, {'error': 'Unauthorized access'})
+                seller = db.property_seller_transaction.find_one({'seller_id': other_user_id, 'property_id': property_id})
+                if seller:
+                    buyer_id = user['uuid']
+                    seller_user = db.users.find_one({'uuid': other_user_id}, {'email': 1, '_id': 0})
+                    if not seller_user:
+                        return None, (404, {'error': 'Receiver not found'})
+                    seller_email = seller_user['email']
+                else:
+                    buyer_id = other_user_id
+                    seller_email = user['email']
+                return buyer_seller_topic(seller_email, property_id, buyer_id), None
+            return None, (400, {'error': 'Invalid stream type'})
+
+    async def send_json(self, send, status, body):
+        data = json.dumps(body).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(data)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': data})
+
+    async def stream(self, scope, receive, send):
+        headers = dict(scope.get('headers') or [])
+        params = {key: values[0] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        auth_header = headers.get(b'authorization', b'').decode()
+        token = auth_header.split(' ')[1] if ' ' in auth_header else params.get('access_token')
+        if not token:
+            await self.send_json(send, 401, {'error': 'Authorization token is missing or invalid!'})
+            return
+
+        # Token and database checks are blocking, keep them off the event loop
+        topic, error = await asyncio.to_thread(self.resolve_topic, token, params)
+        if error:
+            await self.send_json(send, *error)
+            return
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.hub.add_listener(topic, loop, queue)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')
+                ]
+            })
+            await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+            disconnect = asyncio.ensure_future(self.wait_for_disconnect(receive))
+            next_event = None
+            try:
+                while True:
+                    if next_event is None:
+                        next_event = asyncio.ensure_future(queue.get())
+                    done, _ = await asyncio.wait(
+                        {next_event, disconnect},
+                        timeout=self.keepalive_interval,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if disconnect in done:
+                        break
+                    if next_event in done:
+                        data = json.dumps(next_event.result(), default=str)
+                        chunk = f"event: message\ndata: {data}\n\n".encode('utf-8')
+                        next_event = None
+                    else:
+                        chunk = b': keepalive\n\n'
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finally:
+                disconnect.cancel()
+                if next_event is not None:
+                    next_event.cancel()
+        finally:
+            self.hub.remove_listener(topic, loop, queue)
+
+    async def wait_for_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
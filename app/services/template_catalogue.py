@@ -0,0 +1,152 @@
+import os
+import logging
+import threading
+from datetime import datetime
+
+import click
+from flask import current_app, url_for
+from pymongo import ASCENDING
+
+from app.services.leases import acquire_lease
+from app.services.media import extract_first_page_as_image
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_TYPES = {
+    'FL_Forms': 'Florida',
+    'MN_Forms': 'Minnesota',
+}
+
+
+class TemplateIndexError(Exception):
+    """A template could not be catalogued, it is retried on the next sync."""
+
+
+def ensure_catalogue_indexes(db):
+    # Unique, so workers upserting the same template at once cannot catalogue it twice
+    db.documents.create_index([('url', ASCENDING)], unique=True)
+    db.documents.create_index([('type', ASCENDING), ('folder', ASCENDING)])
+    db.documents.create_index([('added_at', ASCENDING)])
+
+
+def scan_templates(upload_folder):
+    """Return {relative path: (mtime, size)} for every template PDF on disk."""
+    found = {}
+    for forms_type in TEMPLATE_TYPES:
+        forms_dir = os.path.join(upload_folder, 'templates', forms_type)
+        if not os.path.isdir(forms_dir):
+            continue
+        for folder in os.scandir(forms_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.is_file() and entry.name.endswith('.pdf'):
+                    stat = entry.stat()
+                    found['/'.join(['templates', forms_type, folder.name, entry.name])] = (stat.st_mtime, stat.st_size)
+    return found
+
+
+def index_template(relative_path):
+    """
+    Render the preview of a new or changed template and upsert its catalogue entry.
+    Returns the document when it was newly catalogued, raises TemplateIndexError when the
+    preview could not be rendered.
+    """
+    _, forms_type, folder, doc_name = relative_path.split('/')
+    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], *relative_path.split('/'))
+    if not extract_first_page_as_image(file_path):
+        raise TemplateIndexError('no preview could be rendered')
+
+    doc_url = url_for('serve_media', filename=relative_path)
+    document_data = {
+        'name': doc_name,
+        'url': doc_url,
+        'added_at': datetime.now(),
+        'preview_image': doc_url[:-4] + '.jpg',
+        'description': "",
+    }
+    location = {'folder': folder, 'type': forms_type, 'state': TEMPLATE_TYPES[forms_type]}
+    # Keyed on the url so documents moved or renamed by the admin views keep their _id
+    result = current_app.db.documents.update_one(
+        {'url': doc_url},
+        {'$set': location, '$setOnInsert': document_data},
+        upsert=True
+    )
+    if result.upserted_id is None:
+        return None
+    return dict(document_data, _id=result.upserted_id, **location)
+
+
+def sync_template_catalogue():
+    """
+    Bring the documents collection in line with the template folders, comparing the
+    disk against the template_manifest collection so only new, changed and removed
+    templates are touched. Returns the newly catalogued documents.
+    """
+    db = current_app.db
+    on_disk = scan_templates(current_app.config['UPLOAD_FOLDER'])
+    manifest = {entry['_id']: entry for entry in db.template_manifest.find()}
+
+    inserted = []
+    for relative_path, (mtime, size) in on_disk.items():
+        entry = manifest.get(relative_path)
+        if entry and entry['mtime'] == mtime and entry['size'] == size:
+            continue
+        try:
+            document = index_template(relative_path)
+        except Exception as e:
+            # Left out of the manifest, so the next sync tries again
+            logger.error(f"Failed to index template {relative_path}: {str(e)}")
+            continue
+        if document:
+            inserted.append(document)
+        db.template_manifest.update_one(
+            {'_id': relative_path},
+            {'$set': {'mtime': mtime, 'size': size, 'indexed_at': datetime.now()}},
+            upsert=True
+        )
+
+    for relative_path in set(manifest) - set(on_disk):
+        db.documents.delete_one({'url': url_for('serve_media', filename=relative_path)})
+        db.template_manifest.delete_one({'_id': relative_path})
+
+    return inserted
+
+
+class TemplateCatalogueIndexer(threading.Thread):
+    """Background thread that keeps the template catalogue in sync with the template folders."""
+
+    def __init__(self, app):
+        super().__init__(name='template-catalogue-indexer', daemon=True)
+        self.app = app
+        self.interval = app.config.get('TEMPLATE_INDEX_INTERVAL', 60)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                # Every worker process starts an indexer, the lease holder does the work
+                if acquire_lease(self.app.db, 'template-catalogue-indexer', self.interval * 3):
+                    # url_for needs a request context to build the media urls
+                    with self.app.test_request_context():
+                        sync_template_catalogue()
+            except Exception as e:
+                logger.error(f"Template catalogue indexer error: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+
+def start_template_indexer(app):
+    # Not for flask CLI commands, they exit long before an interval has passed
+    if not app.config.get('TEMPLATE_INDEXER_ENABLED', True) or click.get_current_context(silent=True):
+        return None
+    try:
+        ensure_catalogue_indexes(app.db)
+    except Exception as e:
+        app.logger.error(f"Failed to create template catalogue indexes: {e}")
+    indexer = TemplateCatalogueIndexer(app)
+    indexer.start()
+    app.template_indexer = indexer
+    return indexer
@@ -0,0 +1,81 @@
+import bisect
+from functools import lru_cache
+from itertools import accumulate
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+DEFAULT_FONT = 'Helvetica'
+DEFAULT_FONT_SIZE = 12
+
+
+@lru_cache(maxsize=4096)
+def glyph_units(char, font_name=DEFAULT_FONT):
+    # Width in 1/1000 em, standard fonts have no kerning so widths simply add up
+    return stringWidth(char, font_name, 1000)
+
+
+class TextLayout:
+    """
+    Width queries on one string computed from a cumulative glyph width array, so
+    finding how much text fits in a box is a binary search instead of measuring
+    every prefix with canvas.stringWidth.
+    """
+
+    def __init__(self, text, font_name=DEFAULT_FONT, font_size=DEFAULT_FONT_SIZE):
+        self.text = text
+        self.scale = font_size * 0.001
+        self.cumulative = [0] + list(accumulate(glyph_units(char, font_name) for char in text))
+
+    def width(self, start, end):
+        return (self.cumulative[end] - self.cumulative[start]) * self.scale
+
+    def fit(self, start, max_width):
+        """Return the largest end so that text[start:end] fits in max_width."""
+        limit = self.cumulative[start] + max_width / self.scale
+        end = bisect.bisect_right(self.cumulative, limit, lo=start) - 1
+        return max(end, start)
+
+    def break_line(self, start, max_width):
+        """
+        Return (end, next_start) for a line starting at start. Lines break after the
+        last whitespace that fits, words longer than a whole line are split.
+        """
+        end = self.fit(start, max_width)
+        if end >= len(self.text):
+            return len(self.text), len(self.text)
+        if not self.text[end].isspace():
+            space = self.text.rfind(' ', start, end)
+            if space > start:
+                end = space
+        next_start = end
+        while next_start < len(self.text) and self.text[next_start].isspace():
+            next_start += 1
+        return end, next_start
+
+
+def fit_text(text, max_width, font_name=DEFAULT_FONT, font_size=DEFAULT_FONT_SIZE):
+    """Longest prefix of text that fits in max_width."""
+    layout = TextLayout(text, font_name, font_size)
+    return text[:layout.fit(0, max_width)]
+
+
+def wrap_text(text, line_widths, font_name=DEFAULT_FONT, font_size=DEFAULT_FONT_SIZE):
+    """
+    Wrap text across lines of the given widths, returning one string per line used.
+    Text left over after the last line is dropped.
+    """
+    layout = TextLayout(text, font_name, font_size)
+    lines = []
+    # Leading whitespace would only break the first line early
+    start = len(text) - len(text.lstrip())
+    for max_width in line_widths:
+        if start >= len(text):
+            break
+        end, next_start = layout.break_line(start, max_width)
+        if end == start and next_start == start:
+            # Not even one character fits, try the next line
+            lines.append('')
+            continue
+        lines.append(text[start:end].rstrip())
+        start = next_start
+    return lines
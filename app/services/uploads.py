@@ -0,0 +1,202 @@
+"""
+Resumable uploads: a client opens a session with the total size, PUTs the bytes in
+chunks at the offset the server acknowledged last, and hands the upload_id to the
+view the file is meant for. Chunks stream straight to a part file, so no request
+holds more than one chunk and an interrupted transfer resumes from its offset.
+"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from pymongo import ReturnDocument
+from werkzeug.utils import secure_filename
+
+from app.services.blob_store import store_stream
+
+STATUS_OPEN = 'open'
+STATUS_COMPLETE = 'complete'
+STATUS_CONSUMED = 'consumed'
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """The request does not fit the upload session, status_code is the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=400, offset=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+def sessions_folder():
+    return current_app.config['UPLOAD_SESSIONS_FOLDER']
+
+
+def part_path(upload_id):
+    return os.path.join(sessions_folder(), f'{upload_id}.part')
+
+
+def ensure_upload_indexes(db):
+    db.upload_sessions.create_index([('uuid', 1), ('created_at', -1)])
+    db.upload_sessions.create_index('expires_at')
+
+
+def upload_info(session):
+    return {
+        'upload_id': session['_id'],
+        'filename': session['filename'],
+        'size': session['size'],
+        'offset': session['offset'],
+        'status': session['status'],
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+        'expires_at': session['expires_at']
+    }
+
+
+def create_upload_session(user, filename, size, content_type=None):
+    filename = secure_filename(filename or '')
+    if not filename:
+        raise UploadError('A valid filename is required')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('size must be a positive integer')
+    if size > current_app.config['UPLOAD_MAX_SIZE']:
+        raise UploadError(f"File is larger than the {current_app.config['UPLOAD_MAX_SIZE']} byte limit", 413)
+
+    now = datetime.now()
+    session = {
+        '_id': uuid.uuid4().hex,
+        'uuid': user['uuid'],
+        'filename': filename,
+        'content_type': content_type,
+        'size': size,
+        'offset': 0,
+        'status': STATUS_OPEN,
+        'created_at': now,
+        'updated_at': now,
+        'expires_at': now + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+    }
+    os.makedirs(sessions_folder(), exist_ok=True)
+    open(part_path(session['_id']), 'wb').close()
+    current_app.db.upload_sessions.insert_one(session)
+    return session
+
+
+def get_upload_session(user, upload_id):
+    session = current_app.db.upload_sessions.find_one({'_id': upload_id, 'uuid': user['uuid']})
+    if not session or session['status'] == STATUS_CONSUMED or session['expires_at'] < datetime.now():
+        raise UploadError('Upload not found', 404)
+    return session
+
+
+def append_chunk(user, upload_id, offset, stream):
+    """
+    Write one chunk read from stream at offset. The offset has to match what the
+    server has acknowledged, a mismatch answers 409 with the current offset so the
+    client can resume from there. A dropped connection keeps the bytes that arrived.
+    Returns the updated session.
+    """
+    session = get_upload_session(user, upload_id)
+    if session['status'] != STATUS_OPEN:
+        raise UploadError('Upload is already complete', 409, session['offset'])
+    if offset != session['offset']:
+        raise UploadError('Offset does not match the upload', 409, session['offset'])
+
+    now = datetime.now()
+    # Claim the session so two requests for the same offset cannot interleave their writes
+    claimed = current_app.db.upload_sessions.find_one_and_update(
+        {'_id': upload_id, 'offset': offset, 'status': STATUS_OPEN, '$or': [
+            {'locked_until': {'$exists': False}}, {'locked_until': {'$lt': now}}
+        ]},
+        {'$set': {'locked_until': now + timedelta(seconds=current_app.config['UPLOAD_CHUNK_TIMEOUT'])}}
+    )
+    if not claimed:
+        raise UploadError('Another chunk is being written to this upload', 409, session['offset'])
+
+    remaining = session['size'] - offset
+    limit = min(remaining, current_app.config['UPLOAD_CHUNK_SIZE'])
+    written = 0
+    try:
+        with open(part_path(upload_id), 'r+b') as f:
+            # Bytes of an earlier chunk that was never acknowledged are overwritten
+            f.truncate(offset)
+            f.seek(offset)
+            while True:
+                data = stream.read(COPY_BUFFER_SIZE)
+                if not data:
+                    break
+                if written + len(data) > limit:
+                    f.truncate(offset)
+                    raise UploadError(f'Chunk exceeds the {limit} bytes allowed at this offset', 413, offset)
+                f.write(data)
+                written += len(data)
+    except UploadError:
+        current_app.db.upload_sessions.update_one({'_id': upload_id}, {'$unset': {'locked_until': ''}})
+        raise
+    except BaseException:
+        # The connection dropped, what reached the file (closed, so flushed) is kept and
+        # acknowledged so the client can resume after it
+        current_app.db.upload_sessions.update_one(
+            {'_id': upload_id},
+            {'$set': {'offset': offset + written, 'updated_at': datetime.now()}, '$unset': {'locked_until': ''}}
+        )
+        raise
+
+    new_offset = offset + written
+    return current_app.db.upload_sessions.find_one_and_update(
+        {'_id': upload_id},
+        {
+            '$set': {
+                'offset': new_offset,
+                'status': STATUS_COMPLETE if new_offset == session['size'] else STATUS_OPEN,
+                'updated_at': datetime.now()
+            },
+            '$unset': {'locked_until': ''}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def consume_upload(user, upload_id, directory, label=None):
+    """
+    Move a completed upload into directory under a timestamped name, through the blob
+    store, and return its path. An upload can be consumed once.
+    """
+    session = current_app.db.upload_sessions.find_one_and_update(
+        {'_id': upload_id, 'uuid': user['uuid'], 'status': STATUS_COMPLETE},
+        {'$set': {'status': STATUS_CONSUMED, 'consumed_at': datetime.now()}}
+    )
+    if not session:
+        raise UploadError('Upload not found or not complete', 404)
+
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    filename = f"{label}_{session['filename']}" if label else session['filename']
+    path = os.path.join(directory, f"{timestamp}_{filename}")
+    try:
+        with open(part_path(upload_id), 'rb') as f:
+            store_stream(f, path)
+    except BaseException:
+        # Leave the upload usable for another attempt
+        current_app.db.upload_sessions.update_one({'_id': upload_id}, {'$set': {'status': STATUS_COMPLETE}})
+        raise
+    os.remove(part_path(upload_id))
+    return path
+
+
+def delete_upload_session(user, upload_id):
+    session = get_upload_session(user, upload_id)
+    current_app.db.upload_sessions.delete_one({'_id': session['_id']})
+    if os.path.exists(part_path(upload_id)):
+        os.remove(part_path(upload_id))
+
+
+def purge_expired_uploads():
+    """Remove sessions and part files past their expiry, returns how many were removed."""
+    removed = 0
+    for session in current_app.db.upload_sessions.find({'expires_at': {'$lt': datetime.now()}}, {'_id': 1}):
+        if os.path.exists(part_path(session['_id'])):
+            os.remove(part_path(session['_id']))
+        current_app.db.upload_sessions.delete_one({'_id': session['_id']})
+        removed += 1
+    return removed
@@ -0,0 +1,102 @@
+"""
+Per-file storage of the documents a user uploaded (chat attachments, signed
+contracts, fill-and-sign copies, own documents) and downloaded. Each file is its own
+document in user_uploaded_documents / user_downloaded_documents, replacing the
+per-user users_uploaded_docs / users_downloaded_docs documents with ever-growing
+arrays.
+"""
+from bson import ObjectId
+from flask import current_app
+from pymongo import UpdateOne
+
+# The fields clients have always received for an entry
+DOCUMENT_PROJECTION = {'_id': 0, 'uuid': 0}
+
+
+def ensure_user_document_indexes(db):
+    db.user_uploaded_documents.create_index([('uuid', 1), ('uploaded_at', -1)])
+    db.user_uploaded_documents.create_index([('uuid', 1), ('doc_id', 1)], unique=True)
+    db.user_uploaded_documents.create_index([('uuid', 1), ('url', 1)])
+    db.user_downloaded_documents.create_index([('uuid', 1), ('name', 1)], unique=True)
+    db.user_downloaded_documents.create_index([('uuid', 1), ('doc_id', 1)])
+
+
+def add_uploaded_document(uuid, document_data):
+    """Store one uploaded document entry for the user, a doc_id is assigned when missing."""
+    document_data.setdefault('doc_id', str(ObjectId()))
+    current_app.db.user_uploaded_documents.insert_one(dict(document_data, uuid=uuid))
+    return document_data
+
+
+def find_uploaded_document(uuid, **filters):
+    return current_app.db.user_uploaded_documents.find_one(dict(filters, uuid=uuid), DOCUMENT_PROJECTION)
+
+
+def list_uploaded_documents(uuid, start_date=None, end_date=None):
+    query = {'uuid': uuid}
+    date_range = {}
+    if start_date:
+        date_range['$gte'] = start_date
+    if end_date:
+        date_range['$lte'] = end_date
+    if date_range:
+        query['uploaded_at'] = date_range
+    return list(current_app.db.user_uploaded_documents.find(query, DOCUMENT_PROJECTION).sort('uploaded_at', 1))
+
+
+def update_uploaded_document(uuid, fields, **filters):
+    return current_app.db.user_uploaded_documents.update_one(dict(filters, uuid=uuid), {'$set': fields})
+
+
+def delete_uploaded_document(uuid, doc_id):
+    return current_app.db.user_uploaded_documents.delete_one({'uuid': uuid, 'doc_id': doc_id})
+
+
+def record_downloaded_document(uuid, document_data):
+    """Record a download, a document downloaded before only gets its downloaded_at refreshed. Returns True then."""
+    insert_fields = {key: value for key, value in document_data.items() if key != 'downloaded_at'}
+    result = current_app.db.user_downloaded_documents.update_one(
+        {'uuid': uuid, 'name': document_data['name']},
+        {'$set': {'downloaded_at': document_data['downloaded_at']}, '$setOnInsert': insert_fields},
+        upsert=True
+    )
+    return result.matched_count > 0
+
+
+def list_downloaded_documents(uuid):
+    return list(current_app.db.user_downloaded_documents.find({'uuid': uuid}, DOCUMENT_PROJECTION).sort('_id', 1))
+
+
+def migrate_embedded_documents(batch_size=500):
+    """
+    Copy the entries of users_uploaded_docs and users_downloaded_docs into the per-file
+    collections. Entries are upserted on their natural keys, so running it again only
+    adds what is missing. The old collections are left in place.
+    """
+    counts = {'uploaded': 0, 'downloaded': 0}
+
+    def flush(collection, operations, key):
+        if operations:
+            counts[key] += collection.bulk_write(operations, ordered=False).upserted_count
+            operations.clear()
+
+    operations = []
+    for user_docs in current_app.db.users_uploaded_docs.find({}, {'uuid': 1, 'uploaded_documents': 1}):
+        for entry in user_docs.get('uploaded_documents') or []:
+            entry = dict(entry)
+            match = {'uuid': user_docs['uuid'], 'url': entry.get('url'), 'name': entry.get('name'), 'uploaded_at': entry.get('uploaded_at')}
+            entry.setdefault('doc_id', str(ObjectId()))
+            entry['uuid'] = user_docs['uuid']
+            operations.append(UpdateOne(match, {'$setOnInsert': entry}, upsert=True))
+            if len(operations) >= batch_size:
+                flush(current_app.db.user_uploaded_documents, operations, 'uploaded')
+    flush(current_app.db.user_uploaded_documents, operations, 'uploaded')
+
+    for user_docs in current_app.db.users_downloaded_docs.find({}, {'uuid': 1, 'downloaded_documents': 1}):
+        for entry in user_docs.get('downloaded_documents') or []:
+            entry = dict(entry, uuid=user_docs['uuid'])
+            operations.append(UpdateOne({'uuid': user_docs['uuid'], 'name': entry.get('name')}, {'$setOnInsert': entry}, upsert=True))
+            if len(operations) >= batch_size:
+                flush(current_app.db.user_downloaded_documents, operations, 'downloaded')
+    flush(current_app.db.user_downloaded_documents, operations, 'downloaded')
+    return counts
@@ -0,0 +1,188 @@
+import re
+import csv
+import click
+import mmap
+import struct
+import bisect
+import logging
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# (first ZIP3, last ZIP3, state) ranges of USPS three digit ZIP prefixes
+ZIP3_STATE_RANGES = [
+    (5, 5, 'NY'), (6, 7, 'PR'), (8, 8, 'VI'), (9, 9, 'PR'),
+    (10, 27, 'MA'), (28, 29, 'RI'), (30, 38, 'NH'), (39, 49, 'ME'),
+    (50, 54, 'VT'), (55, 55, 'MA'), (56, 59, 'VT'), (60, 69, 'CT'),
+    (70, 89, 'NJ'), (90, 99, 'AE'), (100, 149, 'NY'), (150, 196, 'PA'),
+    (197, 199, 'DE'), (200, 200, 'DC'), (201, 201, 'VA'), (202, 205, 'DC'),
+    (206, 219, 'MD'), (220, 246, 'VA'), (247, 268, 'WV'), (270, 289, 'NC'),
+    (290, 299, 'SC'), (300, 319, 'GA'), (320, 339, 'FL'), (340, 340, 'AA'),
+    (341, 349, 'FL'), (350, 369, 'AL'), (370, 385, 'TN'), (386, 397, 'MS'),
+    (398, 399, 'GA'), (400, 427, 'KY'), (430, 459, 'OH'), (460, 479, 'IN'),
+    (480, 499, 'MI'), (500, 528, 'IA'), (530, 549, 'WI'), (550, 567, 'MN'),
+    (569, 569, 'DC'), (570, 577, 'SD'), (580, 588, 'ND'), (590, 599, 'MT'),
+    (600, 629, 'IL'), (630, 658, 'MO'), (660, 679, 'KS'), (680, 693, 'NE'),
+    (700, 714, 'LA'), (716, 729, 'AR'), (730, 732, 'OK'), (733, 733, 'TX'),
+    (734, 749, 'OK'), (750, 799, 'TX'), (800, 816, 'CO'), (820, 831, 'WY'),
+    (832, 838, 'ID'), (840, 847, 'UT'), (850, 865, 'AZ'), (870, 884, 'NM'),
+    (885, 885, 'TX'), (889, 898, 'NV'), (900, 961, 'CA'), (962, 966, 'AP'),
+    (967, 968, 'HI'), (969, 969, 'GU'), (970, 979, 'OR'), (980, 994, 'WA'),
+    (995, 999, 'AK'),
+]
+_ZIP3_STARTS = [start for start, _, _ in ZIP3_STATE_RANGES]
+
+STATE_NAMES = {
+    'MN': 'minnesota',
+    'FL': 'florida',
+}
+
+# Binary centroid table: header (magic, record count) followed by records sorted by ZIP
+ZIP_TABLE_MAGIC = b'ZIPC'
+ZIP_TABLE_HEADER = struct.Struct('<4sI')
+ZIP_TABLE_RECORD = struct.Struct('<I2sff')
+
+# A ZIP code only counts as the last part of the address, after a comma and optionally a
+# state, so house numbers and unit numbers are never taken for one
+ZIP_PATTERN = re.compile(
+    r',\s*(?:[a-z][a-z .]*?\s*,?\s+)?(\d{5})(?:-\d{4})?\s*(?:,\s*(?:usa|us|united states(?: of america)?)\s*)?$',
+    re.IGNORECASE
+)
+
+
+class ZipInfo:
+    def __init__(self, zipcode, state, latitude=None, longitude=None):
+        self.zipcode = zipcode
+        self.state = state
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+def state_for_zip3(zipcode):
+    prefix = int(zipcode[:3])
+    index = bisect.bisect_right(_ZIP3_STARTS, prefix) - 1
+    if index >= 0:
+        start, end, state = ZIP3_STATE_RANGES[index]
+        if start <= prefix <= end:
+            return state
+    return None
+
+
+class ZipCentroidTable:
+    """Read-only, memory-mapped ZIP -> (state, centroid) table searched in place."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = ZIP_TABLE_HEADER.unpack_from(self._mmap, 0)
+        if magic != ZIP_TABLE_MAGIC:
+            raise ValueError(f'{path} is not a ZIP centroid table')
+
+    def _zip_at(self, index):
+        return struct.unpack_from('<I', self._mmap, ZIP_TABLE_HEADER.size + index * ZIP_TABLE_RECORD.size)[0]
+
+    def lookup(self, zipcode):
+        target = int(zipcode)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._zip_at(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count or self._zip_at(low) != target:
+            return None
+        _, state, latitude, longitude = ZIP_TABLE_RECORD.unpack_from(
+            self._mmap, ZIP_TABLE_HEADER.size + low * ZIP_TABLE_RECORD.size
+        )
+        return ZipInfo(zipcode, state.decode('ascii'), latitude, longitude)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+def build_zip_table(gazetteer_path, output_path):
+    """
+    Build the binary centroid table from a Census ZCTA gazetteer file
+    (tab separated with GEOID, INTPTLAT and INTPTLONG columns).
+    Returns the number of records written.
+    """
+    records = []
+    with open(gazetteer_path, newline='') as f:
+        reader = csv.DictReader(f, delimiter='\t')
+        reader.fieldnames = [name.strip() for name in reader.fieldnames]
+        for row in reader:
+            zipcode = row['GEOID'].strip()
+            state = state_for_zip3(zipcode)
+            if not state:
+                continue
+            records.append((int(zipcode), state, float(row['INTPTLAT']), float(row['INTPTLONG'])))
+    records.sort()
+
+    with open(output_path, 'wb') as f:
+        f.write(ZIP_TABLE_HEADER.pack(ZIP_TABLE_MAGIC, len(records)))
+        for zipcode, state, latitude, longitude in records:
+            f.write(ZIP_TABLE_RECORD.pack(zipcode, state.encode('ascii'), latitude, longitude))
+    return len(records)
+
+
+def load_zip_table(app):
+    """
+    Load the centroid table. Without it address validation falls back to ZIP prefixes and
+    an error is logged, with ZIP_TABLE_REQUIRED set a missing table stops startup instead.
+    Flask CLI commands always start, so `flask build-zip-table` can create it.
+    """
+    path = app.config.get('ZIP_TABLE_PATH')
+    app.extensions['zip_table'] = None
+    try:
+        if not path:
+            raise OSError('ZIP_TABLE_PATH is not set')
+        app.extensions['zip_table'] = ZipCentroidTable(path)
+    except (OSError, ValueError) as e:
+        message = f"ZIP centroid table not loaded ({e}), build it with `flask build-zip-table <gazetteer file>`"
+        if app.config.get('ZIP_TABLE_REQUIRED', False) and click.get_current_context(silent=True) is None:
+            raise RuntimeError(message)
+        app.logger.error(f"{message}, using ZIP prefixes only")
+    return app.extensions['zip_table']
+
+
+def lookup_zip(zipcode):
+    """
+    Resolve a 5 digit ZIP code locally. With the centroid table loaded only known ZIP codes
+    resolve and carry coordinates, without it the state comes from the ZIP prefix.
+    """
+    if not zipcode or not re.fullmatch(r'\d{5}', zipcode):
+        return None
+    table = current_app.extensions.get('zip_table')
+    if table is not None:
+        return table.lookup(zipcode)
+    state = state_for_zip3(zipcode)
+    return ZipInfo(zipcode, state) if state else None
+
+
+def extract_zipcode(address):
+    match = ZIP_PATTERN.search((address or '').strip())
+    return match.group(1) if match else None
+
+
+def _state_pattern(state):
+    # The abbreviation only counts as the state part of the address (", FL" optionally followed
+    # by a ZIP), "Fl 3" is a floor. Full names count anywhere as whole words.
+    name = STATE_NAMES.get(state, state).lower()
+    return re.compile(
+        rf',\s*{state.lower()}\.?\s*(?:\d{{5}}(?:-\d{{4}})?)?\s*(?:,|$)|\b{re.escape(name)}\b',
+        re.IGNORECASE
+    )
+
+
+def is_address_in_states(address, states):
+    """Check the state of an address from its ZIP code, or from its state name when it has none."""
+    zipcode = extract_zipcode(address)
+    if zipcode:
+        info = lookup_zip(zipcode)
+        return bool(info) and info.state in states
+
+    address = (address or '').strip()
+    return any(_state_pattern(state).search(address) for state in states)
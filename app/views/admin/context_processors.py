@@ -1,12 +1,13 @@
 from email_validator import validate_email, EmailNotValidError
 
 from flask.views import MethodView
-from flask import jsonify
+from flask import jsonify, request
 from flask import current_app
 from flask_jwt_extended import get_jwt_identity
 
 from app.services.authentication import custom_jwt_required
 from app.services.admin import log_request
+from app.services.admin_snapshot import InvalidCursor, get_admin_snapshot, property_page, user_page
 
 
 class ContextProcessorsDataView(MethodView):
@@ -25,46 +26,22 @@ class ContextProcessorsDataView(MethodView):
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        # Get all users
-        users = list(current_app.db.users.find({}, {'_id': 0, 'otp': 0}))
-
-        # Get all properties
-        properties = current_app.db.properties.find()
-
-        property_list = []
-        for prop in properties:
-            lookup_info = current_app.db.property_seller_transaction.find_one({'property_id': str(prop['_id'])})
-            if lookup_info: 
-                property_id = str(prop.pop('_id', None))
-                prop['property_id'] = property_id
-                seller = current_app.db.users.find_one({'uuid': lookup_info['seller_id']})
-                if seller:
-                    owner_info = {
-                        'name': seller.get('first_name') + " " + seller.get('last_name'),
-                        'phone': seller.get('phone'),
-                        'email': seller.get('email'),
-                        'profile': seller.get('profile_pic'),
-                        'user_id': seller.get('uuid')
-                    }
-                    prop['owner_info'] = owner_info
-                else:
-                    prop['owner_info'] = {
-                        'name': "Customer-Service",
-                        'phone': None,
-                        'email': None,
-                        'profile': None,
-                        'user_id': None
-                    }                          # External properties
-                
-                property_list.append(prop)
-            else:
-                continue  # Invalid/Incomplete transaction properties
-          
-
-        # Combine users and properties data
-        context_processors_data = {
-            'users': users,
-            'properties': property_list
-        }
+        section = request.args.get('section')
+        if not section:
+            # Counts and recent items, kept up to date by the snapshot refresher
+            return jsonify(get_admin_snapshot()), 200
+
+        pages = {'users': user_page, 'properties': property_page}
+        if section not in pages:
+            return jsonify({'error': 'section must be users or properties'}), 400
+        page_size = current_app.config.get('ADMIN_PAGE_SIZE', 50)
+        try:
+            limit = min(max(int(request.args.get('limit', page_size)), 1), current_app.config.get('ADMIN_PAGE_SIZE_MAX', 200))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
 
-        return jsonify(context_processors_data), 200
+        try:
+            items, next_cursor = pages[section](cursor=request.args.get('cursor'), limit=limit)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'data': items, 'next_cursor': next_cursor}), 200
@@ -10,6 +10,9 @@ from werkzeug.utils import secure_filename
 from flask_jwt_extended import get_jwt_identity
 
 from app.services.authentication import custom_jwt_required, log_action
+from app.services.pdf_pool import get_pdf_pool
+from app.services.pdf_templates import invalidate_parsed_template
+from app.services.form_schemas import rebuild_question_schema
 from app.services.admin import (
     log_request, 
     get_folders_and_files, 
@@ -181,7 +184,8 @@ class UploadDocumentView(MethodView):
         file_path = os.path.join(file_dir, filename)
         file.save(file_path)
         document_data = update_files_in_documents_db()
-        document_data.pop('_id')
+        if document_data:
+            document_data.pop('_id')
         log_data = {
             "folder_type": folder_type,
             "existing_folder": folder,
@@ -388,6 +392,8 @@ class SingleFormQuestionView(MethodView):
                 'answer_locations':[]
             }
             current_app.db.doc_questions_answers.insert_one(question_data)
+            invalidate_parsed_template(doc_id)
+            rebuild_question_schema(doc_id)
             question_data.pop('_id')
             log_action(user['uuid'], user['role'], "added-question-on-document", question_data)
 
@@ -422,6 +428,8 @@ class SingleFormQuestionView(MethodView):
                     {'_id': ObjectId(question_id), 'document_id':doc_id},
                     {'$set': {'text': new_question, 'type': new_question_type, 'description': description, 'link':link}}
                 )
+                invalidate_parsed_template(doc_id)
+                rebuild_question_schema(doc_id)
                 log_data = {
                     "question_id": question_id,
                     "new_question": new_question,
@@ -444,6 +452,8 @@ class SingleFormQuestionView(MethodView):
                         {'_id': ObjectId(question_id), 'document_id': doc_id},
                         {'$push': {'answer_locations': {'$each': answer_locations + currentRect}}}
                     )
+                    invalidate_parsed_template(doc_id)
+                    rebuild_question_schema(doc_id)
 
                     log_data = {
                         "question_id": question_id,
@@ -481,6 +491,8 @@ class SingleFormQuestionView(MethodView):
                 return jsonify({'error': 'Question not found'}), 404
 
             current_app.db.doc_questions_answers.delete_one({'_id': ObjectId(question_id)})
+            invalidate_parsed_template(doc_id)
+            rebuild_question_schema(doc_id)
 
             log_data = {"document_id": doc_id, "deleted_question_id": question_id}
             
@@ -490,3 +502,18 @@ class SingleFormQuestionView(MethodView):
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
+
+
+class PdfPoolStatsView(MethodView):
+    decorators = [custom_jwt_required()]
+
+    def get(self):
+        log_request()
+        current_user = get_jwt_identity()
+        user = current_app.db.users.find_one({'email': current_user})
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        if user.get('role') != 'superuser':
+            return jsonify({'error': 'Unauthorized access'}), 403
+
+        return jsonify(get_pdf_pool().stats()), 200
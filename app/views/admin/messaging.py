@@ -13,6 +13,9 @@ import werkzeug
 from app.services.authentication import custom_jwt_required, log_action
 from app.services.admin import log_request
 from app.services.properties import send_notification
+from app.services.messaging import new_message_uid
+from app.services.user_documents import add_uploaded_document
+from app.services.blob_store import save_upload
 
 
 class UserCustomerChatUsersListView(MethodView):
@@ -97,6 +100,7 @@ class SaveAdminResponseView(MethodView):
             'user_id': user['uuid'],
             'message_content': [
                 {
+                    'message_uid': data.get('message_uid') or new_message_uid(),
                     'message_id': message_id,
                     'is_response': True,
                     'is_seen': False   
@@ -116,7 +120,7 @@ class SaveAdminResponseView(MethodView):
                 user_media_dir = os.path.join(current_app.config['UPLOAD_FOLDER'] ,'customer-support-chat',logged_in_user['uuid'],'uploaded_docs', str(user['uuid']))
                 os.makedirs(user_media_dir, exist_ok=True)
                 user_media_path = os.path.join(user_media_dir, filename)
-                file.save(user_media_path)
+                save_upload(file, user_media_path)
                 media_url = url_for('serve_media', filename=os.path.join('customer-support-chat',logged_in_user['uuid'],'uploaded_docs', str(user['uuid']), filename))
                 chat_message['message_content'][0]['media'] = media_url
                 document_data = {
@@ -127,12 +131,8 @@ class SaveAdminResponseView(MethodView):
                     'uploaded_at': datetime.now()
                 }
                
-                # Update the uploaded_documents collection
-                current_app.db.users_uploaded_docs.update_one(
-                    {'uuid': logged_in_user['uuid']},
-                    {'$push': {'uploaded_documents': document_data}},
-                    upsert=True
-                )
+                # Record the file in user_uploaded_documents
+                add_uploaded_document(logged_in_user['uuid'], document_data)
             else:
                 # Handle the case where the file has an invalid extension
                 return jsonify({"error": "Invalid file type. Allowed files are: {'png', 'jpg', 'jpeg', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'txt', 'csv'}"}), 400
@@ -217,6 +217,7 @@ class SavePropertyAdminResponseView(MethodView):
             'property_address': property_address,
             'message_content': [
                 {
+                    'message_uid': data.get('message_uid') or new_message_uid(),
                     'message_id': user_admin['uuid'],
                     'is_response': True,
                     'is_seen': False,
@@ -239,7 +240,7 @@ class SavePropertyAdminResponseView(MethodView):
                 admin_media_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'customer_support_property_chat_docs',str(user_admin['uuid']), 'uploaded_docs' , user['uuid'])
                 os.makedirs(admin_media_dir, exist_ok=True)
                 user_media_path = os.path.join(admin_media_dir, filename)
-                file.save(user_media_path)
+                save_upload(file, user_media_path)
                 media_url = url_for('serve_media', filename=os.path.join('customer_support_property_chat_docs', str(user_admin['uuid']), 'uploaded_docs', user['uuid'], filename))
                 chat_message['message_content'][0]['media'] = media_url
                 document_data = {
@@ -252,12 +253,8 @@ class SavePropertyAdminResponseView(MethodView):
                     'uploaded_at': datetime.now()
                 }
 
-                # Update the uploaded_documents collection
-                current_app.db.users_uploaded_docs.update_one(
-                    {'uuid': user_admin['uuid']},
-                    {'$push': {'uploaded_documents': document_data}},
-                    upsert=True
-                )
+                # Record the file in user_uploaded_documents
+                add_uploaded_document(user_admin['uuid'], document_data)
             else:
                 # Handle the case where the file has an invalid extension
                 return jsonify({"error": "Invalid file type. Allowed files are: png, jpg, jpeg, gif, pdf, doc, docx"}), 400
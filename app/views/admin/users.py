@@ -13,6 +13,7 @@ from werkzeug.utils import secure_filename
 
 from app.services.authentication import custom_jwt_required , log_action
 from app.services.admin import log_request
+from app.services.media_library import media_by_user
 
 
 class TokenCheckView(MethodView):
@@ -311,13 +312,12 @@ class GetMediaView(MethodView):
         current_user = get_jwt_identity()
         logged_in_user = current_app.db.users.find_one({'email': current_user})
         
-        all_media = list(current_app.db.media.find({}, {'_id': 0}))
+        all_media = media_by_user()
+        user_ids = [media['user_id'] for media in all_media]
+        emails = {user['uuid']: user['email'] for user in current_app.db.users.find({'uuid': {'$in': user_ids}}, {'uuid': 1, 'email': 1})}
         for media in all_media:
-            user = current_app.db.users.find_one({'uuid':media['user_id']})
-            try:
-                media['email'] = user['email']
-            except TypeError:
-                continue
+            if media['user_id'] in emails:
+                media['email'] = emails[media['user_id']]
         log_action(logged_in_user['uuid'], logged_in_user['role'], "viewed-media", {})
         return jsonify(all_media), 200
 
@@ -25,6 +25,7 @@ from app.services.authentication import (
     generate_otp ,log_action,
     insert_liked_properties
 )
+from app.services.autocomplete import get_autocomplete_client
 
 
 class RegisterUserView(MethodView):
@@ -110,7 +111,7 @@ class RegisterUserView(MethodView):
                 {'$set': {'otp': {'value': otp, 'time': current_time, 'is_used': False}}},
                 upsert=True
             )
-            send_otp_via_email(new_user['email'], otp, subject='OTP for user verification')
+            send_otp_via_email(new_user['email'], otp, subject='OTP for user verification', issued_at=current_time)
 
         new_user.pop('_id')
         log_action(new_user['uuid'], new_user['role'], "registration", new_user)
@@ -384,7 +385,7 @@ class ForgetPasswdView(MethodView):
             data['otp'] = otp
             data['time'] = current_time
             log_action(user['uuid'], user['role'], "forget-password", data)
-            send_otp_via_email(user['email'], otp, subject='OTP for Password Reset')
+            send_otp_via_email(user['email'], otp, subject='OTP for Password Reset', issued_at=current_time)
             return jsonify({'message': 'OTP sent to your email'}), 200  # OK
         else:
             return jsonify({"error": "User does not exist"}), 404  # Not Found
@@ -526,24 +527,16 @@ class SearchAddressAutoCompleteView(MethodView):
         # Extract individual query parameters from the request
         format_type = request.args.get('format', 'json')
         query = request.args.get('q')
-        limit = request.args.get('limit', 5)
+        limit = request.args.get('limit', 5, type=int)
 
         # Validate required parameters
         if not query:
             return jsonify({"error": "Query parameter 'q' is required"}), 400
 
-        # Construct the URL with the separate query parameters
-        api_url = f"http://192.168.36.100/search.php?format={format_type}&q={requests.utils.quote(query)}&limit={limit}"
-
-        current_app.logger.info(f"Constructed API URL: {api_url}")
-
         try:
-            # Make the request to the external API
-            response = requests.get(api_url)
-            response.raise_for_status()  # Raise an error for bad status codes
-        except requests.exceptions.RequestException as e:
+            results = get_autocomplete_client().search(query, limit, format_type)
+        except (requests.exceptions.RequestException, ValueError) as e:
             current_app.logger.error(f"Request to external API failed: {e}")
             return jsonify({"error": "External API request failed"}), 500
 
-        # Return the JSON response from the external API
-        return jsonify(response.json())
\ No newline at end of file
+        return jsonify(results)
\ No newline at end of file
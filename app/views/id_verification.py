@@ -2,6 +2,8 @@ import os
 from datetime import datetime
 from app.services.admin import log_request
 from app.services.verification import save_file 
+from app.services.uploads import UploadError, consume_upload
+from app.services.blob_store import release_path
 from app.services.authentication import custom_jwt_required, log_action
 from flask.views import MethodView
 from flask_jwt_extended import get_jwt_identity
@@ -15,11 +17,12 @@ class IDVerificationView(MethodView):
     def post(self):
         log_request()
         data = request.form
-        passport_front = request.files.get('passportFront', None)
-        passport_back = request.files.get('passportBack', None)
-        license_front = request.files.get('licenseFront', None)
-        license_back = request.files.get('licenseBack', None)
-        face_video = request.files.get('faceVideo', None)
+        # Each file can also be sent through /uploads and referenced as <field>UploadId
+        passport_front = request.files.get('passportFront', None) or data.get('passportFrontUploadId')
+        passport_back = request.files.get('passportBack', None) or data.get('passportBackUploadId')
+        license_front = request.files.get('licenseFront', None) or data.get('licenseFrontUploadId')
+        license_back = request.files.get('licenseBack', None) or data.get('licenseBackUploadId')
+        face_video = request.files.get('faceVideo', None) or data.get('faceVideoUploadId')
         current_user = get_jwt_identity()
 
         try:
@@ -41,47 +44,69 @@ class IDVerificationView(MethodView):
         user_docs_dir = os.path.join(upload_folder, 'id_verification', 'verification_docs')
         os.makedirs(user_docs_dir, exist_ok=True)
 
+        stored_paths = []
+
+        def store(item, file_type=None):
+            if isinstance(item, str):
+                path = consume_upload(user, item, user_docs_dir)
+            else:
+                path = save_file(item, user_docs_dir, file_type=file_type)
+            stored_paths.append(path)
+            return path
+
+        def release_stored():
+            # A consumed upload cannot be used again, its copy would only be an orphan
+            for path in stored_paths:
+                release_path(path)
+
         verification_document = {}
 
-        if passport_front and passport_back:
-            passport_front_path = save_file(passport_front, user_docs_dir)
-            passport_back_path = save_file(passport_back, user_docs_dir)
-            verification_document['passport'] = {
-                'front': passport_front_path,
-                'back': passport_back_path
-            }
-
-        if license_front and license_back:
-            license_front_path = save_file(license_front, user_docs_dir)
-            license_back_path = save_file(license_back, user_docs_dir)
-            verification_document['license'] = {
-                'front': license_front_path,
-                'back': license_back_path
-            }
-
-        if face_video:
-            face_video_path = save_file(face_video, user_docs_dir, file_type='video')
-            verification_document['face_video'] = face_video_path
-
-        verification_document['verification_date'] = datetime.now()
-
-        current_app.db.ID_verifications.update_one(
-            {'user_id': user['uuid']},
-            {
-                '$setOnInsert': {
-                    'user_id': user['uuid'],
-                    'documents': []
+        try:
+            if passport_front and passport_back:
+                passport_front_path = store(passport_front)
+                passport_back_path = store(passport_back)
+                verification_document['passport'] = {
+                    'front': passport_front_path,
+                    'back': passport_back_path
+                }
+
+            if license_front and license_back:
+                license_front_path = store(license_front)
+                license_back_path = store(license_back)
+                verification_document['license'] = {
+                    'front': license_front_path,
+                    'back': license_back_path
+                }
+
+            if face_video:
+                face_video_path = store(face_video, file_type='video')
+                verification_document['face_video'] = face_video_path
+
+            verification_document['verification_date'] = datetime.now()
+
+            current_app.db.ID_verifications.update_one(
+                {'user_id': user['uuid']},
+                {
+                    '$setOnInsert': {
+                        'user_id': user['uuid'],
+                        'documents': []
+                    }
+                },
+                upsert=True
+            )
+
+            current_app.db.ID_verifications.update_one(
+                {'user_id': user['uuid']},
+                {
+                    '$push': {'documents': verification_document}
                 }
-            },
-            upsert=True
-        )
-
-        current_app.db.ID_verifications.update_one(
-            {'user_id': user['uuid']},
-            {
-                '$push': {'documents': verification_document}
-            }
-        )
+            )
+        except UploadError as e:
+            release_stored()
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception:
+            release_stored()
+            raise
 
         log_action(user['uuid'], user['role'], "ID Verification", verification_document)
 
@@ -1,10 +1,10 @@
 from datetime import datetime, timedelta
 import werkzeug
 from bson import ObjectId
-import requests
 import os
 import urllib
 from email_validator import validate_email, EmailNotValidError
+from pymongo import UpdateOne
 from pymongo.errors import OperationFailure
 from flask.views import MethodView
 from flask import jsonify, logging, request, url_for
@@ -14,13 +14,28 @@ from flask import current_app
 from app.services.admin import log_request
 from app.services.authentication import custom_jwt_required, log_action
 from app.services.media import (
-    extract_first_page_as_image, 
-    document_exists, resource_exists,
     insert_answer_in_pdf,
-    create_user_document,
+    insert_answers_in_pdf,
     send_finalized_document
 )
+from app.services.prefill import PrefillError, get_prefill_client
 from app.services.properties import get_client_ip
+from app.services.pdf_templates import get_parsed_template
+from app.services.pdf_fill import PdfJobError, validate_answers
+from app.services.form_schemas import get_question_schema
+from app.services.blob_store import release_path, save_upload
+from app.services.media_library import InvalidCursor, add_media_item, delete_media_item, list_media_items
+from app.services.uploads import UploadError, consume_upload
+from app.services.user_documents import (
+    add_uploaded_document,
+    delete_uploaded_document,
+    find_uploaded_document,
+    list_downloaded_documents,
+    list_uploaded_documents,
+    record_downloaded_document,
+    update_uploaded_document
+)
+from app.services.form_answers import create_answer_record, delete_answer_record, get_answer_record, materialize, save_answers
 
 
 class ReceiveMediaView(MethodView):
@@ -43,36 +58,38 @@ class ReceiveMediaView(MethodView):
             return jsonify({"error": "Unsupported Content Type"}), 415  # Unsupported Media Type
 
         file = request.files.get('file')
+        # Large files are sent through /uploads first and referenced here by upload_id
+        upload_id = request.form.get('upload_id')
         label = request.form.get('label', 'no_label')
 
         if ' ' in label:
            return jsonify({'error': 'Spaces are not allowed in the label!'}), 400  # Bad Request
 
-        if not file:
+        if not file and not upload_id:
             return jsonify({'error': 'File is missing!'}), 400  # Bad Request
 
         user_media_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'users_media', str(user['uuid']))
         os.makedirs(user_media_dir, exist_ok=True)
 
-        if file and werkzeug.utils.secure_filename(file.filename):
+        filename = None
+        if upload_id:
+            try:
+                filename = os.path.basename(consume_upload(user, upload_id, user_media_dir, label))
+            except UploadError as e:
+                return jsonify({'error': str(e)}), e.status_code
+        elif file and werkzeug.utils.secure_filename(file.filename):
             org_filename = werkzeug.utils.secure_filename(file.filename)
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
             filename = f"{timestamp}_{label}_{org_filename}"
             user_media_path = os.path.join(user_media_dir, filename)
-            file.save(user_media_path)
+            save_upload(file, user_media_path)
+
+        if filename:
             media_url = url_for('serve_media', filename=os.path.join('users_media', str(user['uuid']), filename))
                 
             uploaded_media = [{'file': media_url, 'label': label}]
 
-            # Update the media collection atomically
-            result = current_app.db.media.update_one(
-                {'user_id': user['uuid']},
-                {'$push': {'user_media': {'$each': uploaded_media}}},
-                upsert=True
-            )
-
-            if result.modified_count == 0 and result.upserted_id is None:
-                return jsonify({'error': 'Failed to update media collection'}), 500  # Internal Server Error
+            add_media_item(user['uuid'], media_url, label)
         
         log_action(user['uuid'], user['role'], "uploaded-media", uploaded_media)
         return jsonify({"message": "File successfully received"}), 200  # OK
@@ -93,13 +110,24 @@ class SendMediaView(MethodView):
         if not user:
             return jsonify({'error': 'User not found'}), 404
 
-        all_media = current_app.db.media.find_one({'user_id': user['uuid']}, {'_id': 0})
+        label = request.args.get('label')
+        cursor = request.args.get('cursor')
+        page_size = current_app.config.get('MEDIA_PAGE_SIZE', 50)
+        try:
+            limit = min(max(int(request.args.get('limit', page_size)), 1), current_app.config.get('MEDIA_PAGE_SIZE_MAX', 200))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+
+        try:
+            media_items, next_cursor = list_media_items(user['uuid'], label=label, cursor=cursor, limit=limit)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
 
-        if not all_media or not all_media.get('user_media'):
+        if not media_items and not cursor and not label:
             return jsonify([]), 200
         
         log_action(user['uuid'], user['role'], "viewed-media", {})      
-        return jsonify({'data': all_media.get('user_media')}), 200
+        return jsonify({'data': media_items, 'next_cursor': next_cursor}), 200
 
 
 class DeleteMediaView(MethodView):
@@ -129,19 +157,11 @@ class DeleteMediaView(MethodView):
         file_path = os.path.join(user_media_dir, file_name)
 
         if os.path.exists(file_path):
-            os.remove(file_path)
+            release_path(file_path)
         else:
             return jsonify({'error': 'File not found on the server!'}), 404
 
-        # Update the media collection in the database
-        result = current_app.db.media.update_one(
-            {'user_id': user['uuid']},
-            {'$pull': {'user_media': {'file': file_url}}},
-            upsert=True
-        )
-
-        if result.modified_count == 0 and result.upserted_id is None:
-            return jsonify({'error': 'Failed to update media collection'}), 500
+        delete_media_item(user['uuid'], file_url)
 
         log_action(user['uuid'], user['role'], "deleted-media", {'file': file_url})
         return jsonify({'message': 'File deleted successfully'}), 200
@@ -185,30 +205,13 @@ class DownloadDocView(MethodView):
             'downloaded_at': datetime.now()
         }
 
-        # Check if the document already exists for the user in downloaded_documents
-        query = {
-            "uuid": user['uuid'],
-            "downloaded_documents": {
-                "$elemMatch": {
-                    "name": document_data['name']
-                }
-            }
-        }
-        existing_document = current_app.db.users_downloaded_docs.find_one(query)
-        
-        if existing_document:
-            current_app.db.users_downloaded_docs.update_one(
-                query,
-                {'$set': {'downloaded_documents.$.downloaded_at': document_data['downloaded_at']}}
-            )
+        # A document downloaded before only gets its downloaded_at refreshed
+        already_downloaded = record_downloaded_document(user['uuid'], document_data)
+
+        if already_downloaded:
             log_action(user['uuid'], user['role'], "downloaded-document", document_data)
             return jsonify({"message": "Document already exists for the user. Updated."}), 200
         else:
-            current_app.db.users_downloaded_docs.update_one(
-                {'uuid': user['uuid']}, 
-                {'$push': {'downloaded_documents': document_data}},
-                upsert=True
-            )
             log_action(user['uuid'], user['role'], "downloaded-document", document_data)
             return jsonify({"message": "Document successfully added to user's documents"}), 200  # Created
 
@@ -240,7 +243,7 @@ class UploadDocView(MethodView):
             user_media_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'user_docs', str(user['uuid']), 'uploaded_docs')
             os.makedirs(user_media_dir, exist_ok=True)
             user_doc_path = os.path.join(user_media_dir, filename)
-            file.save(user_doc_path)
+            save_upload(file, user_doc_path)
             doc_url = url_for('serve_media', filename=os.path.join('user_docs', str(user['uuid']), 'uploaded_docs', filename))
 
             document_data = {
@@ -252,12 +255,8 @@ class UploadDocView(MethodView):
                 'uploaded_at': datetime.now()
             }
 
-            # Update the uploaded_documents collection
-            current_app.db.users_uploaded_docs.update_one(
-                {'uuid': user['uuid']},
-                {'$push': {'uploaded_documents': document_data}},
-                upsert=True
-            )
+            # Record the file in user_uploaded_documents
+            add_uploaded_document(user['uuid'], document_data)
          
             log_action(user['uuid'], user['uuid'], "uploaded-document", document_data)
             return jsonify({"message": "File successfully uploaded!", "uploaded-document": document_data}), 200  # Created
@@ -280,32 +279,26 @@ class UploadDocView(MethodView):
         doc_id = str(doc_id)
 
         # Find the document before deleting it
-        user_doc = current_app.db.users_uploaded_docs.find_one(
-            {'uuid': user['uuid'], 'uploaded_documents.doc_id': doc_id},
-            {'uploaded_documents.$': 1}
-        )
+        document = find_uploaded_document(user['uuid'], doc_id=doc_id)
 
-        if not user_doc or 'uploaded_documents' not in user_doc:
+        if not document:
             return jsonify({"error": "No document found with the given ID, or you are unauthorized to delete"}), 404
 
-        # Get the document details
-        document = user_doc['uploaded_documents'][0]
         doc_url = document['url']
 
         # Delete the document from the user's uploaded documents
-        user_docs = current_app.db.users_uploaded_docs.update_one(
-            {'uuid': user['uuid']},
-            {'$pull': {'uploaded_documents': {'doc_id': doc_id}}}
-        )
+        user_docs = delete_uploaded_document(user['uuid'], doc_id)
 
-        if user_docs.modified_count > 0:
+        if user_docs.deleted_count > 0:
             # Document was found and deleted from the database
             file_name = os.path.basename(doc_url)
             user_docs_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'user_docs', str(user['uuid']), 'uploaded_docs')
             file_path = os.path.join(user_docs_dir, file_name)
             
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            # A fill-and-sign copy may never have been written to disk
+            answer_record = delete_answer_record(user, doc_url)
+            if os.path.exists(file_path) or answer_record:
+                release_path(file_path)
                 log_action(user['uuid'], user['role'], "deleted-user-document", {'file': doc_url})
                 return jsonify({'message': 'Document deleted successfully'}), 200
             else:
@@ -334,12 +327,9 @@ class UploadDocView(MethodView):
             return jsonify({'error': 'Invalid document ID'}), 400
 
         # Find the document to update
-        user_doc = current_app.db.users_uploaded_docs.find_one(
-            {'uuid': user['uuid'], 'uploaded_documents.doc_id': doc_id},
-            {'uploaded_documents.$': 1}
-        )
+        user_doc = find_uploaded_document(user['uuid'], doc_id=doc_id)
 
-        if not user_doc or 'uploaded_documents' not in user_doc:
+        if not user_doc:
             return jsonify({"error": "Document not found or unauthorized"}), 404
 
         # Prepare updated document data
@@ -353,36 +343,30 @@ class UploadDocView(MethodView):
             user_media_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'user_docs', str(user['uuid']), 'uploaded_docs')
             os.makedirs(user_media_dir, exist_ok=True)
             user_doc_path = os.path.join(user_media_dir, filename)
-            file.save(user_doc_path)
+            save_upload(file, user_doc_path)
 
             # Update document data with the new file
             doc_url = url_for('serve_media', filename=os.path.join('user_docs', str(user['uuid']), 'uploaded_docs', filename))
-            updated_document['uploaded_documents.$.name'] = file.filename
-            updated_document['uploaded_documents.$.url'] = doc_url
+            updated_document['name'] = file.filename
+            updated_document['url'] = doc_url
 
         # Update metadata fields if provided
         if 'type' in request.form:
-            updated_document['uploaded_documents.$.type'] = request.form['type']
+            updated_document['type'] = request.form['type']
         if 'name' in request.form:
-            updated_document['uploaded_documents.$.name'] = request.form['name']
+            updated_document['name'] = request.form['name']
         
         # Update the document's upload time
-        updated_document['uploaded_documents.$.uploaded_at'] = datetime.now()
+        updated_document['uploaded_at'] = datetime.now()
 
         # Update the document in the database
-        result = current_app.db.users_uploaded_docs.update_one(
-            {'uuid': user['uuid'], 'uploaded_documents.doc_id': doc_id},
-            {'$set': updated_document}
-        )
+        result = update_uploaded_document(user['uuid'], updated_document, doc_id=doc_id)
 
         if result.matched_count > 0 and result.modified_count > 0:
             # Retrieve the updated document to return it in the response
-            updated_doc = current_app.db.users_uploaded_docs.find_one(
-                {'uuid': user['uuid'], 'uploaded_documents.doc_id': doc_id},
-                {'uploaded_documents.$': 1}
-            )
-            if updated_doc and 'uploaded_documents' in updated_doc:
-                updated_document = updated_doc['uploaded_documents'][0]
+            updated_doc = find_uploaded_document(user['uuid'], doc_id=doc_id)
+            if updated_doc:
+                updated_document = updated_doc
                 log_action(user['uuid'], user['role'], "updated-user-document", updated_document)
                 return jsonify({"message": "Document updated successfully", "updated-document": updated_document}), 200
             else:
@@ -402,15 +386,12 @@ class UserDownloadedDocsView(MethodView):
         except EmailNotValidError:
             user = current_app.db.users.find_one({'uuid': current_user})
         if user:
-            user_docs = current_app.db.users_downloaded_docs.find_one(
-                {'uuid': user['uuid']},
-                {'downloaded_documents': 1, '_id': 0}
-            )
+            user_docs = list_downloaded_documents(user['uuid'])
             if not user_docs:
                 return jsonify([]), 200
           
             log_action(user['uuid'], user['role'], "viewed-downloaded-docs", {})
-            return jsonify({'data': user_docs['downloaded_documents']}), 200
+            return jsonify({'data': user_docs}), 200
         else:
             return jsonify({'error': 'User not found'}), 404  #Not found
 
@@ -446,46 +427,6 @@ class AllDocsView(MethodView):
             return jsonify({'error': 'Invalid value for recently_used parameter. Expected "true" or "false".'}), 400
         recently_used = recently_used == 'true'
 
-        # Prepare document directories
-        flforms_docs_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'templates', 'FL_Forms')
-        mnforms_docs_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'templates', 'MN_Forms')
-        folders_set = set()
-        types_set = set()
-
-        for forms_dir in [flforms_docs_dir, mnforms_docs_dir]:
-            forms_type = "FL_Forms" if forms_dir == flforms_docs_dir else "MN_Forms"
-            state = "Florida" if forms_dir == flforms_docs_dir else "Minnesota"
-            types_set.add(forms_type)
-
-            for folder in os.listdir(forms_dir):
-                folder_path = os.path.join(forms_dir, folder)
-                if os.path.isdir(folder_path):
-                    folders_set.add(folder)
-                    for file in os.listdir(folder_path):
-                        if file.endswith('.pdf'):
-                            doc_name = file
-                            doc_url = url_for('serve_media', filename=os.path.join('templates/' + forms_type, folder, file).replace('\\', '/'))
-                            preview_page_url = doc_url[:-4] + '.jpg'
-                            
-                            # Check if document already exists in MongoDB
-                            if not document_exists(doc_name):
-                                image_name = extract_first_page_as_image(os.path.join(folder_path, file))
-                                if image_name:
-                                    # Check if preview image already exists in MongoDB and folder
-                                    if not resource_exists(preview_page_url, doc_url):
-                                        # Store data in MongoDB
-                                        document_data = {
-                                            'name': doc_name,
-                                            'url': doc_url,
-                                            'added_at': datetime.now(),
-                                            'preview_image': preview_page_url,
-                                            'description': "",
-                                            'type': forms_type,
-                                            "state": state,
-                                            'folder': folder
-                                        }
-                                        current_app.db.documents.insert_one(document_data)
-
         # Build the MongoDB query with filters
         query_filter = {}
         if query_type:
@@ -526,8 +467,8 @@ class AllDocsView(MethodView):
         response = {
             'data': formatted_documents,
             'filters': {
-                'folders': list(folders_set),
-                'types': list(types_set)
+                'folders': current_app.db.documents.distinct('folder'),
+                'types': current_app.db.documents.distinct('type')
             },
             "length": len(documents)
         }
@@ -557,36 +498,8 @@ class UserDocumentsView(MethodView):
             start_date = datetime.fromisoformat(start_date_str) if start_date_str else None
             end_date = datetime.fromisoformat(end_date_str) if end_date_str else None
 
-            # Construct the conditions based on the provided dates
-            date_conditions = []
-            if start_date:
-                date_conditions.append({"$gte": ["$$doc.uploaded_at", start_date]})
-            if end_date:
-                date_conditions.append({"$lte": ["$$doc.uploaded_at", end_date]})
-
-            # If there are conditions, use them; otherwise, return true (no filtering)
-            cond = {"$and": date_conditions} if date_conditions else True
-            pipeline = [
-                {
-                    "$match": {
-                        "uuid": user['uuid']
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 0,
-                        "uploaded_documents": {
-                            "$filter": {
-                                "input": "$uploaded_documents",
-                                "as": "doc",
-                                "cond": cond
-                            }
-                        }
-                    }
-                }
-            ]
-
-            documents = list(current_app.db.users_uploaded_docs.aggregate(pipeline))
+            # One row per file, the date range is served by the (uuid, uploaded_at) index
+            filtered_documents = list_uploaded_documents(user['uuid'], start_date, end_date)
 
             log_data = {
                 'start_date': start_date_str,
@@ -594,8 +507,7 @@ class UserDocumentsView(MethodView):
             }
             log_action(user['uuid'], user['role'], "viewed-uploaded-docs-in-daterange", log_data)
 
-            if documents and documents[0].get('uploaded_documents'):
-                filtered_documents = documents[0]['uploaded_documents']
+            if filtered_documents:
                 return jsonify({"data": filtered_documents, "filters": log_data, "length": len(filtered_documents)}), 200
             else:
                 return jsonify({"data": [], "filters": log_data, "length": 0}), 200
@@ -623,23 +535,17 @@ class DocumentFillRequestView(MethodView):
             if not document:
                 return jsonify({'error': 'document not found'}), 404
             
-            # Get URL of original PDF
-            relative_path_encoded = document['url'].split('/media/')[-1]
-            relative_path_decoded = urllib.parse.unquote(relative_path_encoded)
-            original_file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path_decoded)
+            # Parsed up front, a missing template file fails here and the cache is warm for the first answer
+            get_parsed_template(document)
 
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-            # Check if modified PDF already exists
             filename = f"{timestamp}_{user['first_name']}-{user['last_name']}_{werkzeug.utils.secure_filename(document['name'])}"
-            user_media_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'user_docs', str(user['uuid']), 'uploaded_docs')
-            new_doc_path = os.path.join(user_media_dir, filename)
+            doc_url = url_for('serve_media', filename=os.path.join('user_docs', str(user['uuid']), 'uploaded_docs', filename))
 
-            user_document = create_user_document(original_file_path, new_doc_path, user_media_dir, filename, user)
-            if user_document.get('error'):
-                return jsonify(user_document), 500
-            else:
-                doc_url = user_document.get('doc_url')
+            # No copy is written here, the PDF is created from the template on first download or signature
+            create_answer_record(user, document_id, doc_url, filename)
+            user_document = {'doc_url': doc_url}
 
             # Document data to be inserted or updated
             user_name = user.get('first_name') + " " + user['last_name']
@@ -656,11 +562,7 @@ class DocumentFillRequestView(MethodView):
             }
             
             # Push a new document
-            current_app.db.users_uploaded_docs.update_one(
-                {'uuid': user['uuid']},
-                {'$push': {'uploaded_documents': document_data}},
-                upsert=True
-            )
+            add_uploaded_document(user['uuid'], document_data)
             document['user_ip'] = get_client_ip()
             document['timestamp'] = datetime.now()
             document['original_document_id'] = document_id
@@ -691,46 +593,8 @@ class DocAnswerInsertionView(MethodView):
             if not document:
                 return jsonify({'error': 'document not found'}), 404
             
-            doc_questions = list(current_app.db.doc_questions_answers.find({'document_id': document_id}))
-            questions = []
-            for question in doc_questions:
-                if len(question.get("answer_locations", [])) > 0:
-                    question_info = {
-                        "question_id": str(question.pop('_id')),
-                        "text": question.get("text"),
-                        "type" : question.get("type"),
-                        "answer_input_type": question.get("answer_locations", [])[0].get("answerInputType"),
-                        "answer_data_type": question.get("answer_locations", [])[0].get("answerOutputType")
-                    }
-                    if question.get("answer_locations", [])[0].get("answerInputType") in ('multiple-checkbox-single-choice-answer', 'multiple-checkbox-multiple-choice-answer'):
-                        position_dict = {}
-                        answer_locations = question.get("answer_locations", [])
-                        for location in answer_locations:
-                            position = location['position']
-                            value = location['value']
-                            if position not in position_dict:
-                                position_dict[position] = []
-                            position_dict[position].append(value)
-                        question_info['values'] = position_dict
-                    elif question.get("answer_locations", [])[0].get("answerInputType") == 'multiline':
-                        position_dict = {}
-                        answer_locations = question.get("answer_locations", [])
-                        for location in answer_locations:
-                            position = location['position']
-                            max_width = location['endX'] - location['startX']
-                            if position not in position_dict:
-                                position_dict[position] = []
-                            position_dict[position].append(max_width)
-                        question_info['max_width'] = position_dict
-                    elif question.get("answer_locations", [])[0].get("answerInputType") == 'single-line':
-                        answer_locations = question.get("answer_locations", [])
-                        answers_max_width = []
-                        for location in answer_locations:
-                            max_width = location['endX'] - location['startX']
-                            answers_max_width.append(max_width)
-                        question_info['max_width'] = answers_max_width
-                        
-                    questions.append(question_info)
+            # Compiled whenever the questions change, see SingleFormQuestionView
+            questions = get_question_schema(document_id)['questions']
 
             log_action(user['uuid'], user['role'], "viewed-document-questions", {'document_id':document_id})
             return jsonify(questions), 200
@@ -770,29 +634,12 @@ class DocAnswerInsertionView(MethodView):
             doc_type = f"fill_and_sign_{document['type']}"
             
             # Check if a document with the same URL, user_name, name, and type already exists for the user
-            existing_document = current_app.db.users_uploaded_docs.find_one(
-                {
-                    'uuid': user['uuid'],
-                    'uploaded_documents': {
-                        '$elemMatch': {
-                            'url': doc_url,
-                            'user_name': user_name,
-                            'type': doc_type
-                        }
-                    }
-                },
-                {'uploaded_documents.$': 1, '_id':0}
-            )
-            if not existing_document:
+            user_document = find_uploaded_document(user['uuid'], url=doc_url, user_name=user_name, type=doc_type)
+            if not user_document:
                 return jsonify({'error': 'Please request for sign and fill of the document'}), 404
-            
-            user_document = existing_document.get('uploaded_documents')[0]
 
-            # Retrieve answer locations from the database based on the question ID
-            question = current_app.db.doc_questions_answers.find_one(
-                {'document_id': document_id, '_id': ObjectId(question_id)},
-                {'_id': 0}
-            )
+            # Answer locations come precompiled from the parsed template cache
+            question = get_parsed_template(document).question(question_id)
 
             if not question:
                 return jsonify({'error': 'Question does not exist for this document'}), 404
@@ -803,16 +650,27 @@ class DocAnswerInsertionView(MethodView):
             relative_path_decoded = urllib.parse.unquote(relative_path_encoded)
             doc_path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path_decoded)
             
-            inserted_answer = insert_answer_in_pdf(
-                doc_path, answer_locations, answer, user, values, user_document.get('name')
-            )
-
-            if inserted_answer.get('error'):
-                return jsonify(inserted_answer), 400
-            elif inserted_answer.get('server-error'):
-                return jsonify(inserted_answer), 500
+            answer_record = get_answer_record(user, doc_url)
+            if answer_record:
+                # Only the answer is stored, the PDF is rendered once when signed or downloaded
+                pending = [{'question_id': question_id, 'answer_locations': answer_locations, 'answer': answer, 'values': values}]
+                try:
+                    validate_answers(pending)
+                except PdfJobError as e:
+                    return jsonify({'error': str(e)}), 400
+                answer_record = save_answers(answer_record, pending)
             else:
-                doc_url = inserted_answer.get('doc_url')
+                # Copies requested before answers were stored are still filled in place
+                inserted_answer = insert_answer_in_pdf(
+                    doc_path, answer_locations, answer, user, values, user_document.get('name')
+                )
+
+                if inserted_answer.get('error'):
+                    return jsonify(inserted_answer), 400
+                elif inserted_answer.get('server-error'):
+                    return jsonify(inserted_answer), 500
+                else:
+                    doc_url = inserted_answer.get('doc_url')
         
             # Update the doc_questions_answers collection with the answer
             current_app.db.doc_questions_answers.update_one(
@@ -822,29 +680,22 @@ class DocAnswerInsertionView(MethodView):
             )
 
             if question.get('text') in ["Signature", "signature"]:
-                current_app.db.users_uploaded_docs.update_one(
-                    {
-                        'uuid': user['uuid'],
-                        'uploaded_documents.url': doc_url,
-                        'uploaded_documents.user_name': user_name,
-                        'uploaded_documents.name': user_document.get('name'),
-                        'uploaded_documents.type': doc_type
-                    },
-                    {'$set': {
-                                'uploaded_documents.$.uploaded_at': datetime.now(),
-                                'uploaded_documents.$.is_signed': True,
-                            }
-                    }
+                update_uploaded_document(
+                    user['uuid'],
+                    {'uploaded_at': datetime.now(), 'is_signed': True},
+                    doc_id=user_document['doc_id']
                 )
+                if answer_record:
+                    doc_path = materialize(answer_record)
                 send_doc = send_finalized_document(user, doc_path)
-                if not send_doc.get('message'):
+                if send_doc.get('message'):
                     log_data =  {
                         'original_document_id': document_id,
                         'original_document_name': document['name'],
                         'question_id': question_id,
                         'question_text': question['text'], 
                         'inserted_text': answer,
-                        'user_doc_id' : str(user_document.get('_id')),
+                        'user_doc_id' : user_document.get('doc_id'),
                         'user_doc_name': user_document.get('name'),
                         'user_doc_url': doc_url,
                         'user_doc_signed': user_document.get('is_signed'),
@@ -863,7 +714,7 @@ class DocAnswerInsertionView(MethodView):
                 'question_id': question_id,
                 'question_text': question['text'], 
                 'inserted_text': answer,
-                'user_doc_id' : str(user_document.get('_id')),
+                'user_doc_id' : user_document.get('doc_id'),
                 'user_doc_name': user_document.get('name'),
                 'user_doc_url': doc_url,
                 'user_doc_signed': user_document.get('is_signed'),
@@ -878,6 +729,110 @@ class DocAnswerInsertionView(MethodView):
             return jsonify({'error': str(e)}), 500
 
 
+class DocAnswerBatchInsertionView(MethodView):
+    decorators = [custom_jwt_required()]
+
+    def post(self, document_id):
+        try:
+            log_request()
+            current_user = get_jwt_identity()
+            try:
+                validate_email(current_user)
+                user = current_app.db.users.find_one({'email': current_user})
+            except EmailNotValidError:
+                user = current_app.db.users.find_one({'uuid': current_user})
+
+            if not user:
+                return jsonify({'error': 'User not found'}), 404
+
+            doc_url = request.json.get('doc_url')
+            answers = request.json.get('answers')
+            if not doc_url or not isinstance(answers, list) or not answers:
+                return jsonify({'error': 'Missing required parameters'}), 400
+            if not all(isinstance(item, dict) and 'question_id' in item and 'answer' in item for item in answers):
+                return jsonify({'error': 'Every answer needs a question_id and an answer'}), 400
+
+            document = current_app.db.documents.find_one({'_id': ObjectId(document_id)})
+            if not document:
+                return jsonify({'error': 'Document not found'}), 404
+
+            user_name = user.get('first_name') + " " + user['last_name']
+            doc_type = f"fill_and_sign_{document['type']}"
+            user_document = find_uploaded_document(user['uuid'], url=doc_url, user_name=user_name, type=doc_type)
+            if not user_document:
+                return jsonify({'error': 'Please request for sign and fill of the document'}), 404
+
+            # Answer locations come precompiled from the parsed template cache
+            questions = get_parsed_template(document).questions
+            missing = [item['question_id'] for item in answers if item['question_id'] not in questions]
+            if missing:
+                return jsonify({'error': 'Question does not exist for this document', 'question_ids': missing}), 404
+
+            fill_batch = [
+                {
+                    'question_id': item['question_id'],
+                    'answer_locations': questions[item['question_id']].get('answer_locations', []),
+                    'answer': item['answer'],
+                    'values': item.get('values')
+                }
+                for item in answers
+            ]
+
+            relative_path_decoded = urllib.parse.unquote(doc_url.split('/media/')[-1])
+            doc_path = os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path_decoded)
+
+            answer_record = get_answer_record(user, doc_url)
+            if answer_record:
+                try:
+                    validate_answers(fill_batch)
+                except PdfJobError as e:
+                    return jsonify({'error': str(e)}), 400
+                answer_record = save_answers(answer_record, fill_batch)
+            else:
+                inserted_answers = insert_answers_in_pdf(doc_path, fill_batch, user, user_document.get('name'))
+                if inserted_answers.get('error'):
+                    return jsonify(inserted_answers), 400
+                elif inserted_answers.get('server-error'):
+                    return jsonify(inserted_answers), 500
+                doc_url = inserted_answers.get('doc_url')
+
+            current_app.db.doc_questions_answers.bulk_write([
+                UpdateOne({'document_id': document_id, '_id': ObjectId(item['question_id'])}, {'$set': {'answer': item['answer']}})
+                for item in answers
+            ])
+
+            log_data = {
+                'original_document_id': document_id,
+                'original_document_name': document['name'],
+                'question_ids': [item['question_id'] for item in answers],
+                'user_doc_name': user_document.get('name'),
+                'user_doc_url': doc_url,
+                'user_ip': get_client_ip(),
+                'timestamp': datetime.now()
+            }
+
+            is_signature = any(questions[item['question_id']].get('text') in ["Signature", "signature"] for item in answers)
+            if is_signature:
+                update_uploaded_document(
+                    user['uuid'],
+                    {'uploaded_at': datetime.now(), 'is_signed': True},
+                    doc_id=user_document['doc_id']
+                )
+                if answer_record:
+                    doc_path = materialize(answer_record)
+                send_doc = send_finalized_document(user, doc_path)
+                if not send_doc.get('message'):
+                    return jsonify({'error': send_doc.get('error')}), 500
+                log_data['email_sent'] = True
+                log_action(user['uuid'], user['role'], "document-signed-and-email-sent", log_data)
+                return jsonify({'message':"Document signed successfully and send to the user email", 'doc_url': doc_url}), 200
+
+            log_action(user['uuid'], user['role'], "inserted-answers-for-questions", log_data)
+            return jsonify({'doc_url': doc_url, 'answered': len(answers)}), 200
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+
 class DocumentPrefillAnswerView(MethodView):
     decorators = [custom_jwt_required()]
     
@@ -898,20 +853,16 @@ class DocumentPrefillAnswerView(MethodView):
             required_params = ['street_number', 'street_name', 'city', 'state', 'required_fields']
             if not all(param in request.json for param in required_params):
                 return jsonify({'error': 'Missing required parameters'}), 400
-            payload = {
-                'street_number': request.json['street_number'],
-                'street_name': request.json['street_name'],
-                'city': request.json['city'],
-                'state': request.json['state']
-            }
-            api_url = "http://24.152.187.23:50002/api/v1/search"
-            response = requests.post(api_url, json=payload)
-
-            if response.status_code == 200:
-                prefill_data = response.json()
-                return jsonify(prefill_data)
-            else:
-                return jsonify({'error': "Something went wrong, unable to get prefill data"}), 500
+            try:
+                prefill_data = get_prefill_client().search(
+                    request.json['street_number'],
+                    request.json['street_name'],
+                    request.json['city'],
+                    request.json['state']
+                )
+            except PrefillError as e:
+                return jsonify({'error': str(e)}), e.status_code
+            return jsonify(prefill_data)
         
         except Exception as e:
             return jsonify({'error': str(e)}), 500
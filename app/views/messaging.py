@@ -11,12 +11,20 @@ import werkzeug
 from flask import current_app, url_for
 from app.services.admin import log_request
 from app.services.authentication import custom_jwt_required , log_action
+from app.services.blob_store import save_upload
+from app.services.user_documents import add_uploaded_document
 from app.services.properties import (
     get_receivers, 
     search_messages, 
     search_customer_property_mesage,
     search_customer_service_mesage,
-    send_notification, save_archived_message
+    send_notification
+)
+from app.services.messaging import (
+    append_chat_message,
+    new_message_uid,
+    MESSAGE_DUPLICATE,
+    MESSAGE_INSERTED
 )
 
 
@@ -47,6 +55,7 @@ class SaveUserMessageView(MethodView):
             'user_id': user['uuid'],
             'message_content': 
                [{
+                    'message_uid': data.get('message_uid') or new_message_uid(),
                     'message_id': user['uuid'],
                     'is_response': False,
                     'is_seen': False   
@@ -66,7 +75,7 @@ class SaveUserMessageView(MethodView):
                 user_media_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'user_docs', str(user['uuid']), 'uploaded_docs')
                 os.makedirs(user_media_dir, exist_ok=True)
                 user_media_path = os.path.join(user_media_dir, filename)
-                file.save(user_media_path)
+                save_upload(file, user_media_path)
                 media_url = url_for('serve_media', filename=os.path.join('user_docs', str(user['uuid']), 'uploaded_docs', filename))
                 chat_message['message_content'][0]['media'] = media_url
                 
@@ -79,12 +88,8 @@ class SaveUserMessageView(MethodView):
                     'uploaded_at': datetime.now()
                 }
                
-                # Update the uploaded_documents collection
-                current_app.db.users_uploaded_docs.update_one(
-                    {'uuid': user['uuid']},
-                    {'$push': {'uploaded_documents': document_data}},
-                    upsert=True
-                )
+                # Record the file in user_uploaded_documents
+                add_uploaded_document(user['uuid'], document_data)
             else:
                 # Handle the case where the file has an invalid extension
                 return jsonify({"error": "Invalid file type. Allowed files are: {'png', 'jpg', 'jpeg', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'txt', 'csv'}"}), 415
@@ -265,6 +270,7 @@ class BuyerSellersChatView(MethodView):
         chat_message['seller_id'] = seller_id  
         timestamp = datetime.now()
         new_message_content = {
+            'message_uid': data.get('message_uid') or new_message_uid(),
             'msg_id': user['uuid'],
             'message': message if message else '',
             'timestamp': timestamp
@@ -279,7 +285,7 @@ class BuyerSellersChatView(MethodView):
                 user_media_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'user_docs', str(user['uuid']), 'uploaded_docs')
                 os.makedirs(user_media_dir, exist_ok=True)
                 user_media_path = os.path.join(user_media_dir, filename)
-                file.save(user_media_path)
+                save_upload(file, user_media_path)
                 media_url = url_for('serve_media', filename=os.path.join('user_docs', str(user['uuid']), 'uploaded_docs', filename))
                 new_message_content['media'] = media_url
                 document_data = {
@@ -292,11 +298,7 @@ class BuyerSellersChatView(MethodView):
                     'uploaded_at': datetime.now()
                 }
 
-                current_app.db.users_uploaded_docs.update_one(
-                    {'uuid': user['uuid']},
-                    {'$push': {'uploaded_documents': document_data}},
-                    upsert=True
-                )
+                add_uploaded_document(user['uuid'], document_data)
             else:
                 return jsonify({"error": "Invalid file type. Allowed files are: {'png', 'jpg', 'jpeg', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'txt', 'csv'}"}), 415
 
@@ -306,9 +308,17 @@ class BuyerSellersChatView(MethodView):
         mqtt_topic = f"buyer_seller_chat/{topic_email}"
         mqtt_client.subscribe(mqtt_topic)
 
+        # Publish the message itself so chat stream clients receive it, it is stored
+        # below so the MQTT handler must not persist it a second time, the message_uid
+        # keeps a redelivery harmless anyway
+        published_message = dict(
+            chat_message,
+            stored_by_api=True,
+            message_content=[dict(new_message_content, timestamp=new_message_content['timestamp'].isoformat())]
+        )
         mqtt_client.publish(
             topic=mqtt_topic, 
-            payload=json.dumps(chat_message)
+            payload=json.dumps(published_message)
         )
 
         mqtt_client.unsubscribe(mqtt_topic)
@@ -319,43 +329,18 @@ class BuyerSellersChatView(MethodView):
 
         log_action(user['uuid'], user['role'], "buyer_seller_chat-send_message", chat_message)
 
+        collection_name = 'archived_messages' if archived else 'buyer_seller_messaging'
+        status = append_chat_message(collection_name, chat_message, new_message_content, chat_message)
+        if status == MESSAGE_DUPLICATE:
+            return jsonify({'message': 'Message already received'}), 200
+
         if archived:
-            # Existing archived message check
-            existing_message = current_app.db.archived_messages.find_one({
-                'buyer_id': buyer_id,
-                'seller_id': seller_id,
-                'property_id': property_id
-            })
-
-            if existing_message:
-                current_app.db.archived_messages.update_one(
-                    {'_id': existing_message['_id']},
-                    {'$push': {'message_content': new_message_content}}
-                )
-                return jsonify({'message': 'Message successfully added to archive'}), 200
-            else:
-                chat_message['message_content'].append(new_message_content)
-                # Save the archived message to a different storage bucket/folder
-                save_archived_message(chat_message)  # This method should handle saving in the separate location
+            if status == MESSAGE_INSERTED:
                 return jsonify({'message': 'Message successfully archived'}), 201
-        else:
-            # Existing buyer_seller_messaging message check
-            existing_message = current_app.db.buyer_seller_messaging.find_one({
-                'buyer_id': buyer_id,
-                'seller_id': seller_id,
-                'property_id': property_id
-            })
-
-            if existing_message:
-                current_app.db.buyer_seller_messaging.update_one(
-                    {'_id': existing_message['_id']},
-                    {'$push': {'message_content': new_message_content}}
-                )
-                return jsonify({'message': 'Message successfully added'}), 200
-            else:
-                chat_message['message_content'].append(new_message_content)
-                current_app.db.buyer_seller_messaging.insert_one(chat_message)
-                return jsonify({'message': 'Message successfully sent'}), 201
+            return jsonify({'message': 'Message successfully added to archive'}), 200
+        if status == MESSAGE_INSERTED:
+            return jsonify({'message': 'Message successfully sent'}), 201
+        return jsonify({'message': 'Message successfully added'}), 200
 
 class BuyerSellerChatUsersListView(MethodView):
     decorators = [custom_jwt_required()]
@@ -505,6 +490,7 @@ class UserCustomerServicePropertySendMesssageView(MethodView):
             'property_id': property_id,
             'property_address': property_address,
             'message_content': [{
+                'message_uid': data.get('message_uid') or new_message_uid(),
                 'msg_id': user['uuid'],
                 'is_response': False,
                 'is_seen': False,
@@ -524,7 +510,7 @@ class UserCustomerServicePropertySendMesssageView(MethodView):
                 user_media_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'user_docs', str(user['uuid']), 'uploaded_docs')
                 os.makedirs(user_media_dir, exist_ok=True)
                 user_media_path = os.path.join(user_media_dir, filename)
-                file.save(user_media_path)
+                save_upload(file, user_media_path)
                 media_url = url_for('serve_media', filename=os.path.join('user_docs', str(user['uuid']), 'uploaded_docs', filename))
                 chat_message['message_content'][0]['media'] = media_url
                 document_data = {
@@ -538,12 +524,8 @@ class UserCustomerServicePropertySendMesssageView(MethodView):
                     'uploaded_at': datetime.now()
                 }
 
-                # Update the uploaded_documents collection
-                current_app.db.users_uploaded_docs.update_one(
-                    {'uuid': user['uuid']},
-                    {'$push': {'uploaded_documents': document_data}},
-                    upsert=True
-                )
+                # Record the file in user_uploaded_documents
+                add_uploaded_document(user['uuid'], document_data)
             else:
                 # Handle the case where the file has an invalid extension
                 return jsonify({"error": "Invalid file type. Allowed files are: {'png', 'jpg', 'jpeg', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'txt', 'csv'}"}), 415
@@ -1,12 +1,12 @@
 import logging
 from enum import Enum
-from geopy.geocoders import GoogleV3
 from flask import jsonify, current_app
 from flask import request, jsonify, current_app
 from flask.views import MethodView
 from flask_jwt_extended import get_jwt_identity
 from app.services.admin import log_request
 from app.services.authentication import custom_jwt_required
+from app.services.zip_lookup import lookup_zip
 from email_validator import validate_email, EmailNotValidError
 from datetime import datetime
 
@@ -111,30 +111,15 @@ class PrequalView(MethodView):
             return jsonify({"status": False, "message": "Missing or invalid timeline data"}), 400
 
         if zipcode:
-            try:
-                google_location_api_key = current_app.config['GOOGLE_LOCATION_API_KEY']
-                geocoder = GoogleV3(api_key=google_location_api_key)
-                location = geocoder.geocode(zipcode)
-
-                if location:
-                    for component in location.raw.get('address_components', []):
-                        if 'postal_code' in component.get('types', []):
-                            if component['long_name'] == zipcode:
-                                current_app.db.pre_qualified.update_one(
-                                    {'uuid': user['uuid']},
-                                    {'$push': {'timeline_stage': {'is_first_time_buyer': is_first_time, 'stage': stage, 'timeline': timeline, 'zipcode': zipcode}}},
-                                    upsert=True
-                                )
-                                return jsonify({"status": True, "message": "Data received","data": { "is_first_time_buyer": is_first_time, "home_buying_stage": stage, "timeline": timeline, "zipcode": zipcode}}), 200
-                            else:
-                                return jsonify({"status": False, "message": "ZIP code does not match location"}), 400
-                    return jsonify({"status": False, "message": "ZIP code not found in geocoded data"}), 400
-                else:
-                    return jsonify({"status": False, "message": "Invalid location"}), 400
-
-            except Exception as e:
-                logger.error(f"Error validating ZIP code: {str(e)}")
-                return jsonify({"status": False, "message": f"Failed to validate ZIP code: {str(e)}"}), 500
+            # Resolved from the local ZIP table, no geocoder round trip
+            if not lookup_zip(zipcode):
+                return jsonify({"status": False, "message": "Invalid location"}), 400
+            current_app.db.pre_qualified.update_one(
+                {'uuid': user['uuid']},
+                {'$push': {'timeline_stage': {'is_first_time_buyer': is_first_time, 'stage': stage, 'timeline': timeline, 'zipcode': zipcode}}},
+                upsert=True
+            )
+            return jsonify({"status": True, "message": "Data received","data": { "is_first_time_buyer": is_first_time, "home_buying_stage": stage, "timeline": timeline, "zipcode": zipcode}}), 200
         else:
             current_app.db.pre_qualified.update_one(
                 {'uuid': user['uuid']},
@@ -21,6 +21,10 @@ from app.services.properties import (
     validate_property_status, validate_property_type
 )
 from app.services.authentication import validate_user
+from app.services.zip_lookup import is_address_in_states
+from app.services.image_derivatives import image_path_from_url, remove_image_derivatives, schedule_image_derivatives
+from app.services.panoramas import remove_panorama_tiles, schedule_panorama_tiles
+from app.services.blob_store import release_path, save_upload
 
 class SellerPropertyListView(MethodView):
     decorators = [custom_jwt_required()]
@@ -147,7 +151,7 @@ class ExternalPropertyAddView(MethodView):
                 return jsonify({'error': 'Please enter a valid address in the United States.'}), 400
 
             # Check if seller_property_address is in Minnesota or Florida
-            if not any(keyword in property_address.lower() for keyword in ['mn', 'minnesota', 'fl', 'florida']):
+            if not is_address_in_states(property_address, ('MN', 'FL')):
                 return jsonify({'error': "The address must be located in Minnesota (MN) or Florida (FL)."}), 400
 
             # Validate the address
@@ -272,8 +276,8 @@ class UserPropertyView(MethodView):
                         if not re.search(r'\b(US|United States|USA|États-Unis|U\.S\.?)\b', value, flags=re.IGNORECASE):
                             return jsonify({'error': 'Please enter a valid address in the United States.'}), 400
                         
-                        # Check if seller_property_address is present in e_sign_data and contains mn, minnesota, fl, or florida
-                        if not any(keyword in  value.lower() for keyword in ['mn', 'minnesota', 'fl', 'florida']):
+                        # Check that the address is in Minnesota or Florida, from its ZIP code when it has one
+                        if not is_address_in_states(value, ('MN', 'FL')):
                             return jsonify({'error': "The address must be located in Minnesota (MN) or Florida (FL)."}), 400
                         
                         valid_address = validate_address(value)
@@ -336,7 +340,7 @@ class UserPropertyView(MethodView):
                     return jsonify({'error': 'File with the same name already exists in the database'}), 400
                 
                 image_path = os.path.join(user_media_dir, filename)
-                file.save(image_path)
+                save_upload(file, image_path)
                 image_url = url_for('serve_media', filename=os.path.join('user_properties', str(user['uuid']), str(property_id), filename))
                 image_data = {'lable':label, 'name': filename, 'image_url': image_url}
                 
@@ -345,6 +349,7 @@ class UserPropertyView(MethodView):
                     {'_id': ObjectId(property_id)},
                     {'$push': {'images': update_data['images'][0]}}
                 )
+                schedule_image_derivatives(property_id, image_data)
             
             property_data['property_id'] = property_id
             log_action(user['uuid'], user['role'], "updated-property", update_data)
@@ -419,31 +424,28 @@ class PanoramicImageView(MethodView):
         except ValueError:
             return jsonify({"error": "Invalid longitude value, must be a float"}), 400
 
-        # Check if the property exists
-        user_property = current_app.db.properties.find_one({'_id': ObjectId(property_id)})
+        # Check if the property exists, only the targeted version of the panoramas is read
+        user_property = current_app.db.properties.find_one(
+            {'_id': ObjectId(property_id)},
+            {'panoramic_images': {'$elemMatch': {'property_version': property_version}}}
+        )
         seller_transaction_property = current_app.db.property_seller_transaction.find_one(
             {'property_id': property_id, 'seller_id': user['uuid']}
         )
         if not user_property or not seller_transaction_property:
             return jsonify({"error": "Property not found"}), 404
 
-        # Get existing panoramic images
-        panoramic_images = user_property.get('panoramic_images', [])
+        property_version_images = (user_property.get('panoramic_images') or [None])[0]
 
         # Validate property_version
-        if panoramic_images:
-            existing_versions = [pano.get('property_version') for pano in panoramic_images]
-            max_version = max(existing_versions)
-            # if property_version != max_version+1:
-            #     return jsonify({"error": f"Invalid property_version value. Next version should be {max_version+1}."}), 400
-        else:
-            if property_version != 1:
+        if not property_version_images and property_version != 1:
+            has_panoramas = current_app.db.properties.find_one(
+                {'_id': ObjectId(property_id), 'panoramic_images.0': {'$exists': True}}, {'_id': 1}
+            )
+            if not has_panoramas:
                 return jsonify({"error": "Invalid property_version value. First version should be 1."}), 400
 
         # Validate order
-        property_version_images = next(
-            (pano for pano in panoramic_images if pano.get('property_version') == property_version), None
-        )
         if property_version_images:
             current_orders = [img['order'] for img in property_version_images.get('3d_images', [])]
             if current_orders:
@@ -459,11 +461,6 @@ class PanoramicImageView(MethodView):
             if order != 1:
                 return jsonify({"error": "Invalid order value. First order for a new property version should be 1."}), 400
 
-        # Save the panoramic image
-        image_data = save_panoramic_image(panoramic_image=panoramic_image, user=user, property_id=property_id)
-        if 'error' in image_data:
-            return jsonify({'error': image_data.get('error')}), 415
-
         if property_version_images:
             existing_image = next(
                 (img for img in property_version_images['3d_images'] if img['room_label'] == room_label), None
@@ -475,36 +472,47 @@ class PanoramicImageView(MethodView):
                     "error": f"Room label '{room_label}' does not exist in property version {property_version}. Please increase the property_version before adding a new label."
                 }), 400
 
-            if existing_image:
-                # Update existing image with the same room label
-                current_app.db.properties.update_one(
-                    {
-                        "_id": ObjectId(property_id),
-                        "panoramic_images.property_version": property_version,
-                        "panoramic_images.3d_images.room_label": room_label
-                    },
-                    {
-                        "$set": {
-                            "panoramic_images.$.3d_images.$[image].name": image_data.get('filename'),
-                            "panoramic_images.$.3d_images.$[image].url": image_data.get('image_url'),
-                            "panoramic_images.$.3d_images.$[image].geo_location_latitude": latitude,
-                            "panoramic_images.$.3d_images.$[image].geo_location_longitude": longitude,
-                            "panoramic_images.$.3d_images.$[image].uploaded_at": datetime.now(),
-                            "updated_at": datetime.now(),
-                        }
+        # Save the panoramic image
+        image_data = save_panoramic_image(panoramic_image=panoramic_image, user=user, property_id=property_id)
+        if 'error' in image_data:
+            return jsonify({'error': image_data.get('error')}), 415
+
+        if property_version_images:
+            # Update the image of this room label in place, both array levels are matched by filters
+            result = current_app.db.properties.update_one(
+                {"_id": ObjectId(property_id)},
+                {
+                    "$set": {
+                        "panoramic_images.$[version].3d_images.$[image].name": image_data.get('filename'),
+                        "panoramic_images.$[version].3d_images.$[image].url": image_data.get('image_url'),
+                        "panoramic_images.$[version].3d_images.$[image].geo_location_latitude": latitude,
+                        "panoramic_images.$[version].3d_images.$[image].geo_location_longitude": longitude,
+                        "panoramic_images.$[version].3d_images.$[image].uploaded_at": datetime.now(),
+                        "updated_at": datetime.now(),
                     },
-                    array_filters=[{"image.room_label": room_label}]
-                )
-                log_action(user['uuid'], user['role'], "updated-panoramic-image", existing_image)
-                return jsonify({
-                    "message": "Panoramic image updated successfully",
-                    "image_name": image_data.get('filename'),
-                    "image_url": image_data.get('image_url'),
-                    "room_label": room_label
-                }), 200
-
-            # Add a new image if the room label does not exist
-            new_image = {
+                    # The tiles of the replaced image are rebuilt for the new one
+                    "$unset": {"panoramic_images.$[version].3d_images.$[image].tiles": ""}
+                },
+                array_filters=[{"version.property_version": property_version}, {"image.room_label": room_label}]
+            )
+            if result.matched_count == 0:
+                # The saved image is not referenced anywhere
+                release_path(image_path_from_url(image_data.get('image_url')))
+                return jsonify({"error": "Property not found"}), 404
+            if existing_image.get('url') and existing_image['url'] != image_data.get('image_url'):
+                remove_panorama_tiles(existing_image['url'])
+            schedule_panorama_tiles(property_id, image_data.get('filename'), image_data.get('image_url'))
+            log_action(user['uuid'], user['role'], "updated-panoramic-image", existing_image)
+            return jsonify({
+                "message": "Panoramic image updated successfully",
+                "image_name": image_data.get('filename'),
+                "image_url": image_data.get('image_url'),
+                "room_label": room_label
+            }), 200
+
+        new_property_version_images = {
+            'property_version': property_version,
+            '3d_images': [{
                 "order": order,
                 "room_label": room_label,
                 "name": image_data.get('filename'),
@@ -512,53 +520,26 @@ class PanoramicImageView(MethodView):
                 "geo_location_latitude": latitude,
                 "geo_location_longitude": longitude,
                 "uploaded_at": datetime.now(),
-            }
-            current_app.db.properties.update_one(
-                {"_id": ObjectId(property_id), "panoramic_images.property_version": property_version},
-                {"$push": {"panoramic_images.$.3d_images": new_image}, "$set": {"updated_at": datetime.now()}}
-            )
-
-            log_action(user['uuid'], user['role'], "uploaded-panoramic-image", new_image)
+            }]
+        }
+        # Only pushed while the version does not exist, a concurrent create of the same version loses here
+        result = current_app.db.properties.update_one(
+            {'_id': ObjectId(property_id), 'panoramic_images.property_version': {'$ne': property_version}},
+            {'$push': {'panoramic_images': new_property_version_images}, "$set": {"updated_at": datetime.now()}}
+        )
+        if result.modified_count == 0:
+            release_path(image_path_from_url(image_data.get('image_url')))
             return jsonify({
-                'message': "Panoramic image added successfully",
-                'image_name': image_data.get('filename'),
-                'image_url': image_data.get('image_url')
-            }), 200
-
-        else:
-            # Creating a new property version only if it doesn't already exist
-            existing_version = current_app.db.properties.find_one(
-                {'_id': ObjectId(property_id), 'panoramic_images.property_version': property_version}
-            )
-
-            if not existing_version:
-                new_property_version_images = {
-                    'property_version': property_version,
-                    '3d_images': [{
-                        "order": order,
-                        "room_label": room_label,
-                        "name": image_data.get('filename'),
-                        "url": image_data.get('image_url'),
-                        "geo_location_latitude": latitude,
-                        "geo_location_longitude": longitude,
-                        "uploaded_at": datetime.now(),
-                    }]
-                }
-                current_app.db.properties.update_one(
-                    {'_id': ObjectId(property_id)},
-                    {'$push': {'panoramic_images': new_property_version_images}, "$set": {"updated_at": datetime.now()}}
-                )
+                "message": "Property version already exists, please update the existing version."
+            }), 400
 
-                log_action(user['uuid'], user['role'], "uploaded-panoramic-image", new_property_version_images)
-                return jsonify({
-                    "message": "Panoramic image uploaded successfully",
-                    'image_name': image_data.get('filename'),
-                    'image_url': image_data.get('image_url')
-                }), 200
-            else:
-                return jsonify({
-                    "message": "Property version already exists, please update the existing version."
-                }), 400
+        schedule_panorama_tiles(property_id, image_data.get('filename'), image_data.get('image_url'))
+        log_action(user['uuid'], user['role'], "uploaded-panoramic-image", new_property_version_images)
+        return jsonify({
+            "message": "Panoramic image uploaded successfully",
+            'image_name': image_data.get('filename'),
+            'image_url': image_data.get('image_url')
+        }), 200
 
 
     def get(self, property_id): 
@@ -577,7 +558,7 @@ class PanoramicImageView(MethodView):
 
         logging.info(f"Fetching all panoramic images for property ID: {property_id}")
 
-        user_property = current_app.db.properties.find_one({'_id': ObjectId(property_id)})
+        user_property = current_app.db.properties.find_one({'_id': ObjectId(property_id)}, {'panoramic_images': 1})
         seller_transaction_property = current_app.db.property_seller_transaction.find_one({'property_id': property_id, 'seller_id': user['uuid']})
         if not user_property or not seller_transaction_property:
             return jsonify({"error": "Property not found"}), 404
@@ -612,43 +593,36 @@ class PanoramicImageView(MethodView):
         property_version = int(property_version)
         order = int(order)
 
-        user_property = current_app.db.properties.find_one({'_id': ObjectId(property_id)})
+        user_property = current_app.db.properties.find_one({'_id': ObjectId(property_id)}, {'_id': 1})
         seller_transaction_property = current_app.db.property_seller_transaction.find_one({'property_id': property_id, 'seller_id': user['uuid']})
         if not all([user_property, seller_transaction_property]):
             return jsonify({"error": "Property not found"}), 404
-        
-        panoramic_images = user_property.get('panoramic_images', [])
-        
-        property_version_exists = False
-        order_exists = False
-        updated_panoramic_images = []
-
-        for panorama in panoramic_images:
-            if panorama.get('property_version') == property_version:
-                property_version_exists = True
-                updated_3d_images = [img for img in panorama.get('3d_images', []) if img.get('order') != order]
-                if len(updated_3d_images) < len(panorama.get('3d_images', [])):
-                    order_exists = True
-                if updated_3d_images:
-                    panorama['3d_images'] = updated_3d_images
-                    updated_panoramic_images.append(panorama)
-                else:
-                    current_app.db.properties.update_one(
-                        {"_id": ObjectId(property_id)},
-                        {"$pull": {"panoramic_images": {"property_version": property_version}},"$set": {"updated_at": datetime.now()}}
-                    )
-            else:
-                updated_panoramic_images.append(panorama)
 
-        if not property_version_exists:
-            return jsonify({'error': "property_version does not exist"}), 400
+        # Pull the image inside the matching version only, the rest of the array is untouched
+        result = current_app.db.properties.update_one(
+            {
+                "_id": ObjectId(property_id),
+                "panoramic_images": {"$elemMatch": {"property_version": property_version, "3d_images.order": order}}
+            },
+            {
+                "$pull": {"panoramic_images.$[version].3d_images": {"order": order}},
+                "$set": {"updated_at": datetime.now()}
+            },
+            array_filters=[{"version.property_version": property_version}]
+        )
 
-        if not order_exists:
+        if result.matched_count == 0:
+            version_exists = current_app.db.properties.find_one(
+                {"_id": ObjectId(property_id), "panoramic_images.property_version": property_version}, {'_id': 1}
+            )
+            if not version_exists:
+                return jsonify({'error': "property_version does not exist"}), 400
             return jsonify({'error': "order does not exist in the specified property_version"}), 400
 
+        # A version left without images is removed, the condition makes this a no-op otherwise
         current_app.db.properties.update_one(
             {"_id": ObjectId(property_id)},
-            {"$set": {"panoramic_images": updated_panoramic_images, "updated_at": datetime.now()}}
+            {"$pull": {"panoramic_images": {"property_version": property_version, "3d_images": {"$size": 0}}}}
         )
 
         log_action(user['uuid'], user['role'], "deleted-panoramic-images", {"property_id": property_id, "property_version": property_version, "order": order})
@@ -742,8 +716,6 @@ class PropertyImageDeleteView(MethodView):
         if not os.path.exists(file_path):
             return jsonify({"error": "File does not exist"}),404
 
-        os.remove(file_path)
-
         property_images = property_data.get('images', [])
 
         image_to_remove = next((image for image in property_images if image['image_url'] == image_url), None)
@@ -764,6 +736,11 @@ class PropertyImageDeleteView(MethodView):
         if result_properties.modified_count == 0 and result_transaction.modified_count == 0:
             return jsonify({'error': 'Failed to delete the image'}), 400
 
+        # Removed once the image is gone from the document, a derivatives job finishing
+        # after this sees no image to record them on and removes its own output
+        release_path(file_path)
+        remove_image_derivatives(file_path)
+
         log_action(user['uuid'], user['role'], "deleted-property-image", data)
         return jsonify({'message': 'Image deleted successfully'}), 200
 
@@ -1,8 +1,8 @@
 from bson import ObjectId
 from datetime import datetime
 from flask.views import MethodView
-from geopy.geocoders import GoogleV3
 from app.services.admin import log_request
+from app.services.geocoding import geocode_address
 from flask import jsonify, request, current_app
 from flask_jwt_extended import get_jwt_identity
 from app.services.authentication import custom_jwt_required
@@ -33,9 +33,7 @@ class SavedSearchView(MethodView):
 
         # Fetch latitude and longitude using Google Maps if not provided
         if not longitude or not latitude:
-            google_location_api_key = current_app.config['GOOGLE_LOCATION_API_KEY']
-            geocoder = GoogleV3(api_key=google_location_api_key)
-            location = geocoder.geocode(description)
+            location = geocode_address(description)
             if location:
                 latitude = location.latitude
                 longitude = location.longitude
@@ -110,9 +108,7 @@ class SavedSearchView(MethodView):
 
         # Fetch latitude and longitude using Google Maps if not provided
         if not longitude or not latitude:
-            google_location_api_key = current_app.config['GOOGLE_LOCATION_API_KEY']
-            geocoder = GoogleV3(api_key=google_location_api_key)
-            location = geocoder.geocode(description)
+            location = geocode_address(description)
             if location:
                 latitude = location.latitude
                 longitude = location.longitude
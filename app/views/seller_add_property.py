@@ -4,7 +4,6 @@ import logging
 import os
 import re
 import stripe
-import fitz
 from datetime import datetime
 from geopy.geocoders import GoogleV3
 from email_validator  import validate_email, EmailNotValidError
@@ -14,6 +13,12 @@ from flask import session, current_app, request, jsonify, url_for
 from flask_jwt_extended import get_jwt_identity
 from app.services.authentication import custom_jwt_required, log_action
 from app.services.admin import log_request
+from app.services.zip_lookup import is_address_in_states
+from app.services.pdf_fill import PdfJobError, stamp_signature
+from app.services.pdf_pool import get_pdf_pool
+from app.services.image_derivatives import schedule_image_derivatives
+from app.services.user_documents import add_uploaded_document
+from app.services.blob_store import save_upload
 from flask.views import MethodView
 from bson.errors import InvalidId 
 
@@ -71,8 +76,8 @@ class PropertyTypeSelectionView(MethodView):
         if not re.search(r'\b(US|United States|USA|États-Unis|U\.S\.?)\b', property_address, flags=re.IGNORECASE):
             return jsonify({'error': 'Please enter a valid address in the United States.'}), 400
         
-        # Check if seller_property_address is present in e_sign_data and contains mn, minnesota, fl, or florida
-        if not any(keyword in  property_address.lower() for keyword in ['mn', 'minnesota', 'fl', 'florida']):
+        # Check that the address is in Minnesota or Florida, from its ZIP code when it has one
+        if not is_address_in_states(property_address, ('MN', 'FL')):
             return jsonify({'error': "The address must be located in Minnesota (MN) or Florida (FL)."}), 400
         
         valid_address = validate_address(property_address)
@@ -202,7 +207,10 @@ class PropertyTourView(MethodView):
 
             subject = 'Property Tour Request'
             message = (f"Request for tour on {requested_datetime} from {requester_name} ({requester_id}).")
-            status_code, response = send_email(subject, message, owner_email)
+            status_code, response = send_email(
+                subject, message, owner_email,
+                idempotency_key=f"tour-request:{property_id}:{requester_id}:{requested_datetime.isoformat()}"
+            )
 
             if status_code == 400:
                 return jsonify({'error': response['error']}), 400
@@ -352,7 +360,7 @@ class PropertyUploadImageView(MethodView):
                     )
                     os.makedirs(user_media_dir, exist_ok=True)
                     image_path = os.path.join(user_media_dir, filename)
-                    image.save(image_path)
+                    save_upload(image, image_path)
                     # Generate URL for accessing the saved image
                     image_url = url_for(
                         'serve_media', 
@@ -374,6 +382,10 @@ class PropertyUploadImageView(MethodView):
                     {"$set": {"property_data.images": image_urls}}
                 )
                 uploaded_images = len(image_urls)
+
+                # Resized copies for list and detail views are built in the background
+                for image_data in image_urls:
+                    schedule_image_derivatives(transaction_data['property_data']['property_id'], image_data)
                 
             except Exception as e:
                 logger.error(f"Error Uploading property images: {str(e)}")
@@ -419,18 +431,15 @@ class SavePdfView(MethodView):
         if existing_transaction:
             return jsonify({'error':'Invalid transaction, transaction already exist for this property'}), 400
         
-        template_pdf = None
-        signature_pdf = None
-        signature_file_path = None
         data = request.json
 
         try:
             _, encoded_data = signature_data.split(',', 1)
             binary_data = base64.b64decode(encoded_data)
             property_address = transaction.get('property_data')['address'].lower()
-            if 'mn' in property_address or 'minnesota' in property_address:
+            if is_address_in_states(property_address, ('MN',)):
                 template_path = '/home/local/API/seller.pdf'
-            elif 'fl' in property_address or 'florida' in property_address:
+            elif is_address_in_states(property_address, ('FL',)):
                 template_path = '/home/local/API/florida.pdf'
             else:
                 return jsonify({'error': 'Invalid property_address.'}), 400
@@ -438,26 +447,10 @@ class SavePdfView(MethodView):
             signer_name = f"{transaction.get('user_info')['first_name']}_{transaction.get('user_info')['last_name']}"
             folder_path = os.path.join(current_app.root_path, 'media', 'Home', 'sign')
             os.makedirs(folder_path, exist_ok=True)
-            signature_file_name = f"{signer_name}_signature.png"
-            signature_file_path = os.path.join(folder_path, signature_file_name)
-            with open(signature_file_path, 'wb') as file:
-                file.write(binary_data)
-            template_pdf = fitz.open(template_path)
-            signature_pdf = fitz.open(signature_file_path)
-            # Debugging: Print the page count
-            print("Number of pages in the template PDF:", template_pdf.page_count)
-            first_page = template_pdf[0]
-            first_page.insert_text((20, 20), f"User IP: {get_client_ip()}")
-            if template_pdf.page_count >= 4:
-                fifth_page = template_pdf[3]  # Adjusted page number to exist within the document's range
-                rect = fitz.Rect(430, 0, 625, 850)
-                fifth_page.insert_image(rect, pixmap=signature_pdf[0].get_pixmap(), keep_proportion=True)
-            else:
-                return jsonify({"error":"PDF does not have enough pages to insert the signature."}), 400
-            
             unique_filename = generate_unique_name(folder_path, f"{signer_name}_signed_document.pdf")
             file_path = os.path.join(folder_path, unique_filename)
-            template_pdf.save(file_path)
+            # Stamping runs in the PDF process pool, the signature image is passed in memory
+            get_pdf_pool().run(stamp_signature, template_path, binary_data, file_path, get_client_ip())
             
             doc_url = url_for('serve_media', filename=os.path.join('Home','sign', unique_filename))
 
@@ -472,12 +465,8 @@ class SavePdfView(MethodView):
                 'uploaded_at': datetime.now()
             }
 
-            # Update the uploaded_documents collection
-            current_app.db.users_uploaded_docs.update_one(
-                {'uuid': transaction.get('user_info')['user_id']},
-                {'$push': {'uploaded_documents': document_data}},
-                upsert=True
-            )
+            # Record the file in user_uploaded_documents
+            add_uploaded_document(transaction.get('user_info')['user_id'], document_data)
             
             current_app.db.transaction.update_one({"_id": ObjectId(transaction_id)}, {"$set": {"signed_property_contract": doc_url}})
 
@@ -486,16 +475,11 @@ class SavePdfView(MethodView):
             document_data.pop('_id', None)
             log_action(user['uuid'], user['role'], "signed-property_contract", document_data) 
             return jsonify({'message':'data saved successfully.'}), 200
+        except PdfJobError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             print("Error during PDF generation:", str(e))
             return jsonify({'error': str(e)}), 500
-        finally:
-            if template_pdf:
-                template_pdf.close()
-            if signature_pdf:
-                signature_pdf.close()
-            if signature_file_path:
-                os.remove(signature_file_path)
         
 
 class CheckoutView(MethodView):
@@ -577,7 +561,10 @@ class CheckoutView(MethodView):
             recipient_email =  transaction['user_info']['email']
             
             # Replace `send_email` with your actual email sending function
-            status_code, headers = send_email(subject, message, recipient_email)
+            status_code, headers = send_email(
+                subject, message, recipient_email,
+                idempotency_key=f"purchase-welcome:{transaction_id}"
+            )
             if status_code == 202:
                 transaction.pop('_id', None)
                 lookup_data.pop('_id', None)
@@ -0,0 +1,106 @@
+from email_validator import validate_email, EmailNotValidError
+from flask.views import MethodView
+from flask import jsonify, request, current_app
+from flask_jwt_extended import get_jwt_identity
+
+from app.services.admin import log_request
+from app.services.authentication import custom_jwt_required, log_action
+from app.services.uploads import (
+    UploadError,
+    append_chunk,
+    create_upload_session,
+    delete_upload_session,
+    get_upload_session,
+    upload_info
+)
+
+
+def _current_user():
+    current_user = get_jwt_identity()
+    try:
+        validate_email(current_user)
+        return current_app.db.users.find_one({'email': current_user})
+    except EmailNotValidError:
+        return current_app.db.users.find_one({'uuid': current_user})
+
+
+def _upload_error(e):
+    body = {'error': str(e)}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    response = jsonify(body)
+    if e.offset is not None:
+        response.headers['Upload-Offset'] = str(e.offset)
+    return response, e.status_code
+
+
+class UploadSessionsView(MethodView):
+    decorators = [custom_jwt_required()]
+
+    def post(self):
+        log_request()
+        user = _current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        data = request.json or {}
+        try:
+            session = create_upload_session(user, data.get('filename'), data.get('size'), data.get('content_type'))
+        except UploadError as e:
+            return _upload_error(e)
+
+        log_action(user['uuid'], user['role'], "started-upload", {'upload_id': session['_id'], 'size': session['size']})
+        return jsonify(upload_info(session)), 201
+
+
+class UploadSessionView(MethodView):
+    decorators = [custom_jwt_required()]
+
+    def head(self, upload_id):
+        user = _current_user()
+        if not user:
+            return '', 404
+        try:
+            session = get_upload_session(user, upload_id)
+        except UploadError as e:
+            return '', e.status_code
+        return '', 200, {'Upload-Offset': str(session['offset']), 'Upload-Length': str(session['size'])}
+
+    def get(self, upload_id):
+        user = _current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        try:
+            return jsonify(upload_info(get_upload_session(user, upload_id))), 200
+        except UploadError as e:
+            return _upload_error(e)
+
+    def put(self, upload_id):
+        """Append the raw request body at the offset given in the Upload-Offset header."""
+        user = _current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+
+        offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+        if offset is None or not str(offset).isdigit():
+            return jsonify({'error': 'Upload-Offset header is required'}), 400
+
+        try:
+            # request.stream is read as it arrives, the body is never spooled
+            session = append_chunk(user, upload_id, int(offset), request.stream)
+        except UploadError as e:
+            return _upload_error(e)
+
+        response = jsonify(upload_info(session))
+        response.headers['Upload-Offset'] = str(session['offset'])
+        return response, 200
+
+    def delete(self, upload_id):
+        user = _current_user()
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        try:
+            delete_upload_session(user, upload_id)
+        except UploadError as e:
+            return _upload_error(e)
+        return jsonify({'message': 'Upload cancelled'}), 200
@@ -1,8 +1,11 @@
 import os
 from asgiref.wsgi import WsgiToAsgi
 from app import create_app
+from app.services.realtime import ChatStreamHub, ChatStreamApp
 
 config_name = os.getenv('CONFIG', 'development')
 app = create_app(config_name)
 
-asgi_app = WsgiToAsgi(app)
+# Chat streams are served natively on the event loop, everything else goes to Flask
+chat_stream_hub = ChatStreamHub.from_config(app.config)
+asgi_app = ChatStreamApp(app, WsgiToAsgi(app), chat_stream_hub)
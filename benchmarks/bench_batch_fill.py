@@ -0,0 +1,75 @@
+"""
+Filling a form's answers in one batch against one fill_answer call per answer, each of
+which parses and rewrites the whole PDF. Run with `python -m benchmarks.bench_batch_fill
+[template.pdf ...]`, a generated 12 page form is used without templates.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Importing the app package loads app.config, which needs these
+os.environ.setdefault('DB_PORT', '27017')
+
+from PyPDF2 import PdfReader  # noqa: E402
+
+from app.services.pdf_fill import fill_answer, fill_answers  # noqa: E402
+from benchmarks.sample_pdfs import write_form_pdf  # noqa: E402
+
+
+def form_answers(page_count, count):
+    answers = []
+    for index in range(count):
+        answers.append({
+            'question_id': f'q{index}',
+            'answer': f'Answer number {index}',
+            'values': None,
+            'answer_locations': [{
+                'pageNum': index % page_count + 1,
+                'position': 1,
+                'answerInputType': 'text',
+                'answerOutputType': 'text',
+                'startX': 100,
+                'endX': 400,
+                'endY': 60 + (index // page_count) * 12
+            }]
+        })
+    return answers
+
+
+def timed(fn, template, work_dir):
+    path = os.path.join(work_dir, 'document.pdf')
+    shutil.copyfile(template, path)
+    started = time.perf_counter()
+    fn(path)
+    return time.perf_counter() - started
+
+
+def bench(template, work_dir):
+    page_count = len(PdfReader(template).pages)
+    print(f'{os.path.basename(template)}, {page_count} pages')
+    for count in (10, 30, 60):
+        answers = form_answers(page_count, count)
+
+        def sequential(path):
+            for answer in answers:
+                fill_answer(path, answer['answer_locations'], answer['answer'], answer['values'])
+
+        sequential_seconds = timed(sequential, template, work_dir)
+        batch_seconds = timed(lambda path: fill_answers(path, answers), template, work_dir)
+        print(
+            f'  {count:>3} answers   one by one {sequential_seconds * 1000:9.1f} ms   '
+            f'batch {batch_seconds * 1000:8.1f} ms   {sequential_seconds / batch_seconds:5.1f}x'
+        )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as work_dir:
+        templates = sys.argv[1:] or [write_form_pdf(os.path.join(work_dir, 'form.pdf'), pages=12)]
+        for template in templates:
+            bench(template, work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Bytes moved to delete one panorama as the property grows: reading the whole document
+and $set-ing the filtered panoramic_images array back, against the _id only read and the
+array-filter $pull the view sends now. With TEST_MONGO_URI set both are also timed
+against that server. Run with `python -m benchmarks.bench_panorama_edits`.
+"""
+import os
+import time
+import uuid
+from datetime import datetime
+
+import bson
+from pymongo import MongoClient
+
+PROPERTY_FIELDS = {
+    'address': '12345 Main St, Minneapolis, MN 55401',
+    'description': 'Three bedroom house close to the lakes. ' * 20,
+    'images': [{'name': f'{i}.jpg', 'image_url': f'https://example.com/media/{i}.jpg'} for i in range(30)]
+}
+
+
+def panorama(version, order):
+    return {
+        'order': order,
+        'room_label': f'room_{order}',
+        'name': f'v{version}_{order}.jpg',
+        'url': f'https://example.com/media/user_properties/seller/property/panoramic_image/v{version}_{order}.jpg',
+        'geo_location_latitude': 44.97,
+        'geo_location_longitude': -93.26,
+        'uploaded_at': datetime.now(),
+        'tiles': {'base_url': 'https://example.com/media/tiles', 'levels': 4, 'tile_size': 512}
+    }
+
+
+def property_document(versions, images_per_version):
+    panoramas = [
+        {'property_version': version, '3d_images': [panorama(version, order) for order in range(1, images_per_version + 1)]}
+        for version in range(1, versions + 1)
+    ]
+    return dict(PROPERTY_FIELDS, _id=bson.ObjectId(), panoramic_images=panoramas)
+
+
+def whole_array_edit(document, version, order):
+    """The read and the update of the old delete, the whole document both ways."""
+    panoramas = [dict(item, **{'3d_images': list(item['3d_images'])}) for item in document['panoramic_images']]
+    for item in panoramas:
+        if item['property_version'] == version:
+            item['3d_images'] = [image for image in item['3d_images'] if image['order'] != order]
+    read = document
+    update = {'$set': {'panoramic_images': panoramas, 'updated_at': datetime.now()}}
+    return read, update
+
+
+def targeted_edit(document, version, order):
+    """The existence check and the array-filter $pull of the view."""
+    read = {'_id': document['_id']}
+    update = {
+        '$pull': {'panoramic_images.$[version].3d_images': {'order': order}},
+        '$set': {'updated_at': datetime.now()}
+    }
+    return read, update
+
+
+def moved_bytes(read, update):
+    return len(bson.encode(read)), len(bson.encode(update))
+
+
+def time_server(collection, document, version, order, number=50):
+    collection.replace_one({'_id': document['_id']}, document, upsert=True)
+    started = time.perf_counter()
+    for _ in range(number):
+        current = collection.find_one({'_id': document['_id']})
+        _, update = whole_array_edit(current, version, order)
+        collection.update_one({'_id': document['_id']}, update)
+        collection.replace_one({'_id': document['_id']}, document)
+    whole = (time.perf_counter() - started) / number
+
+    started = time.perf_counter()
+    for _ in range(number):
+        collection.find_one({'_id': document['_id']}, {'_id': 1})
+        _, update = targeted_edit(document, version, order)
+        collection.update_one(
+            {'_id': document['_id']}, update, array_filters=[{'version.property_version': version}]
+        )
+        collection.replace_one({'_id': document['_id']}, document)
+    targeted = (time.perf_counter() - started) / number
+    return whole, targeted
+
+
+def main():
+    uri = os.getenv('TEST_MONGO_URI')
+    client = MongoClient(uri) if uri else None
+    database = client.get_database(f'bench_panoramas_{uuid.uuid4().hex[:8]}') if client else None
+    try:
+        print('BSON bytes read plus written to delete one panorama')
+        print(f"{'versions x images':<20} {'document':>10} {'whole array':>14} {'targeted':>12}")
+        for versions, images in ((1, 5), (5, 10), (20, 15), (50, 20)):
+            document = property_document(versions, images)
+            whole = moved_bytes(*whole_array_edit(document, versions, 1))
+            targeted = moved_bytes(*targeted_edit(document, versions, 1))
+            print(
+                f'{f"{versions} x {images}":<20} {len(bson.encode(document)):>10} '
+                f'{sum(whole):>14} {sum(targeted):>12}'
+            )
+            if database is not None:
+                whole_seconds, targeted_seconds = time_server(database.properties, document, versions, 1)
+                print(f"{'':<20} {'':>10} {whole_seconds * 1000:>11.2f} ms {targeted_seconds * 1000:>9.2f} ms")
+    finally:
+        if client:
+            client.drop_database(database.name)
+            client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Template previews: the first-page-only PyMuPDF renderer against rasterizing every page at
+pdf2image's default 200 DPI, as extract_first_page_as_image did. pdf2image itself is
+timed too when poppler is installed. Run with `python -m benchmarks.bench_previews
+[template.pdf ...]`, generated 4, 12 and 30 page forms are used without templates.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Importing the app package loads app.config, which needs these
+os.environ.setdefault('DB_PORT', '27017')
+
+import fitz  # noqa: E402
+
+from app.services.previews import render_first_page_previews  # noqa: E402
+from benchmarks.sample_pdfs import write_form_pdf  # noqa: E402
+
+
+def all_pages_pymupdf(pdf_path, preview_path, dpi=200):
+    with fitz.open(pdf_path) as document:
+        pixmaps = [page.get_pixmap(dpi=dpi, alpha=False) for page in document]
+    pixmaps[0].save(preview_path)
+
+
+def all_pages_pdf2image(pdf_path, preview_path):
+    from pdf2image import convert_from_path
+    convert_from_path(pdf_path)[0].save(preview_path, 'JPEG')
+
+
+def timed(fn, *args, number=3, **kwargs):
+    started = time.perf_counter()
+    for _ in range(number):
+        fn(*args, **kwargs)
+    return (time.perf_counter() - started) * 1000 / number
+
+
+def bench(pdf_path, work_dir):
+    preview_path = os.path.join(work_dir, 'preview.jpg')
+    thumbnail_path = os.path.join(work_dir, 'preview_thumb.jpg')
+    with fitz.open(pdf_path) as document:
+        page_count = document.page_count
+    print(f'{os.path.basename(pdf_path)}, {page_count} pages')
+    if shutil.which('pdftoppm'):
+        print(f"  {'every page, pdf2image 200 dpi':<42} {timed(all_pages_pdf2image, pdf_path, preview_path):9.1f} ms")
+    print(f"  {'every page, PyMuPDF 200 dpi':<42} {timed(all_pages_pymupdf, pdf_path, preview_path):9.1f} ms")
+    first_page = timed(
+        render_first_page_previews, pdf_path, preview_path, thumbnail_path,
+        dpi=110, max_dimension=1400, thumbnail_max_dimension=320
+    )
+    print(f"  {'first page, preview and thumbnail':<42} {first_page:9.1f} ms")
+
+
+def main():
+    if not shutil.which('pdftoppm'):
+        print('poppler is not installed, pdf2image is not timed')
+    with tempfile.TemporaryDirectory() as work_dir:
+        templates = sys.argv[1:] or [
+            write_form_pdf(os.path.join(work_dir, f'form_{pages}.pdf'), pages=pages) for pages in (4, 12, 30)
+        ]
+        for template in templates:
+            bench(template, work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Microbenchmark of answer text fitting: the cumulative-width helpers against the prefix
+search they replaced, on long answers. Run with `python -m benchmarks.bench_text_layout`.
+"""
+import os
+import timeit
+
+# Importing the app package loads app.config, which needs these
+os.environ.setdefault('DB_PORT', '27017')
+
+from reportlab.pdfbase.pdfmetrics import stringWidth  # noqa: E402
+
+from app.services.text_layout import fit_text, wrap_text  # noqa: E402
+
+WORDS = 'property buyer seller closing escrow inspection appraisal mortgage contingency'.split()
+
+
+def long_answer(length):
+    text = ''
+    index = 0
+    while len(text) < length:
+        text += WORDS[index % len(WORDS)] + ' '
+        index += 1
+    return text[:length]
+
+
+def prefix_fit(text, max_width):
+    for i in range(len(text), -1, -1):
+        if stringWidth(text[:i], 'Helvetica', 12) <= max_width:
+            return text[:i]
+
+
+def prefix_wrap(text, line_widths):
+    lines, index = [], 0
+    for max_width in line_widths:
+        if index >= len(text):
+            break
+        for i in range(len(text) - index, 0, -1):
+            if stringWidth(text[index:index + i], 'Helvetica', 12) <= max_width:
+                lines.append(text[index:index + i])
+                index += i
+                break
+    return lines
+
+
+def bench(label, fn, number):
+    seconds = timeit.timeit(fn, number=number)
+    print(f'{label:<40} {seconds * 1000 / number:10.3f} ms')
+
+
+def main():
+    line_widths = [450] * 10
+    for length in (200, 1000, 5000):
+        text = long_answer(length)
+        number = max(1, 2000 // length)
+        print(f'answer of {length} characters')
+        bench('  fit, prefix search', lambda: prefix_fit(text, 450), number)
+        bench('  fit, cumulative widths', lambda: fit_text(text, 450), number)
+        bench('  wrap 10 lines, prefix search', lambda: prefix_wrap(text, line_widths), number)
+        bench('  wrap 10 lines, cumulative widths', lambda: wrap_text(text, line_widths), number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""
+Form-like PDFs for the benchmarks. The FL/MN templates live outside the repo, pass their
+paths on the command line to benchmark them instead.
+"""
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+
+def write_form_pdf(path, pages):
+    """A letter sized PDF of dense text pages, about the weight of a state contract form."""
+    can = canvas.Canvas(str(path), pagesize=letter)
+    for page_num in range(1, pages + 1):
+        can.setFont('Helvetica-Bold', 11)
+        can.drawString(72, 740, f'RESIDENTIAL CONTRACT FOR SALE AND PURCHASE, page {page_num} of {pages}')
+        can.setFont('Helvetica', 8)
+        for line in range(70):
+            can.drawString(
+                40, 720 - line * 10,
+                f'{line + 1}. The Buyer ____________________ and the Seller ____________________ agree that the '
+                f'Property shall be sold and bought on the terms of this Contract.'
+            )
+        can.rect(40, 20, 530, 700)
+        can.showPage()
+    can.save()
+    return str(path)
@@ -0,0 +1,46 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# app.config reads these at import time
+os.environ.setdefault('DB_PORT', '27017')
+os.environ.setdefault('DB_NAME', 'test')
+
+
+def write_form_pdf(path, pages):
+    """A letter sized PDF of form-like text pages."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    can = canvas.Canvas(str(path), pagesize=letter)
+    for page_num in range(1, pages + 1):
+        can.drawString(72, 720, f'RESIDENTIAL CONTRACT FOR SALE AND PURCHASE, page {page_num}')
+        for line in range(40):
+            can.drawString(72, 690 - line * 15, f'{line + 1}. Buyer ______________________ Seller ______________________')
+        can.showPage()
+    can.save()
+    return str(path)
+
+
+@pytest.fixture
+def form_pdf(tmp_path):
+    return write_form_pdf(tmp_path / 'form.pdf', pages=4)
+
+
+def _bulk_upserts(collection, requests, ordered=True):
+    # mongomock's bulk_write does not take the UpdateOne of current pymongo, the upserts
+    # the migrations send are applied one by one in order instead
+    upserted = 0
+    for request in requests:
+        result = collection.update_one(request._filter, request._doc, upsert=request._upsert)
+        upserted += result.upserted_id is not None
+    return SimpleNamespace(upserted_count=upserted)
+
+
+@pytest.fixture
+def mongomock_db(monkeypatch):
+    """A mongomock database whose bulk_write takes the upserts the migrations send."""
+    mongomock = pytest.importorskip('mongomock')
+    monkeypatch.setattr(mongomock.collection.Collection, 'bulk_write', _bulk_upserts)
+    return mongomock.MongoClient().db
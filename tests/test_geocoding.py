@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+mongomock = pytest.importorskip('mongomock')
+
+from app.services.geocoding import geocode_address, normalize_address  # noqa: E402
+
+
+class FakeGeocoder:
+    def __init__(self, results=None, error=None):
+        self.results = results or {}
+        self.error = error
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if self.error:
+            raise self.error
+        latitude, longitude = self.results.get(normalize_address(address), (None, None))
+        if latitude is None:
+            return None
+        return SimpleNamespace(latitude=latitude, longitude=longitude, address=address, raw={'source': 'fake'})
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['GEOCODE_MEMORY_CACHE_SIZE'] = 16
+    app.db = mongomock.MongoClient().db
+    app.extensions['geocoder'] = FakeGeocoder({'100 main st, miami, fl 33101': (25.77, -80.19)})
+    return app
+
+
+def geocode_in_request(app, address):
+    # g, and so the per-request results, lives as long as the app context
+    with app.app_context():
+        return geocode_address(address)
+
+
+def test_normalize_address():
+    assert normalize_address('  100 Main St.,Miami ,  FL 33101 ') == '100 main st, miami, fl 33101'
+    assert normalize_address('Apt #4, 100 Main St') == 'apt 4, 100 main st'
+    assert normalize_address(None) == ''
+
+
+def test_spellings_of_one_address_share_a_lookup(app):
+    with app.app_context():
+        first = geocode_address('100 Main St, Miami, FL 33101')
+        second = geocode_address('100 MAIN ST.,  Miami,FL 33101')
+    assert (first.latitude, first.longitude) == (25.77, -80.19)
+    assert second is first
+    assert len(app.extensions['geocoder'].calls) == 1
+
+
+def test_lookups_fall_through_request_memory_and_mongo(app):
+    geocoder = app.extensions['geocoder']
+    geocode_in_request(app, '100 Main St, Miami, FL 33101')
+    assert app.db.geocode_cache.find_one({'_id': '100 main st, miami, fl 33101'})['result']['latitude'] == 25.77
+
+    # A new request, answered from the process cache
+    assert geocode_in_request(app, '100 Main St, Miami, FL 33101').latitude == 25.77
+    assert len(geocoder.calls) == 1
+
+    # Another process, answered from Mongo and kept in its own process cache
+    app.extensions['geocode_memory_cache'].clear()
+    assert geocode_in_request(app, '100 Main St, Miami, FL 33101').longitude == -80.19
+    assert len(geocoder.calls) == 1
+    assert '100 main st, miami, fl 33101' in app.extensions['geocode_memory_cache']
+
+
+def test_not_found_is_only_shared_within_a_request(app):
+    geocoder = app.extensions['geocoder']
+    with app.app_context():
+        assert geocode_address('1 Nowhere Rd') is None
+        assert geocode_address('1 nowhere rd') is None
+    assert len(geocoder.calls) == 1
+
+    assert geocode_in_request(app, '1 Nowhere Rd') is None
+    assert len(geocoder.calls) == 2
+    assert app.db.geocode_cache.count_documents({}) == 0
+
+
+def test_geocoder_errors_are_not_cached(app):
+    app.extensions['geocoder'] = FakeGeocoder(error=TimeoutError('geocoder timed out'))
+    with pytest.raises(TimeoutError):
+        geocode_in_request(app, '100 Main St, Miami, FL 33101')
+    assert app.db.geocode_cache.count_documents({}) == 0
+    assert len(app.extensions['geocode_memory_cache']) == 0
+
+    app.extensions['geocoder'] = FakeGeocoder({'100 main st, miami, fl 33101': (25.77, -80.19)})
+    assert geocode_in_request(app, '100 Main St, Miami, FL 33101').latitude == 25.77
@@ -0,0 +1,39 @@
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+mongomock = pytest.importorskip('mongomock')
+
+from app.services.uploads import UploadError  # noqa: E402
+from app.views import id_verification  # noqa: E402
+from app.views.id_verification import IDVerificationView  # noqa: E402
+
+
+def test_failed_step_releases_the_uploads_already_consumed(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY='test-secret-key-of-at-least-32-bytes', UPLOAD_FOLDER=str(tmp_path))
+    JWTManager(app)
+    app.db = mongomock.MongoClient().db
+    app.db.users.insert_one({'uuid': 'user-1', 'role': 'buyer'})
+    app.add_url_rule('/id_verification', view_func=IDVerificationView.as_view('id_verification'))
+
+    def consume_upload(user, upload_id, directory, label=None):
+        if upload_id == 'missing':
+            raise UploadError('Upload not found or not complete', 404)
+        return f'{directory}/{upload_id}.jpg'
+
+    released = []
+    monkeypatch.setattr(id_verification, 'consume_upload', consume_upload)
+    monkeypatch.setattr(id_verification, 'release_path', released.append)
+    with app.app_context():
+        token = create_access_token(identity='user-1')
+
+    response = app.test_client().post('/id_verification', headers={'Authorization': f'Bearer {token}'}, data={
+        'passportFrontUploadId': 'front',
+        'passportBackUploadId': 'back',
+        'faceVideoUploadId': 'missing'
+    })
+
+    assert response.status_code == 404
+    assert [path.rsplit('/', 1)[-1] for path in released] == ['front.jpg', 'back.jpg']
+    assert app.db.ID_verifications.count_documents({}) == 0
@@ -0,0 +1,149 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+mongomock = pytest.importorskip('mongomock')
+
+from app.services.mail import (  # noqa: E402
+    OUTBOX_FAILED, OUTBOX_PENDING, OUTBOX_SENDING, OUTBOX_SENT, EmailOutboxWorker, FileSinkTransport,
+    MailTransportError, ensure_outbox_indexes, queue_email
+)
+
+
+class FakeTransport:
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+
+    def send(self, email):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(email['idempotency_key'])
+        return 202
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        UPLOAD_FOLDER=str(tmp_path / 'media'),
+        MAIL_OUTBOX_MAX_ATTEMPTS=3,
+        MAIL_OUTBOX_RETRY_BACKOFF=30,
+        MAIL_OUTBOX_LOCK_TIMEOUT=300
+    )
+    app.db = mongomock.MongoClient().db
+    ensure_outbox_indexes(app.db, retention=3600)
+    with app.app_context():
+        yield app
+
+
+def worker(app, transport):
+    return EmailOutboxWorker(app, transport=transport)
+
+
+def outbox(app, key):
+    return app.db.email_outbox.find_one({'idempotency_key': key})
+
+
+def test_an_idempotency_key_is_queued_once(app):
+    queue_email('buyer@example.com', 'Hello', 'First', idempotency_key='welcome:1')
+    queue_email('buyer@example.com', 'Hello', 'Second', idempotency_key='welcome:1')
+    assert app.db.email_outbox.count_documents({}) == 1
+    assert outbox(app, 'welcome:1')['text'] == 'First'
+
+
+def test_claim_takes_due_and_abandoned_emails_only(app):
+    now = datetime.now()
+    app.db.email_outbox.insert_many([
+        {'idempotency_key': 'later', 'status': OUTBOX_PENDING, 'attempts': 0, 'next_attempt_at': now + timedelta(minutes=5)},
+        {'idempotency_key': 'locked', 'status': OUTBOX_SENDING, 'attempts': 1, 'next_attempt_at': now, 'locked_at': now},
+        {'idempotency_key': 'abandoned', 'status': OUTBOX_SENDING, 'attempts': 1,
+         'next_attempt_at': now - timedelta(hours=1), 'locked_at': now - timedelta(hours=1)},
+        {'idempotency_key': 'due', 'status': OUTBOX_PENDING, 'attempts': 0, 'next_attempt_at': now - timedelta(seconds=1)},
+    ])
+    outbox_worker = worker(app, FakeTransport())
+
+    claimed = [outbox_worker.claim_next()['idempotency_key'], outbox_worker.claim_next()['idempotency_key']]
+
+    assert claimed == ['abandoned', 'due']
+    assert outbox_worker.claim_next() is None
+    assert outbox(app, 'abandoned')['attempts'] == 2
+    assert outbox(app, 'due')['status'] == OUTBOX_SENDING
+
+
+def test_retryable_failures_back_off_exponentially_then_fail(app):
+    queue_email('buyer@example.com', 'Hello', 'Text', idempotency_key='retry')
+    outbox_worker = worker(app, FakeTransport(errors=[MailTransportError('503')] * 3))
+
+    delays = []
+    for _ in range(3):
+        before = datetime.now()
+        app.db.email_outbox.update_one({'idempotency_key': 'retry'}, {'$set': {'next_attempt_at': before}})
+        assert outbox_worker.drain() == 1
+        email = outbox(app, 'retry')
+        if email['status'] == OUTBOX_PENDING:
+            delays.append(round((email['next_attempt_at'] - before).total_seconds()))
+
+    assert delays == [30, 60]
+    email = outbox(app, 'retry')
+    assert email['status'] == OUTBOX_FAILED
+    assert email['attempts'] == 3
+    assert 'finished_at' in email
+
+
+def test_permanent_failure_is_not_retried(app):
+    queue_email('buyer@example.com', 'Hello', 'Text', idempotency_key='bad-address')
+    worker(app, FakeTransport(errors=[MailTransportError('400', retryable=False)])).drain()
+    email = outbox(app, 'bad-address')
+    assert email['status'] == OUTBOX_FAILED
+    assert email['attempts'] == 1
+
+
+def test_sent_email_expires_and_removes_its_attachment_snapshot(app, tmp_path):
+    document = tmp_path / 'contract.pdf'
+    document.write_bytes(b'%PDF-1.4')
+    queue_email('buyer@example.com', 'Contract', 'Attached', attachment_paths=[str(document)], idempotency_key='contract')
+    snapshot = outbox(app, 'contract')['attachments'][0]['path']
+    assert os.path.isfile(snapshot)
+
+    transport = FakeTransport()
+    worker(app, transport).drain()
+
+    email = outbox(app, 'contract')
+    assert transport.sent == ['contract']
+    assert email['status'] == OUTBOX_SENT
+    assert email['finished_at'] is not None
+    assert not os.path.exists(snapshot)
+    ttl_indexes = [index for index in app.db.email_outbox.index_information().values() if 'expireAfterSeconds' in index]
+    assert [(index['key'], index['expireAfterSeconds']) for index in ttl_indexes] == [([('finished_at', 1)], 3600)]
+
+
+def test_file_sink_writes_the_email_as_json(app, tmp_path):
+    document = tmp_path / 'contract.pdf'
+    document.write_bytes(b'%PDF-1.4')
+    sink_dir = tmp_path / 'sink'
+    queue_email('buyer@example.com', 'Contract', 'Attached', attachment_paths=[str(document)], idempotency_key='sink:1/a')
+
+    worker(app, FileSinkTransport(str(sink_dir), 'noreply@example.com')).drain()
+
+    filename, = os.listdir(sink_dir)
+    assert filename.endswith('_sink_1_a.json')
+    with open(sink_dir / filename) as f:
+        message = json.load(f)
+    assert message['from'] == 'noreply@example.com'
+    assert message['to'] == 'buyer@example.com'
+    assert message['attachments'] == [{'filename': 'contract.pdf', 'type': 'application/pdf', 'size': 8}]
+    assert outbox(app, 'sink:1/a')['status'] == OUTBOX_SENT
+
+
+def test_a_repeated_otp_is_sent_again(app):
+    from app.services.authentication import send_otp_via_email
+
+    issued_at = datetime(2026, 1, 1, 12, 0)
+    send_otp_via_email('buyer@example.com', '123456', 'OTP', issued_at=issued_at)
+    send_otp_via_email('buyer@example.com', '123456', 'OTP', issued_at=issued_at)
+    send_otp_via_email('buyer@example.com', '123456', 'OTP', issued_at=issued_at + timedelta(days=3))
+    assert app.db.email_outbox.count_documents({'to': 'buyer@example.com'}) == 2
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from app.services.media_library import ensure_media_library_indexes, list_media_items, migrate_user_media
+from app.views.media import SendMediaView
+
+
+@pytest.fixture
+def app(mongomock_db):
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key-of-at-least-32-bytes'
+    JWTManager(app)
+    app.db = mongomock_db
+    ensure_media_library_indexes(app.db)
+    app.add_url_rule('/media', view_func=SendMediaView.as_view('media'))
+    with app.app_context():
+        yield app
+
+
+def media_url(name):
+    return f'/media/users_media/user-1/{name}'
+
+
+def test_media_migration_rerun_inserts_nothing_and_keeps_the_array_order(app):
+    app.db.media.insert_one({'user_id': 'user-1', 'user_media': [
+        {'file': media_url('20250301093000_kitchen_a.jpg'), 'label': 'kitchen'},
+        {'file': media_url('20250301093000_kitchen_b.jpg'), 'label': 'kitchen'},
+        {'file': media_url('legacy.jpg'), 'label': 'garden'},
+        {'file': media_url('20240101080000_front.jpg'), 'label': 'front'}
+    ]})
+
+    assert migrate_user_media() == 4
+    assert migrate_user_media() == 0
+
+    items, _ = list_media_items('user-1')
+    # Dated from the file names, ties keep the array order, undated files take the document's date
+    assert [item['file'].rsplit('/', 1)[-1] for item in items] == [
+        '20240101080000_front.jpg', '20250301093000_kitchen_a.jpg', '20250301093000_kitchen_b.jpg', 'legacy.jpg'
+    ]
+    assert items[0]['uploaded_at'] == datetime(2024, 1, 1, 8, 0)
+
+
+def test_cursor_pages_over_a_shared_upload_date_neither_skip_nor_repeat(app):
+    uploaded_at = datetime(2025, 3, 1, 9, 30)
+    app.db.user_media_items.insert_many([
+        {'_id': ObjectId(), 'user_id': 'user-1', 'file': media_url(f'{index}.jpg'), 'label': 'kitchen',
+         'uploaded_at': uploaded_at + timedelta(seconds=index // 4)}
+        for index in range(11)
+    ])
+
+    files, cursor = [], None
+    while True:
+        items, cursor = list_media_items('user-1', cursor=cursor, limit=3)
+        files += [item['file'] for item in items]
+        if cursor is None:
+            break
+
+    assert files == [media_url(f'{index}.jpg') for index in range(11)]
+
+
+def test_invalid_cursor_is_a_bad_request(app):
+    app.db.users.insert_one({'uuid': 'user-1', 'role': 'buyer'})
+    token = create_access_token(identity='user-1')
+    for cursor in ('not-a-cursor', str(ObjectId()), '123_xyz'):
+        response = app.test_client().get(f'/media?cursor={cursor}', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 400
+        assert response.get_json() == {'error': 'Invalid cursor'}
@@ -0,0 +1,75 @@
+import pytest
+from flask import Flask
+from pymongo.errors import DuplicateKeyError
+
+mongomock = pytest.importorskip('mongomock')
+
+from app.services.messaging import (  # noqa: E402
+    MESSAGE_APPENDED, MESSAGE_DUPLICATE, MESSAGE_INSERTED, append_chat_message, ensure_message_indexes
+)
+
+
+class RacingDatabase:
+    """Runs a competing first message right before the next upsert, as if both had missed."""
+
+    def __init__(self, db):
+        self.db = db
+        self.competitor = None
+
+    def __getitem__(self, name):
+        return RacingCollection(self, self.db[name])
+
+
+class RacingCollection:
+    def __init__(self, database, collection):
+        self.database = database
+        self.collection = collection
+
+    def update_one(self, query, update, upsert=False):
+        competitor, self.database.competitor = self.database.competitor, None
+        if upsert and competitor:
+            competitor()
+            # The server reports the lost upsert on the unique conversation index
+            raise DuplicateKeyError('E11000 duplicate key error')
+        return self.collection.update_one(query, update, upsert=upsert)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    db = mongomock.MongoClient().db
+    app.extensions['unique_conversation_collections'] = ensure_message_indexes(db)
+    app.db = RacingDatabase(db)
+    with app.app_context():
+        yield app
+
+
+def conversation():
+    return {'buyer_id': 'buyer', 'seller_id': 'seller', 'property_id': 'property'}
+
+
+def stored_uids(app):
+    document = app.db.db.buyer_seller_messaging.find_one(conversation())
+    return [message['message_uid'] for message in document['message_content']]
+
+
+def test_racing_first_messages_are_both_stored(app):
+    statuses = []
+    app.db.competitor = lambda: statuses.append(
+        append_chat_message('buyer_seller_messaging', conversation(), {'message_uid': 'first'}, conversation())
+    )
+
+    statuses.append(
+        append_chat_message('buyer_seller_messaging', conversation(), {'message_uid': 'second'}, conversation())
+    )
+
+    assert statuses == [MESSAGE_INSERTED, MESSAGE_APPENDED]
+    assert stored_uids(app) == ['first', 'second']
+    assert app.db.db.buyer_seller_messaging.count_documents({}) == 1
+
+
+def test_redelivered_message_is_a_duplicate(app):
+    message = {'message_uid': 'first'}
+    assert append_chat_message('buyer_seller_messaging', conversation(), dict(message), conversation()) == MESSAGE_INSERTED
+    assert append_chat_message('buyer_seller_messaging', conversation(), dict(message), conversation()) == MESSAGE_DUPLICATE
+    assert stored_uids(app) == ['first']
@@ -0,0 +1,123 @@
+import io
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from pymongo import MongoClient
+
+from app.views import properties
+from app.views.properties import PanoramicImageView
+
+# The views rely on array filters, which need a real server
+TEST_MONGO_URI = os.getenv('TEST_MONGO_URI')
+pytestmark = pytest.mark.skipif(not TEST_MONGO_URI, reason='TEST_MONGO_URI is not set')
+
+SELLER = 'seller-1'
+
+
+def panorama(order, room_label, name):
+    return {
+        'order': order,
+        'room_label': room_label,
+        'name': name,
+        'url': f'http://testserver/media/{name}',
+        'geo_location_latitude': 0.0,
+        'geo_location_longitude': 0.0,
+        'uploaded_at': datetime.now()
+    }
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY='test-secret-key-of-at-least-32-bytes', TESTING=True)
+    JWTManager(app)
+    client = MongoClient(TEST_MONGO_URI)
+    app.db = client.get_database(f'test_panoramas_{uuid.uuid4().hex[:8]}')
+    view = PanoramicImageView.as_view('panoramic_images')
+    app.add_url_rule('/panoramic_images', view_func=view)
+    app.add_url_rule('/panoramic_images/<string:property_id>/<int:property_version>/<int:order>', view_func=view)
+
+    monkeypatch.setattr(properties, 'schedule_panorama_tiles', lambda *args: None)
+    monkeypatch.setattr(properties, 'remove_panorama_tiles', lambda *args: None)
+    yield app
+    client.drop_database(app.db.name)
+    client.close()
+
+
+@pytest.fixture
+def property_id(app):
+    app.db.users.insert_one({'uuid': SELLER, 'role': 'seller'})
+    result = app.db.properties.insert_one({'panoramic_images': [
+        {'property_version': 1, '3d_images': [panorama(1, 'kitchen', 'v1_kitchen.jpg')]},
+        {'property_version': 2, '3d_images': [panorama(1, 'kitchen', 'v2_kitchen.jpg')]}
+    ]})
+    property_id = str(result.inserted_id)
+    app.db.property_seller_transaction.insert_one({'property_id': property_id, 'seller_id': SELLER})
+    return property_id
+
+
+def test_delete_during_replace_of_another_version_keeps_both(app, property_id, monkeypatch):
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity=SELLER)}'}
+    client = app.test_client()
+    deleted = []
+
+    def save_during_delete(panoramic_image, user, property_id):
+        # The replace has read its version, the delete of version 1 lands before it writes
+        response = client.delete(f'/panoramic_images/{property_id}/1/1', headers=headers)
+        deleted.append(response.status_code)
+        return {'filename': 'v2_kitchen_new.jpg', 'image_url': 'http://testserver/media/v2_kitchen_new.jpg'}
+
+    monkeypatch.setattr(properties, 'save_panoramic_image', save_during_delete)
+    response = client.post('/panoramic_images', headers=headers, data={
+        'panoramic_image': (io.BytesIO(b'jpeg'), 'kitchen.jpg'),
+        'property_id': property_id,
+        'property_version': '2',
+        'order': '1',
+        'room_label': 'kitchen',
+        'geo_location_latitude': '1.5',
+        'geo_location_longitude': '2.5'
+    }, content_type='multipart/form-data')
+
+    assert deleted == [200]
+    assert response.status_code == 200
+    versions = app.db.properties.find_one({'_id': ObjectId(property_id)})['panoramic_images']
+    # The emptied version 1 is gone and version 2 holds the replacement
+    assert [version['property_version'] for version in versions] == [2]
+    image, = versions[0]['3d_images']
+    assert image['name'] == 'v2_kitchen_new.jpg'
+    assert image['geo_location_latitude'] == 1.5
+
+
+def test_image_of_a_lost_version_create_is_released(app, property_id, monkeypatch):
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity=SELLER)}'}
+    released = []
+
+    def save_during_create(panoramic_image, user, property_id):
+        # A concurrent request creates version 3 first
+        app.db.properties.update_one(
+            {'_id': ObjectId(property_id)},
+            {'$push': {'panoramic_images': {'property_version': 3, '3d_images': [panorama(1, 'hall', 'v3_hall.jpg')]}}}
+        )
+        return {'filename': 'v3_hall_lost.jpg', 'image_url': 'http://testserver/media/v3_hall_lost.jpg'}
+
+    monkeypatch.setattr(properties, 'save_panoramic_image', save_during_create)
+    monkeypatch.setattr(properties, 'release_path', released.append)
+    response = app.test_client().post('/panoramic_images', headers=headers, data={
+        'panoramic_image': (io.BytesIO(b'jpeg'), 'hall.jpg'),
+        'property_id': property_id,
+        'property_version': '3',
+        'order': '1',
+        'room_label': 'hall',
+        'geo_location_latitude': '1.5',
+        'geo_location_longitude': '2.5'
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert [os.path.basename(path) for path in released] == ['v3_hall_lost.jpg']
@@ -0,0 +1,81 @@
+import os
+
+import fitz
+import pytest
+
+from app.services import pdf_fill
+from app.services.pdf_fill import PdfJobError, fill_answer, fill_answers
+
+
+def text_answer(question_id, page_num, line, answer):
+    return {
+        'question_id': question_id,
+        'answer': answer,
+        'values': None,
+        'answer_locations': [{
+            'pageNum': page_num,
+            'position': 1,
+            'answerInputType': 'text',
+            'answerOutputType': 'text',
+            'startX': 100,
+            'endX': 400,
+            'endY': 100 + line * 20
+        }]
+    }
+
+
+def page_texts(path):
+    with fitz.open(path) as document:
+        return [page.get_text() for page in document]
+
+
+def test_batch_writes_every_answer_in_one_pass(form_pdf, monkeypatch):
+    writes = []
+    write_atomic = pdf_fill._write_atomic
+    monkeypatch.setattr(pdf_fill, '_write_atomic', lambda writer, path: writes.append(path) or write_atomic(writer, path))
+    answers = [
+        text_answer('q1', 1, 1, 'Jane Buyer'),
+        text_answer('q2', 1, 2, 'John Seller'),
+        text_answer('q3', 3, 1, 'Miami Beach'),
+        text_answer('q4', 4, 5, 'Closing on March 1')
+    ]
+
+    fill_answers(form_pdf, answers)
+
+    assert writes == [form_pdf]
+    texts = page_texts(form_pdf)
+    assert len(texts) == 4
+    assert 'Jane Buyer' in texts[0] and 'John Seller' in texts[0]
+    assert 'Miami Beach' in texts[2]
+    assert 'Closing on March 1' in texts[3]
+    assert 'Jane Buyer' not in texts[1]
+
+
+def test_batch_matches_answers_filled_one_by_one(tmp_path, form_pdf):
+    answers = [text_answer('q1', 1, 1, 'Jane Buyer'), text_answer('q2', 2, 1, 'John Seller')]
+    sequential = str(tmp_path / 'sequential.pdf')
+    with open(form_pdf, 'rb') as source, open(sequential, 'wb') as target:
+        target.write(source.read())
+
+    fill_answers(form_pdf, answers)
+    for answer in answers:
+        fill_answer(sequential, answer['answer_locations'], answer['answer'], answer['values'])
+
+    assert page_texts(form_pdf) == page_texts(sequential)
+
+
+def test_invalid_answer_rejects_the_whole_batch(form_pdf):
+    with open(form_pdf, 'rb') as f:
+        original = f.read()
+    answers = [
+        text_answer('q1', 1, 1, 'Jane Buyer'),
+        # A number where the location expects text
+        text_answer('q2', 2, 1, 42)
+    ]
+
+    with pytest.raises(PdfJobError, match='q2'):
+        fill_answers(form_pdf, answers)
+
+    with open(form_pdf, 'rb') as f:
+        assert f.read() == original
+    assert os.listdir(os.path.dirname(form_pdf)) == ['form.pdf']
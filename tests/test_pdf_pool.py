@@ -0,0 +1,41 @@
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services.pdf_pool import PdfJobPool, PdfJobTimeout
+
+
+def add(a, b):
+    return a + b
+
+
+def hang():
+    time.sleep(60)
+
+
+def crash():
+    os._exit(1)
+
+
+@pytest.fixture
+def pool():
+    pool = PdfJobPool(max_workers=1, default_timeout=20)
+    yield pool
+    if pool._executor is not None:
+        pool._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_timed_out_job_frees_its_slot(pool):
+    with pytest.raises(PdfJobTimeout):
+        pool.run(hang, timeout=1)
+    # The hanging job held the only process, the pool must have been replaced
+    assert pool.run(add, 1, 2, timeout=20) == 3
+    assert pool.stats()['recycled'] == 1
+
+
+def test_crashed_worker_is_replaced(pool):
+    with pytest.raises(BrokenProcessPool):
+        pool.run(crash)
+    assert pool.run(add, 2, 2) == 4
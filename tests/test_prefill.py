@@ -0,0 +1,171 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from app.services import prefill
+from app.services.prefill import CircuitBreaker, PrefillClient, PrefillError, normalize_address_part
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only the breaker's clock, the caches keep the real one
+    monkeypatch.setattr(prefill, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+class StubResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class StubSession:
+    """Answers posts from a list of responses or exceptions, the last one repeats."""
+
+    def __init__(self, *outcomes, gate=None):
+        self.outcomes = list(outcomes)
+        self.gate = gate
+        self.calls = []
+
+    def post(self, url, json=None, timeout=None):
+        self.calls.append(json)
+        if self.gate:
+            self.gate.wait(5)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def client_with(session, **kwargs):
+    client = PrefillClient('http://prefill.test/search', **kwargs)
+    client.session = session
+    return client
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+
+def test_breaker_lets_a_single_trial_through_after_the_reset_timeout(clock):
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+
+    clock.now += 1
+    assert breaker.allow()
+    # Other callers wait for the trial
+    assert not breaker.allow()
+
+
+def test_failed_trial_opens_the_breaker_again(clock):
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_successful_trial_closes_the_breaker(clock):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+    # The failure count starts over
+    breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_address_parts_are_normalized():
+    assert normalize_address_part('  Main   STREET ') == 'main street'
+    assert normalize_address_part(None) == ''
+    assert normalize_address_part(123) == '123'
+
+
+def test_spellings_of_one_address_share_a_cached_result():
+    session = StubSession(StubResponse(200, {'owner': 'Jane'}))
+    client = client_with(session)
+
+    assert client.search('100', 'Main St', 'Miami', 'FL') == {'owner': 'Jane'}
+    assert client.search(' 100', 'MAIN  st', 'miami ', 'fl') == {'owner': 'Jane'}
+    assert len(session.calls) == 1
+    assert client.search('101', 'Main St', 'Miami', 'FL') == {'owner': 'Jane'}
+    assert len(session.calls) == 2
+
+
+def test_concurrent_lookups_share_one_call():
+    gate = threading.Event()
+    session = StubSession(StubResponse(200, {'owner': 'Jane'}), gate=gate)
+    client = client_with(session)
+    results = []
+
+    threads = [
+        threading.Thread(target=lambda: results.append(client.search('100', 'Main St', 'Miami', 'FL')))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [{'owner': 'Jane'}] * 5
+    assert len(session.calls) == 1
+
+
+def test_failures_are_not_cached_and_open_the_breaker(clock):
+    session = StubSession(requests.ConnectionError('refused'), StubResponse(503), StubResponse(200, {'owner': 'Jane'}))
+    client = client_with(session, breaker_threshold=2, breaker_reset=30)
+
+    for _ in range(2):
+        with pytest.raises(PrefillError) as error:
+            client.search('100', 'Main St', 'Miami', 'FL')
+        assert error.value.status_code == 500
+
+    # Open, the service is not called
+    with pytest.raises(PrefillError) as error:
+        client.search('100', 'Main St', 'Miami', 'FL')
+    assert error.value.status_code == 503
+    assert len(session.calls) == 2
+
+    clock.now += 30
+    assert client.search('100', 'Main St', 'Miami', 'FL') == {'owner': 'Jane'}
+    assert len(session.calls) == 3
+
+
+def test_client_errors_do_not_count_against_the_breaker():
+    session = StubSession(StubResponse(404))
+    client = client_with(session, breaker_threshold=1)
+    for _ in range(3):
+        with pytest.raises(PrefillError):
+            client.search('100', 'Main St', 'Miami', 'FL')
+    assert len(session.calls) == 3
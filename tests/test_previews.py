@@ -0,0 +1,62 @@
+import os
+
+import pytest
+from flask import Flask
+from PIL import Image
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.pdfgen import canvas
+
+from app.services.media import extract_first_page_as_image
+from app.services.previews import render_first_page_previews
+
+
+class InlinePool:
+    """Runs PDF jobs in the test process."""
+
+    def run(self, fn, *args, priority=None, timeout=None, **kwargs):
+        return fn(*args, **kwargs)
+
+
+def write_mixed_pdf(path, pages=6):
+    # Only the first page is portrait, a preview of any other page would be landscape
+    can = canvas.Canvas(str(path), pagesize=letter)
+    for page_num in range(1, pages + 1):
+        can.drawString(72, 100, f'page {page_num}')
+        can.showPage()
+        can.setPageSize(landscape(letter))
+    can.save()
+    return str(path)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(PREVIEW_DPI=110, PREVIEW_MAX_DIMENSION=600, THUMBNAIL_MAX_DIMENSION=200)
+    app.extensions['pdf_pool'] = InlinePool()
+    with app.app_context():
+        yield app
+
+
+def test_multi_page_pdf_yields_bounded_first_page_previews(app, tmp_path):
+    pdf_path = write_mixed_pdf(tmp_path / 'contract.pdf')
+
+    assert extract_first_page_as_image(pdf_path) == 'contract.jpg'
+
+    with Image.open(tmp_path / 'contract.jpg') as preview, Image.open(tmp_path / 'contract_thumb.jpg') as thumbnail:
+        assert max(preview.size) <= 600
+        assert max(thumbnail.size) <= 200
+        assert max(thumbnail.size) < max(preview.size)
+        # Portrait, so rendered from page one
+        assert preview.height > preview.width
+        assert thumbnail.height > thumbnail.width
+    assert sorted(os.listdir(tmp_path)) == ['contract.jpg', 'contract.pdf', 'contract_thumb.jpg']
+
+
+def test_small_pages_keep_the_requested_dpi(tmp_path):
+    pdf_path = write_mixed_pdf(tmp_path / 'contract.pdf', pages=2)
+    preview_path = str(tmp_path / 'contract.jpg')
+
+    assert render_first_page_previews(pdf_path, preview_path, dpi=72, max_dimension=1400) == [preview_path]
+
+    with Image.open(preview_path) as preview:
+        assert preview.size == (612, 792)
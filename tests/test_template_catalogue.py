@@ -0,0 +1,42 @@
+import os
+
+import pytest
+from flask import Flask
+
+from app.services import template_catalogue
+from app.services.template_catalogue import sync_template_catalogue
+
+TEMPLATE = 'templates/FL_Forms/Contracts/contract.pdf'
+
+
+@pytest.fixture
+def app(tmp_path, mongomock_db):
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.db = mongomock_db
+    app.add_url_rule('/media/<path:filename>', 'serve_media', lambda filename: filename)
+    os.makedirs(tmp_path / 'templates' / 'FL_Forms' / 'Contracts')
+    (tmp_path / TEMPLATE).write_bytes(b'%PDF-1.4')
+    with app.test_request_context():
+        yield app
+
+
+def test_template_without_a_preview_is_retried(app, monkeypatch):
+    renders = []
+    monkeypatch.setattr(template_catalogue, 'extract_first_page_as_image', lambda path: renders.append(path) and None)
+
+    assert sync_template_catalogue() == []
+    assert app.db.template_manifest.count_documents({}) == 0
+    assert app.db.documents.count_documents({}) == 0
+
+    monkeypatch.setattr(template_catalogue, 'extract_first_page_as_image', lambda path: renders.append(path) or 'contract.jpg')
+    document, = sync_template_catalogue()
+
+    assert len(renders) == 2
+    assert document['name'] == 'contract.pdf'
+    assert document['state'] == 'Florida'
+    assert app.db.template_manifest.find_one({'_id': TEMPLATE}) is not None
+
+    # Unchanged on disk, not rendered again
+    assert sync_template_catalogue() == []
+    assert len(renders) == 2
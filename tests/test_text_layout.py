@@ -0,0 +1,73 @@
+import random
+
+import pytest
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from app.services.text_layout import TextLayout, fit_text, wrap_text
+
+SAMPLES = [
+    '',
+    'a',
+    'Hello, World!',
+    'The quick brown fox jumps over the lazy dog 0123456789',
+    'WWWWiiiiMMMM....',
+    'Ünïcödé façade — naïve café',
+]
+
+
+def reference_fit(text, max_width):
+    # The prefix search the helper replaced
+    for i in range(len(text), -1, -1):
+        if stringWidth(text[:i], 'Helvetica', 12) <= max_width:
+            return text[:i]
+
+
+@pytest.mark.parametrize('text', SAMPLES)
+def test_width_matches_string_width(text):
+    layout = TextLayout(text)
+    assert layout.width(0, len(text)) == pytest.approx(stringWidth(text, 'Helvetica', 12))
+    for start in range(len(text)):
+        assert layout.width(start, len(text)) == pytest.approx(stringWidth(text[start:], 'Helvetica', 12))
+
+
+@pytest.mark.parametrize('font_size', [8, 12, 17.5])
+def test_width_scales_with_font_size(font_size):
+    text = SAMPLES[3]
+    assert TextLayout(text, font_size=font_size).width(0, len(text)) == pytest.approx(stringWidth(text, 'Helvetica', font_size))
+
+
+def test_fit_text_matches_prefix_search():
+    rng = random.Random(7)
+    alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,;-WMil'
+    for _ in range(300):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 120)))
+        max_width = rng.uniform(0, 500)
+        assert fit_text(text, max_width) == reference_fit(text, max_width)
+
+
+def test_fit_text_edges():
+    assert fit_text('hello', 0) == ''
+    assert fit_text('hello', 1000) == 'hello'
+    assert fit_text('hello', stringWidth('hel', 'Helvetica', 12)) == 'hel'
+
+
+def test_wrap_text_breaks_on_words():
+    width = stringWidth('hello world', 'Helvetica', 12) + 1
+    assert wrap_text('hello world again and again', [width] * 3) == ['hello world', 'again and', 'again']
+
+
+def test_wrap_text_splits_words_longer_than_a_line():
+    width = stringWidth('abcde', 'Helvetica', 12)
+    assert wrap_text('abcdefghij', [width, width]) == ['abcde', 'fghij']
+
+
+def test_wrap_text_ignores_leading_whitespace():
+    width = stringWidth('world', 'Helvetica', 12) + 1
+    assert wrap_text('   hello world', [width, width]) == ['hello', 'world']
+
+
+def test_wrap_text_drops_overflow_and_skips_too_narrow_lines():
+    width = stringWidth('one', 'Helvetica', 12) + 1
+    assert wrap_text('one two three', [width, width]) == ['one', 'two']
+    assert wrap_text('one', [0, width]) == ['', 'one']
+    assert wrap_text('', [width]) == []
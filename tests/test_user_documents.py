@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from app.services.user_documents import ensure_user_document_indexes, migrate_embedded_documents
+
+
+@pytest.fixture
+def app(mongomock_db):
+    app = Flask(__name__)
+    app.db = mongomock_db
+    ensure_user_document_indexes(app.db)
+    with app.app_context():
+        yield app
+
+
+def test_document_migration_rerun_inserts_nothing_and_keeps_doc_ids(app):
+    uploaded_at = datetime(2025, 3, 1, 9, 30)
+    app.db.users_uploaded_docs.insert_one({'uuid': 'user-1', 'uploaded_documents': [
+        {'doc_id': 'kept-id', 'name': 'contract.pdf', 'url': '/media/contract.pdf', 'uploaded_at': uploaded_at},
+        {'name': 'addendum.pdf', 'url': '/media/addendum.pdf', 'uploaded_at': uploaded_at}
+    ]})
+    app.db.users_downloaded_docs.insert_one({'uuid': 'user-1', 'downloaded_documents': [
+        {'doc_id': 'downloaded-id', 'name': 'disclosure.pdf'}
+    ]})
+
+    assert migrate_embedded_documents() == {'uploaded': 2, 'downloaded': 1}
+    assert migrate_embedded_documents() == {'uploaded': 0, 'downloaded': 0}
+
+    documents = {document['name']: document for document in app.db.user_uploaded_documents.find({'uuid': 'user-1'})}
+    assert documents['contract.pdf']['doc_id'] == 'kept-id'
+    assert documents['addendum.pdf']['doc_id']
+    assert app.db.user_uploaded_documents.count_documents({}) == 2
+    assert app.db.user_downloaded_documents.find_one({'name': 'disclosure.pdf'})['doc_id'] == 'downloaded-id'
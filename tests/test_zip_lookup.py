@@ -0,0 +1,54 @@
+import pytest
+
+flask = pytest.importorskip('flask')
+
+from app.services.zip_lookup import extract_zipcode, is_address_in_states, load_zip_table  # noqa: E402
+
+
+@pytest.fixture
+def app_context():
+    app = flask.Flask(__name__)
+    # Without the centroid table the state comes from the ZIP prefix
+    app.extensions['zip_table'] = None
+    with app.app_context():
+        yield
+
+
+@pytest.mark.parametrize('address, zipcode', [
+    ('12345 Main St, Minneapolis, MN 55401', '55401'),
+    ('1 Ocean Dr, Miami, FL 33101-1234, USA', '33101'),
+    ('1 Ocean Dr, Miami, Florida 33101', '33101'),
+    ('12345 Main St, Minneapolis, MN', None),
+    ('55401 Oak Ave, Apt 12345, Minneapolis, MN', None),
+])
+def test_extract_zipcode_only_takes_the_trailing_zip(address, zipcode):
+    assert extract_zipcode(address) == zipcode
+
+
+def test_house_number_is_not_taken_for_a_zip(app_context):
+    # 123 is a New York prefix, the house number must not decide the state
+    assert is_address_in_states('12345 Main St, Minneapolis, MN', ['MN', 'FL'])
+
+
+def test_zip_decides_the_state(app_context):
+    assert is_address_in_states('100 Main St, Minneapolis, MN 55401', ['MN'])
+    assert not is_address_in_states('100 Main St, Albany, NY 12207', ['MN', 'FL'])
+
+
+def test_floor_abbreviation_is_not_florida(app_context):
+    assert not is_address_in_states('100 Main St, Fl 3, Chicago, IL', ['MN', 'FL'])
+    assert is_address_in_states('100 Main St, Fl 3, Miami, FL', ['FL'])
+
+
+def test_missing_table_falls_back_to_prefixes(tmp_path):
+    app = flask.Flask(__name__)
+    app.config['ZIP_TABLE_PATH'] = str(tmp_path / 'missing.bin')
+    assert load_zip_table(app) is None
+    assert app.extensions['zip_table'] is None
+
+
+def test_missing_table_stops_startup_when_required(tmp_path):
+    app = flask.Flask(__name__)
+    app.config.update(ZIP_TABLE_PATH=str(tmp_path / 'missing.bin'), ZIP_TABLE_REQUIRED=True)
+    with pytest.raises(RuntimeError):
+        load_zip_table(app)